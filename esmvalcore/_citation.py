@@ -1,8 +1,11 @@
 """Citation module."""
+import json
 import logging
 import os
 import re
+import tempfile
 import textwrap
+from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 
 import requests
@@ -15,6 +18,9 @@ REFERENCES_PATH = DIAGNOSTICS_PATH / 'references'
 
 CMIP6_URL_STEM = 'https://cera-www.dkrz.de/WDCC/ui/cerasearch'
 
+# Time in seconds to wait for the CMIP6 Data Citation Service to respond
+REQUEST_TIMEOUT = 10
+
 # The technical overview paper should always be cited
 ESMVALTOOL_PAPER = (
     "@article{righi20gmd,\n"
@@ -39,7 +45,84 @@ ESMVALTOOL_PAPER = (
     "}\n")
 
 
-def _write_citation_files(filename, provenance):
+class CitationCache:
+    """Cache of CMIP6 data citations retrieved from the citation service.
+
+    The citations are kept in memory and, if `cache_dir` is given, stored
+    on disk so they can be shared between processes and runs.
+
+    Parameters
+    ----------
+    cache_dir: str, optional
+        Directory where ESMValTool keeps caches, the citations are stored
+        in the ``citations`` subdirectory.
+    offline: bool
+        Never connect to the CMIP6 Data Citation Service, only use
+        citations that are available in the cache.
+    """
+
+    def __init__(self, cache_dir=None, offline=False):
+        self.cache_dir = None
+        if cache_dir is not None:
+            self.cache_dir = os.path.join(cache_dir, 'citations')
+        self.offline = offline
+        self._entries = {}
+
+    def _get_path(self, url_prefix):
+        return os.path.join(self.cache_dir,
+                            url_prefix.replace(os.sep, '_') + '.json')
+
+    def _load(self, url_prefix):
+        """Load the citation json data from disk."""
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._get_path(url_prefix)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _store(self, url_prefix, json_data):
+        """Store the citation json data on disk."""
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w',
+                                         dir=self.cache_dir,
+                                         delete=False) as file:
+            json.dump(json_data, file)
+        os.replace(file.name, self._get_path(url_prefix))
+
+    def get(self, url_prefix):
+        """Get the bibtex entry for a CMIP6 Data Citation Service prefix.
+
+        Returns an empty string if no citation information is available.
+        """
+        if url_prefix not in self._entries:
+            json_data = self._load(url_prefix)
+            if json_data is None and not self.offline:
+                json_data = _get_response(_make_json_url(url_prefix))
+                if json_data:
+                    self._store(url_prefix, json_data)
+            entry = _json_to_bibtex(json_data) if json_data else ''
+            self._entries[url_prefix] = entry
+        return self._entries[url_prefix]
+
+    def prefetch(self, url_prefixes, max_workers=8):
+        """Retrieve the citations for many prefixes concurrently."""
+        url_prefixes = sorted(set(url_prefixes) - set(self._entries))
+        if not url_prefixes:
+            return
+        logger.info("Retrieving citation information for %s CMIP6 datasets",
+                    len(url_prefixes))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self.get, url_prefixes))
+
+
+DEFAULT_CITATION_CACHE = CitationCache()
+
+
+def _write_citation_files(filename, provenance, citation_cache=None):
     """
     Write citation information provided by the recorded provenance.
 
@@ -48,11 +131,15 @@ def _write_citation_files(filename, provenance):
     Each cmip6 data reference has a json link. In the case of internet
     connection, cmip6 data references are saved into a bibtex file.
     Also, cmip6 data reference links are saved into a text file.
+    The cmip6 data references are taken from `citation_cache` if it is
+    given, otherwise from an in-memory cache.
     """
+    if citation_cache is None:
+        citation_cache = DEFAULT_CITATION_CACHE
     product_name = os.path.splitext(filename)[0]
 
     tags = set()
-    cmip6_json_urls = set()
+    cmip6_url_prefixes = set()
     cmip6_info_urls = set()
     other_info = set()
 
@@ -62,7 +149,7 @@ def _write_citation_files(filename, provenance):
         if cmip6_data:
             url_prefix = _make_url_prefix(item.attributes)
             cmip6_info_urls.add(_make_info_url(url_prefix))
-            cmip6_json_urls.add(_make_json_url(url_prefix))
+            cmip6_url_prefixes.add(url_prefix)
 
         # get other citation info
         references = item.get_attribute('attribute:references')
@@ -80,11 +167,12 @@ def _write_citation_files(filename, provenance):
                 # get any other data citation tags, e.g. CMIP5
                 other_info.update(references)
 
-    _save_citation_bibtex(product_name, tags, cmip6_json_urls)
+    _save_citation_bibtex(product_name, tags, cmip6_url_prefixes,
+                          citation_cache)
     _save_citation_info_txt(product_name, cmip6_info_urls, other_info)
 
 
-def _save_citation_bibtex(product_name, tags, json_urls):
+def _save_citation_bibtex(product_name, tags, url_prefixes, citation_cache):
     """Save the bibtex entries in a bibtex file."""
     citation_entries = [ESMVALTOOL_PAPER]
 
@@ -95,10 +183,10 @@ def _save_citation_bibtex(product_name, tags, json_urls):
             entries.add(_collect_bibtex_citation(tag))
         citation_entries.extend(sorted(entries))
 
-    # convert json_urls to bibtex entries
+    # convert CMIP6 Data Citation Service entries to bibtex entries
     entries = set()
-    for json_url in json_urls:
-        cmip_citation = _collect_cmip_citation(json_url)
+    for url_prefix in url_prefixes:
+        cmip_citation = citation_cache.get(url_prefix)
         if cmip_citation:
             entries.add(cmip_citation)
     citation_entries.extend(sorted(entries))
@@ -148,7 +236,7 @@ def _get_response(url):
     json_data = None
     if url.lower().startswith('https'):
         try:
-            response = requests.get(url)
+            response = requests.get(url, timeout=REQUEST_TIMEOUT)
             if response.status_code == 200:
                 json_data = response.json()
             else:
@@ -207,17 +295,6 @@ def _collect_bibtex_citation(tag):
     return entry
 
 
-@lru_cache(maxsize=1024)
-def _collect_cmip_citation(json_url):
-    """Collect information from CMIP6 Data Citation Service."""
-    json_data = _get_response(json_url)
-    if json_data:
-        bibtex_entry = _json_to_bibtex(json_data)
-    else:
-        bibtex_entry = ''
-    return bibtex_entry
-
-
 def _make_url_prefix(attribute):
     """Make url prefix based on CMIP6 Data Citation Service."""
     # the order of keys is important
@@ -229,12 +306,23 @@ def _make_url_prefix(attribute):
         'experiment_id': '',
     }
     for key, value in attribute:
-        if key.localpart in localpart:
-            localpart[key.localpart] = value
+        key = getattr(key, 'localpart', key)
+        if key in localpart:
+            localpart[key] = value
     url_prefix = '.'.join(localpart.values())
     return url_prefix
 
 
+def get_cmip6_url_prefix(attributes):
+    """Get the CMIP6 Data Citation Service prefix from file attributes.
+
+    Returns None if the attributes do not describe CMIP6 data.
+    """
+    if attributes.get('mip_era') != 'CMIP6':
+        return None
+    return _make_url_prefix(attributes.items())
+
+
 def _make_json_url(url_prefix):
     """Make json url based on CMIP6 Data Citation Service."""
     json_url = f'{CMIP6_URL_STEM}/cerarest/exportcmip6?input={url_prefix}'
@@ -49,10 +49,19 @@ def read_config_user_file(config_file, recipe_name):
         'save_intermediary_cubes': False,
         'remove_preproc_dir': True,
         'max_parallel_tasks': None,
+        'max_memory': None,
         'run_diagnostic': True,
         'profile_diagnostic': False,
         'config_developer_file': None,
         'drs': {},
+        'cache_dir': os.path.join('~', '.esmvaltool', 'cache'),
+        'file_index': False,
+        'preprocessor_cache': False,
+        'regrid_weights_cache': False,
+        'shape_mask_cache': False,
+        'citation_cache': False,
+        'cmor_tables_cache': False,
+        'offline': False,
     }
 
     for key in defaults:
@@ -64,6 +73,7 @@ def read_config_user_file(config_file, recipe_name):
 
     cfg['output_dir'] = _normalize_path(cfg['output_dir'])
     cfg['auxiliary_data_dir'] = _normalize_path(cfg['auxiliary_data_dir'])
+    cfg['cache_dir'] = _normalize_path(cfg['cache_dir'])
 
     cfg['config_developer_file'] = _normalize_path(
         cfg['config_developer_file'])
@@ -94,7 +104,10 @@ def read_config_user_file(config_file, recipe_name):
     cfg_developer = read_config_developer_file(cfg['config_developer_file'])
     for key, value in cfg_developer.items():
         CFG[key] = value
-    read_cmor_tables(CFG)
+    read_cmor_tables(
+        CFG,
+        cache_dir=cfg['cache_dir'] if cfg['cmor_tables_cache'] else None,
+    )
 
     return cfg
 
@@ -6,9 +6,12 @@
 
 import fnmatch
 import glob
+import json
 import logging
 import os
 import re
+import sqlite3
+from functools import lru_cache, partial
 from pathlib import Path
 
 import iris
@@ -18,13 +21,159 @@ from ._config import get_project_config
 logger = logging.getLogger(__name__)
 
 
-def find_files(dirnames, filenames):
+class FileIndex:
+    """Persistent index of input directories and the files they contain.
+
+    The index stores the listing of every directory that was searched
+    for input data, together with the time range of the files in it, in
+    an SQLite database. A stored listing is only used as long as the
+    modification time of the directory is unchanged, so adding or
+    removing files or directories automatically invalidates the
+    corresponding entries.
+
+    Parameters
+    ----------
+    filename: str
+        Path to the SQLite database file.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._connection = None
+
+    @property
+    def connection(self):
+        """Connection to the database, created on first use."""
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+            self._connection = sqlite3.connect(self.filename, timeout=60)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS directories ("
+                    "path TEXT PRIMARY KEY, mtime INTEGER, "
+                    "dirnames TEXT, filenames TEXT)")
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS time_ranges ("
+                    "path TEXT PRIMARY KEY, dirname TEXT, "
+                    "start_year INTEGER, end_year INTEGER)")
+                self._connection.execute(
+                    "CREATE INDEX IF NOT EXISTS time_ranges_dirname "
+                    "ON time_ranges (dirname)")
+        return self._connection
+
+    def listdir(self, dirname):
+        """Return the subdirectories and files in dirname.
+
+        Returns ``None`` if dirname is not an existing directory.
+        """
+        dirname = os.path.normpath(dirname)
+        try:
+            mtime = os.stat(dirname).st_mtime_ns
+        except OSError:
+            return None
+        row = self.connection.execute(
+            "SELECT dirnames, filenames FROM directories "
+            "WHERE path = ? AND mtime = ?", (dirname, mtime)).fetchone()
+        if row is not None:
+            return json.loads(row[0]), json.loads(row[1])
+
+        logger.debug("Updating file index for directory %s", dirname)
+        dirnames = []
+        filenames = []
+        try:
+            with os.scandir(dirname) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirnames.append(entry.name)
+                    else:
+                        filenames.append(entry.name)
+        except NotADirectoryError:
+            return None
+        dirnames.sort()
+        filenames.sort()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)",
+                (dirname, mtime, json.dumps(dirnames), json.dumps(filenames)))
+            self.connection.execute(
+                "DELETE FROM time_ranges WHERE dirname = ?", (dirname, ))
+        return dirnames, filenames
+
+    def isdir(self, path):
+        """Return True if path is an existing directory."""
+        return self.listdir(path) is not None
+
+    def walk(self, top):
+        """Walk the directory tree like :func:`os.walk` with followlinks."""
+        listing = self.listdir(top)
+        if listing is None:
+            return
+        dirnames, filenames = listing
+        yield top, dirnames, filenames
+        for dirname in dirnames:
+            yield from self.walk(os.path.join(top, dirname))
+
+    def glob_dirs(self, pattern):
+        """Return the directories matching a :mod:`glob` pattern."""
+        parts = pattern.rstrip(os.sep).split(os.sep)
+        n_fixed = next(
+            (i for i, part in enumerate(parts) if glob.has_magic(part)),
+            len(parts))
+        fixed = os.sep.join(parts[:n_fixed])
+        if not fixed:
+            fixed = os.sep if pattern.startswith(os.sep) else os.curdir
+        candidates = [fixed] if self.isdir(fixed) else []
+        for part in parts[n_fixed:]:
+            matches = []
+            for candidate in candidates:
+                dirnames = self.listdir(candidate)[0]
+                if not part.startswith('.'):
+                    dirnames = [d for d in dirnames if not d.startswith('.')]
+                if glob.has_magic(part):
+                    dirnames = fnmatch.filter(dirnames, part)
+                elif part in dirnames:
+                    dirnames = [part]
+                else:
+                    dirnames = []
+                matches.extend(os.path.join(candidate, d) for d in dirnames)
+            candidates = matches
+        if pattern.endswith(os.sep):
+            candidates = [c + os.sep for c in candidates]
+        return candidates
+
+    def get_start_end_year(self, filename):
+        """Get the start and end year of a file, using the index if known."""
+        row = self.connection.execute(
+            "SELECT start_year, end_year FROM time_ranges WHERE path = ?",
+            (filename, )).fetchone()
+        if row is not None:
+            return row[0], row[1]
+        start_year, end_year = get_start_end_year(filename)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO time_ranges VALUES (?, ?, ?, ?)",
+                (filename, os.path.dirname(filename), start_year, end_year))
+        return start_year, end_year
+
+
+@lru_cache()
+def get_file_index(cache_dir):
+    """Return the file index stored in cache_dir."""
+    return FileIndex(os.path.join(cache_dir, 'file_index.sqlite'))
+
+
+def find_files(dirnames, filenames, index=None):
     """Find files matching filenames in dirnames."""
     logger.debug("Looking for files matching %s in %s", filenames, dirnames)
 
+    if index is None:
+        walk = partial(os.walk, followlinks=True)
+    else:
+        walk = index.walk
+
     result = []
     for dirname in dirnames:
-        for path, _, files in os.walk(dirname, followlinks=True):
+        for path, _, files in walk(dirname):
             for filename in filenames:
                 matches = fnmatch.filter(files, filename)
                 result.extend(os.path.join(path, f) for f in matches)
@@ -76,14 +225,19 @@ def get_start_end_year(filename):
     return int(start_year), int(end_year)
 
 
-def select_files(filenames, start_year, end_year):
+def select_files(filenames, start_year, end_year, index=None):
     """Select files containing data between start_year and end_year.
 
     This works for filenames matching *_YYYY*-YYYY*.* or *_YYYY*.*
     """
+    if index is None:
+        _get_start_end_year = get_start_end_year
+    else:
+        _get_start_end_year = index.get_start_end_year
+
     selection = []
     for filename in filenames:
-        start, end = get_start_end_year(filename)
+        start, end = _get_start_end_year(filename)
         if start <= end_year and end >= start_year:
             selection.append(filename)
     return selection
@@ -143,7 +297,7 @@ def _apply_caps(original, lower, upper):
     return original
 
 
-def _resolve_latestversion(dirname_template):
+def _resolve_latestversion(dirname_template, index=None):
     """Resolve the 'latestversion' tag."""
     if '{latestversion}' not in dirname_template:
         return dirname_template
@@ -151,12 +305,19 @@ def _resolve_latestversion(dirname_template):
     # Find latest version
     part1, part2 = dirname_template.split('{latestversion}')
     part2 = part2.lstrip(os.sep)
-    if os.path.exists(part1):
-        versions = os.listdir(part1)
-        versions.sort(reverse=True)
+    if index is None:
+        listing = os.listdir(part1) if os.path.exists(part1) else None
+        isdir = os.path.isdir
+    else:
+        listing = index.listdir(part1)
+        if listing is not None:
+            listing = listing[0] + listing[1]
+        isdir = index.isdir
+    if listing is not None:
+        versions = sorted(listing, reverse=True)
         for version in ['latest'] + versions:
             dirname = os.path.join(part1, version, part2)
-            if os.path.isdir(dirname):
+            if isdir(dirname):
                 return dirname
 
     return dirname_template
@@ -187,7 +348,7 @@ def get_rootpath(rootpath, project):
     raise KeyError('default rootpath must be specified in config-user file')
 
 
-def _find_input_dirs(variable, rootpath, drs):
+def _find_input_dirs(variable, rootpath, drs, index=None):
     """Return a the full paths to input directories."""
     project = variable['project']
 
@@ -198,9 +359,12 @@ def _find_input_dirs(variable, rootpath, drs):
     for dirname_template in _replace_tags(path_template, variable):
         for base_path in root:
             dirname = os.path.join(base_path, dirname_template)
-            dirname = _resolve_latestversion(dirname)
-            matches = glob.glob(dirname)
-            matches = [match for match in matches if os.path.isdir(match)]
+            dirname = _resolve_latestversion(dirname, index)
+            if index is None:
+                matches = glob.glob(dirname)
+                matches = [m for m in matches if os.path.isdir(m)]
+            else:
+                matches = index.glob_dirs(dirname)
             if matches:
                 for match in matches:
                     logger.debug("Found %s", match)
@@ -218,25 +382,31 @@ def _get_filenames_glob(variable, drs):
     return filenames_glob
 
 
-def _find_input_files(variable, rootpath, drs):
-    input_dirs = _find_input_dirs(variable, rootpath, drs)
+def _find_input_files(variable, rootpath, drs, index=None):
+    input_dirs = _find_input_dirs(variable, rootpath, drs, index)
     filenames_glob = _get_filenames_glob(variable, drs)
-    files = find_files(input_dirs, filenames_glob)
+    files = find_files(input_dirs, filenames_glob, index)
 
     return (files, input_dirs, filenames_glob)
 
 
-def get_input_filelist(variable, rootpath, drs):
-    """Return the full path to input files."""
+def get_input_filelist(variable, rootpath, drs, index=None):
+    """Return the full path to input files.
+
+    If a :class:`FileIndex` is given, directory listings and the time
+    ranges of files are read from the index instead of the file system
+    wherever they are still up to date.
+    """
     # change ensemble to fixed r0i0p0 for fx variables
     # this is needed and is not a duplicate effort
     if variable['project'] == 'CMIP5' and variable['frequency'] == 'fx':
         variable['ensemble'] = 'r0i0p0'
-    (files, dirnames, filenames) = _find_input_files(variable, rootpath, drs)
+    (files, dirnames, filenames) = _find_input_files(variable, rootpath, drs,
+                                                     index)
     # do time gating only for non-fx variables
     if variable['frequency'] != 'fx':
         files = select_files(files, variable['start_year'],
-                             variable['end_year'])
+                             variable['end_year'], index)
     return (files, dirnames, filenames)
 
 
@@ -206,7 +206,8 @@ def process_recipe(recipe_file, config_user):
         "memory for keeping this number of tasks in memory.")
     logger.info(
         "If you experience memory problems, try reducing "
-        "'max_parallel_tasks' in your user configuration file.")
+        "'max_parallel_tasks' or setting 'max_memory' in your user "
+        "configuration file.")
 
     if config_user['compress_netcdf']:
         logger.warning(
@@ -2,6 +2,7 @@
 import copy
 import logging
 import os
+import threading
 
 from netCDF4 import Dataset
 from PIL import Image
@@ -15,6 +16,10 @@ logger = logging.getLogger(__name__)
 
 ESMVALTOOL_URI_PREFIX = 'https://www.esmvaltool.org/'
 
+# The HDF5 library is not always built thread safe, so only write one
+# NetCDF file at a time.
+_NETCDF_LOCK = threading.Lock()
+
 
 def update_without_duplicating(bundle, other):
     """Add new records from other provenance bundle."""
@@ -108,14 +113,21 @@ def get_task_provenance(task, recipe_entity):
 
 
 class TrackedFile(object):
-    """File with provenance tracking."""
+    """File with provenance tracking.
+
+    The provenance records describing the file itself are stored once, in
+    the file that creates them. Records of the activity and of the files it
+    was derived from are referenced instead of copied, the complete
+    provenance document is only assembled when it is requested.
+    """
 
     def __init__(self, filename, attributes, ancestors=None):
         """Create an instance of a file with provenance tracking."""
         self._filename = filename
         self.attributes = copy.deepcopy(attributes)
 
-        self.provenance = None
+        self._provenance = None
+        self._sources = []
         self.entity = None
         self.activity = None
         self._ancestors = [] if ancestors is None else ancestors
@@ -125,8 +137,12 @@ class TrackedFile(object):
         return "{}: {}".format(self.__class__.__name__, self.filename)
 
     def copy_provenance(self, target=None):
-        """Create a copy with identical provenance information."""
-        if self.provenance is None:
+        """Create a copy with identical provenance information.
+
+        Only the records describing this file are copied, records of the
+        activity and the files it was derived from are shared.
+        """
+        if self._provenance is None:
             raise ValueError("Provenance of {} not initialized".format(self))
         if target is None:
             new = TrackedFile(self.filename, self.attributes)
@@ -136,9 +152,11 @@ class TrackedFile(object):
                     "Attempt to copy provenance to incompatible file.")
             new = target
             new.attributes = copy.deepcopy(self.attributes)
-        new.provenance = copy.deepcopy(self.provenance)
-        new.entity = new.provenance.get_record(self.entity.identifier)[0]
-        new.activity = new.provenance.get_record(self.activity.identifier)[0]
+        new._provenance = ProvDocument()
+        update_without_duplicating(new._provenance, self._provenance)
+        new._sources = list(self._sources)
+        new.entity = new._provenance.get_record(self.entity.identifier)[0]
+        new.activity = self.activity
         return new
 
     @property
@@ -146,17 +164,53 @@ class TrackedFile(object):
         """Filename."""
         return self._filename
 
+    @property
+    def provenance(self):
+        """Provenance document of the file, including its ancestors.
+
+        The document is assembled from the records of this file, its
+        activity and the files it was derived from, each record is
+        included only once.
+        """
+        if self._provenance is None:
+            return None
+        provenance = ProvDocument()
+        records = set()
+        for bundle in self._get_bundles():
+            for record in bundle.records:
+                if record not in records:
+                    records.add(record)
+                    provenance.add_record(record)
+        return provenance
+
+    def _get_bundles(self):
+        """Get all provenance bundles that the file refers to."""
+        bundles = []
+        visited = set()
+        todo = [self]
+        while todo:
+            item = todo.pop()
+            if id(item) in visited:
+                continue
+            visited.add(id(item))
+            if isinstance(item, TrackedFile):
+                bundles.append(item._provenance)
+                todo.extend(reversed(item._sources))
+            else:
+                bundles.append(item)
+        return bundles
+
     def initialize_provenance(self, activity):
         """Initialize the provenance document.
 
-        Note: this also copies the ancestor provenance. Therefore, changes
-        made to ancestor provenance after calling this function will not
-        propagate into the provenance of this file.
+        Note: the provenance of the ancestors is referenced, not copied.
+        Therefore, changes made to ancestor provenance after calling this
+        function will also show up in the provenance of this file.
         """
-        if self.provenance is not None:
+        if self._provenance is not None:
             raise ValueError(
                 "Provenance of {} already initialized".format(self))
-        self.provenance = ProvDocument()
+        self._provenance = ProvDocument()
         self._initialize_namespaces()
         self._initialize_activity(activity)
         self._initialize_entity()
@@ -165,12 +219,12 @@ class TrackedFile(object):
     def _initialize_namespaces(self):
         """Inialize the namespaces."""
         for namespace in ('file', 'attribute', 'preprocessor', 'task'):
-            create_namespace(self.provenance, namespace)
+            create_namespace(self._provenance, namespace)
 
     def _initialize_activity(self, activity):
-        """Copy the preprocessor task activity."""
+        """Refer to the preprocessor task activity."""
         self.activity = activity
-        update_without_duplicating(self.provenance, activity.bundle)
+        self._sources.append(activity.bundle)
 
     def _initialize_entity(self):
         """Initialize the entity representing the file."""
@@ -179,33 +233,33 @@ class TrackedFile(object):
             for k, v in self.attributes.items()
             if k not in ('authors', 'projects')
         }
-        self.entity = self.provenance.entity('file:' + self.filename,
-                                             attributes)
+        self.entity = self._provenance.entity('file:' + self.filename,
+                                              attributes)
         attribute_to_authors(self.entity, self.attributes.get('authors', []))
         attribute_to_projects(self.entity, self.attributes.get('projects', []))
 
     def _initialize_ancestors(self, activity):
         """Register ancestor files for provenance tracking."""
         for ancestor in self._ancestors:
-            if ancestor.provenance is None:
+            if ancestor._provenance is None:
                 ancestor.initialize_provenance(activity)
-            update_without_duplicating(self.provenance, ancestor.provenance)
             self.wasderivedfrom(ancestor)
 
     def wasderivedfrom(self, other):
         """Let the file know that it was derived from other."""
+        if not self.activity:
+            raise ValueError("Activity not initialized.")
         if isinstance(other, TrackedFile):
             other_entity = other.entity
+            self._sources.append(other)
         else:
             other_entity = other
-        update_without_duplicating(self.provenance, other_entity.bundle)
-        if not self.activity:
-            raise ValueError("Activity not initialized.")
+            self._sources.append(other.bundle)
         self.entity.wasDerivedFrom(other_entity, self.activity)
 
-    def _select_for_include(self):
+    def _select_for_include(self, provenance):
         attributes = {
-            'provenance': self.provenance.serialize(format='xml'),
+            'provenance': provenance.serialize(format='xml'),
             'software': "Created with ESMValTool v{}".format(__version__),
         }
         if 'caption' in self.attributes:
@@ -214,7 +268,7 @@ class TrackedFile(object):
 
     @staticmethod
     def _include_provenance_nc(filename, attributes):
-        with Dataset(filename, 'a') as dataset:
+        with _NETCDF_LOCK, Dataset(filename, 'a') as dataset:
             for key, value in attributes.items():
                 setattr(dataset, key, value)
 
@@ -231,9 +285,9 @@ class TrackedFile(object):
         with Image.open(filename) as image:
             image.save(filename, pnginfo=pnginfo)
 
-    def _include_provenance(self):
+    def _include_provenance(self, provenance):
         """Include provenance information as metadata."""
-        attributes = self._select_for_include()
+        attributes = self._select_for_include(provenance)
 
         # List of files to attach provenance to
         files = [self.filename]
@@ -249,13 +303,14 @@ class TrackedFile(object):
 
     def save_provenance(self):
         """Export provenance information."""
-        self._include_provenance()
+        provenance = self.provenance
+        self._include_provenance(provenance)
         filename = os.path.splitext(self.filename)[0] + '_provenance'
-        self.provenance.serialize(filename + '.xml', format='xml')
+        provenance.serialize(filename + '.xml', format='xml')
         # Only plot provenance if there are not too many records.
-        if len(self.provenance.records) > 100:
+        if len(provenance.records) > 100:
             logger.debug("Not plotting large provenance tree of %s",
                          self.filename)
         else:
-            figure = prov_to_dot(self.provenance)
+            figure = prov_to_dot(provenance)
             figure.write_svg(filename + '.svg')
@@ -12,9 +12,10 @@ from netCDF4 import Dataset
 
 from . import __version__
 from . import _recipe_checks as check
+from ._citation import CitationCache, get_cmip6_url_prefix
 from ._config import (TAGS, get_activity, get_institutes, get_project_config,
                       replace_tags)
-from ._data_finder import (get_input_filelist, get_output_file,
+from ._data_finder import (get_file_index, get_input_filelist, get_output_file,
                            get_statistic_output_file)
 from ._provenance import TrackedFile, get_recipe_provenance
 from ._recipe_checks import RecipeError
@@ -24,6 +25,7 @@ from .cmor.table import CMOR_TABLES
 from .preprocessor import (DEFAULT_ORDER, FINAL_STEPS, INITIAL_STEPS,
                            MULTI_MODEL_FUNCTIONS, PreprocessingTask,
                            PreprocessorFile)
+from .preprocessor._cache import ProductCache
 from .preprocessor._derive import get_required
 from .preprocessor._download import synda_search
 from .preprocessor._io import DATASET_KEYS, concatenate_callback
@@ -197,6 +199,10 @@ def _update_target_grid(variable, variables, settings, config_user):
         # Check that MxN grid spec is correct
         parse_cell_spec(settings['regrid']['target_grid'])
 
+    if config_user['regrid_weights_cache'] and 'regrid' in settings:
+        settings['regrid']['weights_dir'] = os.path.join(
+            config_user['cache_dir'], 'regrid_weights')
+
 
 def _update_regrid_time(variable, settings):
     """Input data frequency automatically for regrid_time preprocessor."""
@@ -524,10 +530,14 @@ def _read_attributes(filename):
 
 def _get_input_files(variable, config_user):
     """Get the input files for a single dataset (locally and via download)."""
+    index = None
+    if config_user['file_index']:
+        index = get_file_index(config_user['cache_dir'])
     (input_files, dirnames,
      filenames) = get_input_filelist(variable=variable,
                                      rootpath=config_user['rootpath'],
-                                     drs=config_user['drs'])
+                                     drs=config_user['drs'],
+                                     index=index)
 
     # Set up downloading using synda if requested.
     # Do not download if files are already available locally.
@@ -655,6 +665,16 @@ def _update_extract_shape(settings, config_user):
         check.extract_shape(settings['extract_shape'])
 
 
+def _update_masks_dir(settings, config_user):
+    """Store the masks of shapes in the cache directory if requested."""
+    if not config_user['shape_mask_cache']:
+        return
+    for step in ('extract_shape', 'mask_landsea', 'mask_glaciated'):
+        if step in settings:
+            settings[step]['masks_dir'] = os.path.join(
+                config_user['cache_dir'], 'shape_masks')
+
+
 def _match_products(products, variables):
     """Match a list of input products to output product attributes."""
     grouped_products = {}
@@ -723,6 +743,7 @@ def _get_preprocessor_products(variables,
             config_user=config_user,
         )
         _update_extract_shape(settings, config_user)
+        _update_masks_dir(settings, config_user)
         _update_weighting_settings(settings, variable)
         _update_fx_settings(settings=settings,
                             variable=variable,
@@ -781,6 +802,10 @@ def _get_single_preprocessor_task(variables,
         raise RecipeError(
             "Did not find any input data for task {}".format(name))
 
+    cache = None
+    if config_user['preprocessor_cache']:
+        cache = ProductCache(config_user['cache_dir'])
+
     task = PreprocessingTask(
         products=products,
         ancestors=ancestor_tasks,
@@ -788,7 +813,10 @@ def _get_single_preprocessor_task(variables,
         order=order,
         debug=config_user['save_intermediary_cubes'],
         write_ncl_interface=config_user['write_ncl_interface'],
+        cache=cache,
     )
+    task.resource_log = os.path.join(config_user['run_dir'], name,
+                                     'resource_usage.txt')
 
     logger.info("PreprocessingTask %s created. It will create the files:\n%s",
                 task.name, '\n'.join(p.filename for p in task.products))
@@ -945,6 +973,7 @@ class Recipe:
             raw_recipe['diagnostics'], raw_recipe.get('datasets', []))
         self.entity = self._initialize_provenance(
             raw_recipe.get('documentation', {}))
+        self.citation_cache = self._initialize_citation_cache()
         self.tasks = self.initialize_tasks() if initialize_tasks else None
 
     @staticmethod
@@ -970,6 +999,13 @@ class Recipe:
 
         return get_recipe_provenance(doc, self._filename)
 
+    def _initialize_citation_cache(self):
+        """Initialize the cache of CMIP6 data citations."""
+        cache_dir = None
+        if self._cfg['citation_cache'] or self._cfg['offline']:
+            cache_dir = self._cfg['cache_dir']
+        return CitationCache(cache_dir, offline=self._cfg['offline'])
+
     def _initialize_diagnostics(self, raw_diagnostics, raw_datasets):
         """Define diagnostics in recipe."""
         logger.debug("Retrieving diagnostics from recipe")
@@ -1314,6 +1350,7 @@ class Recipe:
                     output_dir=script_cfg['output_dir'],
                     settings=script_cfg['settings'],
                     name=task_name,
+                    citation_cache=self.citation_cache,
                 )
                 task.priority = priority
                 tasks.add(task)
@@ -1352,7 +1389,22 @@ class Recipe:
         """Get human readable summary."""
         return '\n\n'.join(str(task) for task in self.tasks)
 
+    def _prefetch_citations(self):
+        """Retrieve the citations of all CMIP6 input data at once."""
+        tasks = get_flattened_tasks(self.tasks)
+        if not any(isinstance(t, DiagnosticTask) for t in tasks):
+            return
+        url_prefixes = set()
+        for task in tasks:
+            for product in task.products:
+                for ancestor in product._ancestors:
+                    url_prefixes.add(get_cmip6_url_prefix(ancestor.attributes))
+        url_prefixes.discard(None)
+        self.citation_cache.prefetch(url_prefixes)
+
     def run(self):
         """Run all tasks in the recipe."""
+        self._prefetch_citations()
         run_tasks(self.tasks,
-                  max_parallel_tasks=self._cfg['max_parallel_tasks'])
+                  max_parallel_tasks=self._cfg['max_parallel_tasks'],
+                  max_memory=self._cfg['max_memory'])
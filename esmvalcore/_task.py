@@ -3,14 +3,19 @@ import abc
 import contextlib
 import datetime
 import errno
+import heapq
+import itertools
 import logging
 import numbers
 import os
 import pprint
+import queue
+import re
 import subprocess
 import sys
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from multiprocessing import Pool
 from pathlib import Path
@@ -129,6 +134,45 @@ def resource_usage_logger(pid, filename, interval=1, children=True):
         thread.join()
 
 
+def _read_peak_memory(filename):
+    """Read the peak memory use in GB from a resource usage log."""
+    try:
+        with open(filename) as file:
+            header = file.readline().rstrip('\n').split('\t')
+            column = header.index('Memory (GB)')
+            return max(
+                (float(line.split('\t')[column]) for line in file),
+                default=0.,
+            )
+    except (OSError, ValueError, IndexError):
+        return 0.
+
+
+def _find_previous_resource_logs(resource_log, max_runs=5):
+    """Find the resource usage logs of a task from earlier recipe runs.
+
+    The output directory of a recipe run is named
+    ``<recipe name>_<YYYYmmdd>_<HHMMSS>``, so the logs written by earlier
+    runs of the same recipe can be found in the sibling directories. Only
+    the logs of the `max_runs` most recent runs are returned.
+    """
+    parts = Path(resource_log).parts
+    for i, part in enumerate(parts[:-1]):
+        match = re.fullmatch(r'(.+)_[0-9]{8}_[0-9]{6}', part)
+        if match and parts[i + 1] == 'run':
+            run_pattern = re.escape(match.group(1)) + r'_[0-9]{8}_[0-9]{6}'
+            output_dir = os.path.join(*parts[:i]) if i else os.curdir
+            try:
+                runs = sorted(d for d in os.listdir(output_dir)
+                              if d != part and re.fullmatch(run_pattern, d))
+            except OSError:
+                return []
+            logs = (os.path.join(output_dir, run, *parts[i + 1:])
+                    for run in runs)
+            return [f for f in logs if os.path.isfile(f)][-max_runs:]
+    return []
+
+
 def _py2ncl(value, var_name=''):
     """Format a structure of Python list/dict/etc items as NCL."""
     txt = var_name + ' = ' if var_name else ''
@@ -202,6 +246,53 @@ def write_ncl_settings(settings, filename, mode='wt'):
         file.write('\n')
 
 
+def _write_provenance(product, citation_cache=None):
+    """Write the provenance and citation files of a product."""
+    product.save_provenance()
+    _write_citation_files(product.filename, product.provenance,
+                          citation_cache)
+
+
+class _ProvenanceWriter:
+    """Write provenance and citation files in background threads.
+
+    Products can be released as soon as they have been submitted, call
+    :meth:`close` to wait until all files have been written.
+
+    Parameters
+    ----------
+    max_workers: int
+        Number of threads writing files.
+    max_pending: int
+        Maximum number of products waiting to be written, :meth:`submit`
+        blocks until there is room in the queue.
+    citation_cache: :class:`esmvalcore._citation.CitationCache`, optional
+        Cache of CMIP6 data citations.
+    """
+
+    def __init__(self, max_workers=4, max_pending=16, citation_cache=None):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='provenance')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = []
+        self.citation_cache = citation_cache
+
+    def submit(self, product):
+        """Schedule writing the provenance and citations of a product."""
+        self._slots.acquire()
+        future = self._executor.submit(_write_provenance, product,
+                                       self.citation_cache)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def close(self):
+        """Wait until all files have been written and raise any errors."""
+        self._executor.shutdown(wait=True)
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+
 class BaseTask:
     """Base class for defining task classes."""
 
@@ -213,6 +304,7 @@ class BaseTask:
         self.name = name
         self.activity = None
         self.priority = 0
+        self.resource_log = None
 
     def initialize_provenance(self, recipe_entity):
         """Initialize task provenance activity."""
@@ -250,6 +342,17 @@ class BaseTask:
     def _run(self, input_files):
         """Run task."""
 
+    def estimate_memory(self):
+        """Estimate the peak memory use of the task in GB.
+
+        The estimate is the largest peak memory use recorded for this task
+        in earlier runs of the recipe, if any.
+        """
+        if self.resource_log is None:
+            return 0.
+        previous_logs = _find_previous_resource_logs(self.resource_log)
+        return max((_read_peak_memory(f) for f in previous_logs), default=0.)
+
     def str(self):
         """Return a nicely formatted description."""
         def _indent(txt):
@@ -268,12 +371,19 @@ class DiagnosticError(Exception):
 class DiagnosticTask(BaseTask):
     """Task for running a diagnostic."""
 
-    def __init__(self, script, settings, output_dir, ancestors=None, name=''):
+    def __init__(self,
+                 script,
+                 settings,
+                 output_dir,
+                 ancestors=None,
+                 name='',
+                 citation_cache=None):
         """Create a diagnostic task."""
         super().__init__(ancestors=ancestors, name=name)
         self.script = script
         self.settings = settings
         self.output_dir = output_dir
+        self.citation_cache = citation_cache
         self.cmd = self._initialize_cmd()
         self.env = self._initialize_env()
         self.log = Path(settings['run_dir']) / 'log.txt'
@@ -568,6 +678,7 @@ class DiagnosticTask(BaseTask):
         }
 
         valid = True
+        writer = _ProvenanceWriter(citation_cache=self.citation_cache)
         for filename, attributes in table.items():
             # copy to avoid updating other entries if file contains anchors
             attributes = deepcopy(attributes)
@@ -597,9 +708,9 @@ class DiagnosticTask(BaseTask):
 
             product = TrackedFile(filename, attributes, ancestors)
             product.initialize_provenance(self.activity)
-            product.save_provenance()
-            _write_citation_files(product.filename, product.provenance)
+            writer.submit(product)
             self.products.add(product)
+        writer.close()
 
         if not valid:
             logger.warning(
@@ -627,20 +738,17 @@ def get_flattened_tasks(tasks):
 
 def get_independent_tasks(tasks):
     """Return a set of independent tasks."""
-    independent_tasks = set()
     all_tasks = get_flattened_tasks(tasks)
-    for task in all_tasks:
-        if not any(task in t.ancestors for t in all_tasks):
-            independent_tasks.add(task)
-    return independent_tasks
+    ancestors = {a for task in all_tasks for a in task.ancestors}
+    return all_tasks - ancestors
 
 
-def run_tasks(tasks, max_parallel_tasks=None):
+def run_tasks(tasks, max_parallel_tasks=None, max_memory=None):
     """Run tasks."""
     if max_parallel_tasks == 1:
         _run_tasks_sequential(tasks)
     else:
-        _run_tasks_parallel(tasks, max_parallel_tasks)
+        _run_tasks_parallel(tasks, max_parallel_tasks, max_memory)
 
 
 def _run_tasks_sequential(tasks):
@@ -653,53 +761,156 @@ def _run_tasks_sequential(tasks):
         task.run()
 
 
-def _run_tasks_parallel(tasks, max_parallel_tasks=None):
-    """Run tasks in parallel."""
-    scheduled = get_flattened_tasks(tasks)
+class _TaskGraph:
+    """Keep track of which tasks are ready to run.
+
+    Each task counts the number of ancestors that have not completed yet.
+    When a task completes, the counters of the tasks depending on it are
+    decreased and tasks without unfinished ancestors are added to a queue
+    of ready tasks, ordered by priority.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = get_flattened_tasks(tasks)
+        self._n_waiting = {}
+        self._children = {task: [] for task in self.tasks}
+        self._ready = []
+        self._ready_since = {}
+        self._counter = itertools.count()
+        for task in self.tasks:
+            ancestors = set(task.ancestors)
+            self._n_waiting[task] = len(ancestors)
+            for ancestor in ancestors:
+                self._children[ancestor].append(task)
+        for task in self.tasks:
+            if not self._n_waiting[task]:
+                self._push(task)
+
+    def _push(self, task):
+        """Add a task to the queue of ready tasks."""
+        # The counter keeps the order of tasks with equal priority stable
+        heapq.heappush(self._ready,
+                       (task.priority, next(self._counter), task))
+        self._ready_since[task] = time.time()
+
+    def __bool__(self):
+        """Return True if there are tasks ready to run."""
+        return bool(self._ready)
+
+    def pop(self, accept=None):
+        """Return the highest priority ready task and its queue wait time.
+
+        If ``accept`` is given and ``accept(task)`` is False for the highest
+        priority ready task, return ``None`` and keep the task at the head
+        of the queue. Lower priority tasks are never started ahead of it, so
+        a task waiting for resources cannot be starved by smaller tasks.
+        """
+        if accept is not None and not accept(self._ready[0][-1]):
+            return None
+        task = heapq.heappop(self._ready)[-1]
+        return task, time.time() - self._ready_since.pop(task)
+
+    def done(self, task):
+        """Mark a task as completed."""
+        for child in self._children[task]:
+            self._n_waiting[child] -= 1
+            if not self._n_waiting[child]:
+                self._push(child)
+
+
+def _run_tasks_parallel(tasks, max_parallel_tasks=None, max_memory=None):
+    """Run tasks in parallel.
+
+    New tasks are submitted to the pool as soon as a running task
+    completes and all ancestors of the new task have completed.
+
+    If ``max_memory`` (in GB) is given, a task is only started if the
+    estimated peak memory use of all running tasks, including the new
+    one, stays below ``max_memory``. A task is always started if no other
+    tasks are running, so tasks that need more memory still run, one at a
+    time. Tasks are started in order of priority: while the next task does
+    not fit, no other tasks are started, so the memory it needs becomes
+    available as running tasks complete.
+    """
+    graph = _TaskGraph(tasks)
+    completed = queue.Queue()
     running = {}
+    memory = {}
+    in_use = 0.
 
-    n_tasks = n_scheduled = len(scheduled)
-    n_running = 0
+    n_tasks = len(graph.tasks)
+    n_done = 0
 
     if max_parallel_tasks is None:
         max_parallel_tasks = os.cpu_count()
     max_parallel_tasks = min(max_parallel_tasks, n_tasks)
     logger.info("Running %s tasks using %s processes", n_tasks,
                 max_parallel_tasks)
-
-    def done(task):
-        """Assume a task is done if it not scheduled or running."""
-        return not (task in scheduled or task in running)
+    if max_memory is not None:
+        logger.info("Running tasks using at most %s GB of memory (estimated)",
+                    max_memory)
+
+    def _notify(task):
+        """Create a callback that reports that task has completed."""
+        def callback(_):
+            completed.put(task)
+
+        return callback
+
+    def _estimate_memory(task):
+        """Estimate the memory use of a task, only once."""
+        if task not in memory:
+            memory[task] = task.estimate_memory()
+            logger.debug("Estimated peak memory use of task %s is %.1f GB",
+                         task.name, memory[task])
+        return memory[task]
+
+    def _fits(task):
+        """Check if a task fits in the available memory."""
+        if max_memory is None or not running:
+            return True
+        return in_use + _estimate_memory(task) <= max_memory
 
     with Pool(processes=max_parallel_tasks) as pool:
-        while scheduled or running:
+        while n_done < n_tasks:
             # Submit new tasks to pool
-            for task in sorted(scheduled, key=lambda t: t.priority):
-                if len(running) >= max_parallel_tasks:
+            while graph and len(running) < max_parallel_tasks:
+                item = graph.pop(_fits)
+                if item is None:
                     break
-                if all(done(t) for t in task.ancestors):
-                    future = pool.apply_async(_run_task, [task])
-                    running[task] = future
-                    scheduled.remove(task)
-
-            # Handle completed tasks
-            ready = {t for t in running if running[t].ready()}
-            for task in ready:
-                _copy_results(task, running[task])
-                running.pop(task)
-
-            # Wait if there are still tasks running
-            if running:
-                time.sleep(0.1)
+                task, wait_time = item
+                logger.debug("Task %s was ready to run for %.1f seconds "
+                             "before starting", task.name, wait_time)
+                if (max_memory is not None
+                        and _estimate_memory(task) > max_memory):
+                    logger.warning(
+                        "Task %s is estimated to need %.1f GB of memory, "
+                        "more than the maximum of %s GB, running it without "
+                        "other tasks", task.name, memory[task], max_memory)
+                if max_memory is not None:
+                    in_use += _estimate_memory(task)
+                running[task] = pool.apply_async(
+                    _run_task,
+                    [task],
+                    callback=_notify(task),
+                    error_callback=_notify(task),
+                )
+
+            # Wait for a task to complete and handle the result
+            task = completed.get()
+            _copy_results(task, running.pop(task))
+            if max_memory is not None:
+                # Reset when idle, so rounding errors do not accumulate
+                in_use = in_use - memory[task] if running else 0.
+            graph.done(task)
+            n_done += 1
 
             # Log progress message
-            if len(scheduled) != n_scheduled or len(running) != n_running:
-                n_scheduled, n_running = len(scheduled), len(running)
-                n_done = n_tasks - n_scheduled - n_running
-                logger.info(
-                    "Progress: %s tasks running, %s tasks waiting for "
-                    "ancestors, %s/%s done", n_running, n_scheduled, n_done,
-                    n_tasks)
+            n_running = len(running)
+            logger.info(
+                "Progress: %s tasks running, %s tasks waiting for "
+                "ancestors, %s/%s done", n_running,
+                n_tasks - n_done - n_running, n_done, n_tasks)
 
         logger.info("Successfully completed all tasks.")
         pool.close()
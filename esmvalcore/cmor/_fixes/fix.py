@@ -1,6 +1,6 @@
 """Contains the base class for dataset fixes"""
+import functools
 import importlib
-import inspect
 import os
 
 from ..table import CMOR_TABLES
@@ -150,26 +150,8 @@ class Fix:
         """
         cmor_table = CMOR_TABLES[project]
         vardef = cmor_table.get_variable(mip, short_name)
-
-        project = project.replace('-', '_').lower()
-        dataset = dataset.replace('-', '_').lower()
-        short_name = short_name.replace('-', '_').lower()
-
-        fixes = []
-        try:
-            fixes_module = importlib.import_module(
-                'esmvalcore.cmor._fixes.{0}.{1}'.format(project, dataset))
-
-            classes = inspect.getmembers(fixes_module, inspect.isclass)
-            classes = dict((name.lower(), value) for name, value in classes)
-            for fix_name in (short_name, 'allvars'):
-                try:
-                    fixes.append(classes[fix_name](vardef))
-                except KeyError:
-                    pass
-        except ImportError:
-            pass
-        return fixes
+        fix_classes = _get_fix_classes(project, dataset, short_name)
+        return [fix_class(vardef) for fix_class in fix_classes]
 
     @staticmethod
     def get_fixed_filepath(output_dir, filepath):
@@ -189,3 +171,29 @@ class Fix:
         if not os.path.isdir(output_dir):
             os.makedirs(output_dir)
         return os.path.join(output_dir, os.path.basename(filepath))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_fix_classes(project, dataset, short_name):
+    """Get the classes of the fixes for a given dataset and variable.
+
+    The fixes module of a dataset is only imported the first time its
+    fixes are requested and the result is memoized, so looking up the
+    fixes for every file and preprocessing step is cheap.
+    """
+    project = project.replace('-', '_').lower()
+    dataset = dataset.replace('-', '_').lower()
+    short_name = short_name.replace('-', '_').lower()
+
+    try:
+        fixes_module = importlib.import_module(
+            'esmvalcore.cmor._fixes.{0}.{1}'.format(project, dataset))
+    except ImportError:
+        return ()
+    classes = {
+        name.lower(): value
+        for name, value in vars(fixes_module).items()
+        if isinstance(value, type)
+    }
+    return tuple(classes[fix_name] for fix_name in (short_name, 'allvars')
+                 if fix_name in classes)
@@ -3,6 +3,7 @@ import logging
 from enum import IntEnum
 
 import cf_units
+import dask
 import iris.coord_categorisation
 import iris.coords
 import iris.exceptions
@@ -62,6 +63,7 @@ class CMORCheck():
     _does_msg = '{}: does not {}'
     _is_msg = '{}: is not {}'
     _vals_msg = '{}: has values {} {}'
+    _count_msg = '{}: has {} values {} {}'
     _contain_msg = '{}: does not contain {} {}'
 
     def __init__(self,
@@ -133,7 +135,9 @@ class CMORCheck():
     def check_data(self, logger=None):
         """Check the cube data.
 
-        Performs all the tests that require to have the data in memory.
+        Performs all the tests that require the data. Lazy data is not
+        loaded into memory, instead the checks are computed chunk by chunk
+        in a single pass over the data.
         Assumes that metadata is correct, so you must call check_metadata prior
         to this.
 
@@ -160,6 +164,7 @@ class CMORCheck():
             if str(self._cube.units) != units:
                 self._cube.convert_units(units)
 
+        self._check_data_range()
         self._check_coords_data()
 
         self.report_warnings()
@@ -396,6 +401,33 @@ class CMORCheck():
 
             self._check_coord(coordinate, coord, var_name)
 
+    def _check_data_range(self):
+        """Check that the data is within the valid range of the variable."""
+        limits = {}
+        if self._cmor_var.valid_min:
+            limits['valid_min'] = float(self._cmor_var.valid_min)
+        if self._cmor_var.valid_max:
+            limits['valid_max'] = float(self._cmor_var.valid_max)
+        if not limits:
+            return
+
+        data = self._cube.core_data()
+        counts = {}
+        if 'valid_min' in limits:
+            counts['valid_min'] = (data < limits['valid_min']).sum()
+        if 'valid_max' in limits:
+            counts['valid_max'] = (data > limits['valid_max']).sum()
+        # Count all violations in a single pass over the (lazy) data.
+        counts = dict(zip(counts, dask.compute(*counts.values())))
+
+        operators = {'valid_min': '<', 'valid_max': '>'}
+        for name, count in counts.items():
+            count = int(np.ma.filled(count, 0))
+            if count:
+                self.report_warning(self._count_msg, self._cube.var_name,
+                                    count, operators[name] + ' ' + name + ' =',
+                                    limits[name])
+
     def _check_coords_data(self):
         """Check coordinate data."""
         for coordinate in self._cmor_var.coordinates.values():
@@ -882,7 +914,8 @@ def cmor_check_data(cube, cmor_table, mip, short_name, frequency,
                     check_level=CheckLevels.DEFAULT):
     """Check if data conforms to variable's CMOR definiton.
 
-    The checks performed at this step require the data in memory.
+    The checks performed at this step require the data, but lazy data is
+    checked chunk by chunk without loading it into memory.
 
     Parameters
     ----------
@@ -7,19 +7,27 @@ available for the other components of ESMValTool
 import copy
 import errno
 import glob
+import hashlib
 import json
 import logging
 import os
+import pickle
+import tempfile
 from functools import total_ordering
 from pathlib import Path
 
 import yaml
 
+from .._version import __version__
+
 logger = logging.getLogger(__name__)
 
 CMOR_TABLES = {}
 """dict of str, obj: CMOR info objects."""
 
+CMOR_TABLES_CACHE_MAX_BYTES = 256 * 2**20
+"""int: Maximum size in bytes of the compiled CMOR tables stored on disk."""
+
 
 def get_var_info(project, mip, short_name):
     """Get variable information.
@@ -36,13 +44,118 @@ def get_var_info(project, mip, short_name):
     return CMOR_TABLES[project].get_variable(mip, short_name)
 
 
-def read_cmor_tables(cfg_developer=None):
+def _get_tables_key(info_class, cmor_folder, kwargs):
+    """Compute a hash of the CMOR table files and the reader settings."""
+    hasher = hashlib.sha256()
+    settings = (__version__, info_class.__name__, sorted(kwargs.items()))
+    hasher.update(repr(settings).encode('utf-8'))
+    for filename in sorted(glob.glob(os.path.join(cmor_folder, '*'))):
+        if not os.path.isfile(filename):
+            continue
+        hasher.update(os.path.basename(filename).encode('utf-8'))
+        with open(filename, 'rb') as file:
+            hasher.update(file.read())
+    return hasher.hexdigest()
+
+
+def _prune_cache(cache_dir, keep, max_bytes):
+    """Remove the least recently used compiled tables above `max_bytes`."""
+    files = []
+    for filename in glob.glob(os.path.join(cache_dir, '*.pickle')):
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, filename))
+    total = sum(size for _, size, _ in files)
+    for _, size, filename in sorted(files):
+        if total <= max_bytes:
+            break
+        if filename == keep:
+            continue
+        try:
+            os.remove(filename)
+        except OSError:
+            continue
+        total -= size
+        logger.debug("Removed compiled CMOR tables %s", filename)
+
+
+def _is_owned(filename):
+    """Check that a file belongs to the current user."""
+    if not hasattr(os, 'getuid'):
+        return True
+    return os.stat(filename).st_uid == os.getuid()
+
+
+def _load_cmor_info(info_class, cmor_tables_path, cache_dir=None,
+                    default=None, **kwargs):
+    """Create a CMOR info object, using the compiled tables if available.
+
+    If `cache_dir` is given, the parsed tables are pickled to it, under a
+    key computed from the contents of the table files, so later runs and
+    other processes can load them with a single read instead of parsing
+    all table files again. Only compiled tables that belong to the current
+    user are loaded.
+    """
+    if cmor_tables_path is None:
+        cmor_folder = CustomInfo.get_cmor_folder()
+        args = ()
+    else:
+        cmor_folder = os.path.join(
+            info_class._get_cmor_path(cmor_tables_path), 'Tables')
+        args = (cmor_tables_path, )
+
+    if cache_dir is None:
+        info = info_class(*args, **kwargs)
+        if default is not None:
+            info.default = default
+        return info
+
+    key = _get_tables_key(info_class, cmor_folder, kwargs)
+    cache_dir = os.path.join(os.path.expanduser(cache_dir), 'cmor_tables')
+    filename = os.path.join(cache_dir, key + '.pickle')
+
+    info = None
+    if os.path.exists(filename):
+        try:
+            if not _is_owned(filename):
+                raise OSError("file belongs to another user")
+            with open(filename, 'rb') as file:
+                info = pickle.load(file)
+            # Mark the file as recently used
+            os.utime(filename)
+        except Exception as exc:
+            logger.debug("Unable to load compiled CMOR tables from %s: %s",
+                         filename, exc)
+    if info is None:
+        info = info_class(*args, **kwargs)
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=cache_dir,
+                                             delete=False) as file:
+                pickle.dump(info, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(file.name, filename)
+            _prune_cache(cache_dir, filename, CMOR_TABLES_CACHE_MAX_BYTES)
+        except OSError as exc:
+            logger.debug("Unable to store compiled CMOR tables in %s: %s",
+                         cache_dir, exc)
+
+    if default is not None:
+        info.default = default
+    return info
+
+
+def read_cmor_tables(cfg_developer=None, cache_dir=None):
     """Read cmor tables required in the configuration.
 
     Parameters
     ----------
     cfg_developer : dict of str
         Parsed config-developer file
+    cache_dir : str, optional
+        Directory where the compiled CMOR tables are stored. If None, the
+        tables are always parsed and nothing is written to disk.
 
     """
     if cfg_developer is None:
@@ -50,7 +163,7 @@ def read_cmor_tables(cfg_developer=None):
         with cfg_file.open() as file:
             cfg_developer = yaml.safe_load(file)
 
-    custom = CustomInfo()
+    custom = _load_cmor_info(CustomInfo, None, cache_dir)
     CMOR_TABLES.clear()
     CMOR_TABLES['custom'] = custom
     install_dir = os.path.dirname(os.path.realpath(__file__))
@@ -64,20 +177,26 @@ def read_cmor_tables(cfg_developer=None):
         default_table_prefix = project.get('cmor_default_table_prefix', '')
 
         if cmor_type == 'CMIP3':
-            CMOR_TABLES[table] = CMIP3Info(
+            CMOR_TABLES[table] = _load_cmor_info(
+                CMIP3Info,
                 table_path,
+                cache_dir,
                 default=custom,
                 strict=cmor_strict,
             )
         elif cmor_type == 'CMIP5':
-            CMOR_TABLES[table] = CMIP5Info(
+            CMOR_TABLES[table] = _load_cmor_info(
+                CMIP5Info,
                 table_path,
+                cache_dir,
                 default=custom,
                 strict=cmor_strict,
             )
         elif cmor_type == 'CMIP6':
-            CMOR_TABLES[table] = CMIP6Info(
+            CMOR_TABLES[table] = _load_cmor_info(
+                CMIP6Info,
                 table_path,
+                cache_dir,
                 default=custom,
                 strict=cmor_strict,
                 default_table_prefix=default_table_prefix)
@@ -341,6 +460,9 @@ class JsonInfo(object):
 
     Provides common utility methods to read json variables
     """
+
+    __slots__ = ('_json_data', )
+
     def __init__(self):
         self._json_data = {}
 
@@ -385,6 +507,22 @@ class JsonInfo(object):
 
 class VariableInfo(JsonInfo):
     """Class to read and store variable information."""
+
+    __slots__ = (
+        'table_type',
+        'modeling_realm',
+        'short_name',
+        'standard_name',
+        'long_name',
+        'units',
+        'valid_min',
+        'valid_max',
+        'frequency',
+        'positive',
+        'dimensions',
+        'coordinates',
+    )
+
     def __init__(self, table_type, short_name):
         """
         Class to read and store variable information.
@@ -467,10 +605,30 @@ class VariableInfo(JsonInfo):
         self.frequency = self._read_json_variable('frequency', default_freq)
 
         self.dimensions = self._read_json_variable('dimensions').split()
+        # The raw data is no longer needed and would only take up memory.
+        self._json_data = None
 
 
 class CoordinateInfo(JsonInfo):
     """Class to read and store coordinate information."""
+
+    __slots__ = (
+        'name',
+        'generic_level',
+        'axis',
+        'value',
+        'standard_name',
+        'long_name',
+        'out_name',
+        'var_name',
+        'units',
+        'stored_direction',
+        'requested',
+        'valid_min',
+        'valid_max',
+        'must_have_bounds',
+    )
+
     def __init__(self, name):
         """
         Class to read and store coordinate information.
@@ -540,6 +698,8 @@ class CoordinateInfo(JsonInfo):
         self.valid_max = self._read_json_variable('valid_max')
         self.requested = self._read_json_list_variable('requested')
         self.must_have_bounds = self._read_json_variable('must_have_bounds')
+        # The raw data is no longer needed and would only take up memory.
+        self._json_data = None
 
 
 class CMIP5Info(object):
@@ -589,6 +749,12 @@ class CMIP5Info(object):
                     print(msg)
                 raise
 
+    def __getstate__(self):
+        """Get the state for pickling, without the table file reader."""
+        state = self.__dict__.copy()
+        state['_current_table'] = None
+        return state
+
     @staticmethod
     def _get_cmor_path(cmor_tables_path):
         if os.path.isdir(cmor_tables_path):
@@ -790,8 +956,7 @@ class CustomInfo(CMIP5Info):
 
     """
     def __init__(self, cmor_tables_path=None):
-        cwd = os.path.dirname(os.path.realpath(__file__))
-        self._cmor_folder = os.path.join(cwd, 'tables', 'custom')
+        self._cmor_folder = self.get_cmor_folder()
         self.tables = {}
         self.var_to_freq = {}
         table = TableInfo()
@@ -817,6 +982,12 @@ class CustomInfo(CMIP5Info):
                     print(msg)
                 raise
 
+    @staticmethod
+    def get_cmor_folder():
+        """Get the directory containing the custom tables."""
+        cwd = os.path.dirname(os.path.realpath(__file__))
+        return os.path.join(cwd, 'tables', 'custom')
+
     def get_table(self, table):
         """
         Search and return the table info.
@@ -2,20 +2,22 @@
 import copy
 import inspect
 import logging
+import os
 from pprint import pformat
 
 from iris.cube import Cube
 
 from .._provenance import TrackedFile
-from .._task import BaseTask
+from .._task import BaseTask, resource_usage_logger
 from ._area import (area_statistics, extract_named_regions, extract_region,
                     extract_shape, meridional_statistics, zonal_statistics)
+from ._cache import get_cache_key, get_file_fingerprint
 from ._cycles import amplitude
 from ._derive import derive
 from ._detrend import detrend
 from ._download import download
-from ._io import (_get_debug_filename, cleanup, concatenate, load, save,
-                  write_metadata)
+from ._io import (_get_data_size, _get_debug_filename, cleanup, concatenate,
+                  load, save, write_metadata)
 from ._mask import (mask_above_threshold, mask_below_threshold,
                     mask_fillvalues, mask_glaciated, mask_inside_range,
                     mask_landsea, mask_landseaice, mask_outside_range)
@@ -138,6 +140,10 @@ MULTI_MODEL_FUNCTIONS = {
     'mask_fillvalues',
 }
 
+# Ratio of the peak memory use of a preprocessor step to the size of its
+# input data, see the section on memory use in the documentation.
+MEMORY_EFFICIENCY = 3
+
 
 def _get_itype(step):
     """Get the input type of a preprocessor function."""
@@ -283,6 +289,9 @@ class PreprocessorFile(TrackedFile):
         self._cubes = None
         self._prepared = False
 
+        self.cache_key = None
+        self.derived_from = set()
+
     def check(self):
         """Check preprocessor settings."""
         check_preprocessor_settings(self.settings)
@@ -339,6 +348,32 @@ class PreprocessorFile(TrackedFile):
         """Check if the file is closed."""
         return self._cubes is None
 
+    def wasderivedfrom(self, other):
+        """Let the file know that it was derived from other."""
+        super().wasderivedfrom(other)
+        if isinstance(other, TrackedFile):
+            self.derived_from.add(other.filename)
+
+    def set_cache_key(self, order, inputs=()):
+        """Compute the key of the file in the preprocessed file cache.
+
+        The key is set to None if any of the input files is not available.
+        """
+        inputs = list(inputs)
+        for ancestor in self._ancestors:
+            if isinstance(ancestor, PreprocessorFile):
+                key = ancestor.cache_key
+            else:
+                try:
+                    key = get_file_fingerprint(ancestor.filename)
+                except OSError:
+                    key = None
+            if key is None:
+                self.cache_key = None
+                return
+            inputs.append(key)
+        self.cache_key = get_cache_key(self.settings, inputs, order)
+
     def _initialize_entity(self):
         """Initialize the entity representing the file."""
         super(PreprocessorFile, self)._initialize_entity()
@@ -383,6 +418,7 @@ class PreprocessingTask(BaseTask):
             order=DEFAULT_ORDER,
             debug=None,
             write_ncl_interface=False,
+            cache=None,
     ):
         """Initialize"""
         _check_multi_model_settings(products)
@@ -390,6 +426,109 @@ class PreprocessingTask(BaseTask):
         self.order = list(order)
         self.debug = debug
         self.write_ncl_interface = write_ncl_interface
+        # Intermediary files cannot be restored from the cache.
+        self.cache = None if debug else cache
+        if self.cache is not None:
+            self._set_cache_keys()
+
+    def estimate_memory(self):
+        """Estimate the peak memory use of the task in GB.
+
+        The estimate is based on the size in memory of the input data and
+        the number of datasets that are kept in memory at the same time:
+        one for single model steps and all for multi model steps. If the
+        task used more memory in earlier runs of the recipe, that is used
+        instead.
+        """
+        sizes = [
+            sum(_get_data_size(f) for f in product.files)
+            for product in self.products
+        ]
+        if any(step in product.settings for product in self.products
+               for step in MULTI_MODEL_FUNCTIONS):
+            size = sum(sizes)
+        else:
+            size = max(sizes, default=0)
+        estimate = MEMORY_EFFICIENCY * size / 2**30
+        return max(estimate, super().estimate_memory())
+
+    def _get_statistic_products(self):
+        """Get the multi model statistic output products by statistic."""
+        step = 'multi_model_statistics'
+        input_products = [p for p in self.products if step in p.settings]
+        if input_products:
+            return input_products[0].settings[step].get('output_products', {})
+        return {}
+
+    def _set_cache_keys(self):
+        """Compute the cache keys of all products.
+
+        The output of multi model steps depends on all products in the
+        task, so in that case the keys of all products are included in
+        the key of each product.
+        """
+        for product in self.products:
+            product.set_cache_key(self.order)
+        if not any(step in product.settings for product in self.products
+                   for step in MULTI_MODEL_FUNCTIONS):
+            return
+        keys = [product.cache_key for product in self.products]
+        if None in keys:
+            for product in self.products:
+                product.cache_key = None
+            return
+        keys.sort()
+        for product in self.products:
+            product.set_cache_key(self.order, [keys])
+        for statistic, product in self._get_statistic_products().items():
+            product.set_cache_key(self.order, [statistic, keys])
+
+    def _load_from_cache(self):
+        """Restore products from the cache.
+
+        For tasks with multi model steps, products are only restored if
+        all of them are available. Returns the set of restored products.
+        """
+        if self.cache is None:
+            return set()
+        products = self.products | set(
+            self._get_statistic_products().values())
+        cached = {
+            p
+            for p in products
+            if p.cache_key is not None and p.cache_key in self.cache
+        }
+        if cached != products and any(
+                step in product.settings for product in self.products
+                for step in MULTI_MODEL_FUNCTIONS):
+            cached = set()
+
+        by_key = {p.cache_key: p for p in products}
+        for product in cached:
+            record = self.cache.load(product.cache_key, product.filename)
+            for key in record['derived_from']:
+                product.wasderivedfrom(by_key[key])
+        if cached:
+            logger.info("Using %s of %s preprocessed files from cache %s",
+                        len(cached), len(products), self.cache.cache_dir)
+        return cached
+
+    def _store_in_cache(self, products):
+        """Store newly preprocessed products in the cache."""
+        if self.cache is None:
+            return
+        by_filename = {p.filename: p for p in self.products}
+        for product in products:
+            if product.cache_key is None or not os.path.exists(
+                    product.filename):
+                continue
+            record = {
+                'derived_from':
+                sorted(by_filename[f].cache_key
+                       for f in product.derived_from
+                       if f in by_filename and f != product.filename),
+            }
+            self.cache.store(product.cache_key, product.filename, record)
 
     def _initialize_product_provenance(self):
         """Initialize product provenance."""
@@ -397,31 +536,33 @@ class PreprocessingTask(BaseTask):
             product.initialize_provenance(self.activity)
 
         # Hacky way to initialize the multi model products as well.
-        step = 'multi_model_statistics'
-        input_products = [p for p in self.products if step in p.settings]
-        if input_products:
-            statistic_products = input_products[0].settings[step].get(
-                'output_products', {}).values()
-            for product in statistic_products:
-                product.initialize_provenance(self.activity)
+        for product in self._get_statistic_products().values():
+            product.initialize_provenance(self.activity)
 
     def _run(self, _):
         """Run the preprocessor."""
+        if self.resource_log is None:
+            return self._run_preprocessor()
+        os.makedirs(os.path.dirname(self.resource_log), exist_ok=True)
+        with resource_usage_logger(os.getpid(), self.resource_log,
+                                   children=False):
+            return self._run_preprocessor()
+
+    def _run_preprocessor(self):
+        """Run all preprocessor steps on all products."""
         self._initialize_product_provenance()
+        cached = self._load_from_cache()
+        products = self.products - cached
 
-        steps = {
-            step
-            for product in self.products for step in product.settings
-        }
+        steps = {step for product in products for step in product.settings}
         blocks = get_step_blocks(steps, self.order)
         for block in blocks:
             logger.debug("Running block %s", block)
             if block[0] in MULTI_MODEL_FUNCTIONS:
                 for step in block:
-                    self.products = _apply_multimodel(self.products, step,
-                                                      self.debug)
+                    products = _apply_multimodel(products, step, self.debug)
             else:
-                for product in self.products:
+                for product in products:
                     logger.debug("Applying single-model steps to %s", product)
                     for step in block:
                         if step in product.settings:
@@ -429,8 +570,10 @@ class PreprocessingTask(BaseTask):
                     if block == blocks[-1]:
                         product.close()
 
-        for product in self.products:
+        for product in products:
             product.close()
+        self.products = products | cached
+        self._store_in_cache(products)
         metadata_files = write_metadata(self.products,
                                         self.write_ncl_interface)
         return metadata_files
@@ -14,8 +14,10 @@ import shapely.ops
 from dask import array as da
 from iris.exceptions import CoordinateNotFoundError
 
-from ._shared import (get_iris_analysis_operation, guess_bounds,
-                      operator_accept_weights)
+from ._shapes import MASK_CACHE, contains, get_mask_key
+from ._shared import (broadcast_weights, get_area_weights,
+                      get_iris_analysis_operation, guess_bounds,
+                      is_broadcastable, load_fx_cube, operator_accept_weights)
 
 logger = logging.getLogger(__name__)
 
@@ -156,9 +158,12 @@ def meridional_statistics(cube, operator):
         raise ValueError(msg)
 
 
-def tile_grid_areas(cube, fx_files):
+def get_grid_areas(cube, fx_files):
     """
-    Tile the grid area data to match the dataset cube.
+    Load the grid area data so it can be broadcast against the dataset cube.
+
+    The grid areas are not copied along the leading (time and level)
+    dimensions of the cube, these get length one instead.
 
     Parameters
     ----------
@@ -169,8 +174,9 @@ def tile_grid_areas(cube, fx_files):
 
     Returns
     -------
-    iris.cube.Cube
-        Freshly tiled grid areas cube.
+    dask.array.Array
+        Grid areas with the same number of dimensions as the cube, or None
+        if no fx_files are available.
     """
     grid_areas = None
     if fx_files:
@@ -178,20 +184,16 @@ def tile_grid_areas(cube, fx_files):
             if fx_file is None:
                 continue
             logger.info('Attempting to load %s from file: %s', key, fx_file)
-            fx_cube = iris.load_cube(fx_file)
+            fx_cube = load_fx_cube(fx_file)
 
             grid_areas = fx_cube.core_data()
-            if cube.ndim == 4 and grid_areas.ndim == 2:
-                grid_areas = da.tile(grid_areas,
-                                     [cube.shape[0], cube.shape[1], 1, 1])
-            elif cube.ndim == 4 and grid_areas.ndim == 3:
-                grid_areas = da.tile(grid_areas, [cube.shape[0], 1, 1, 1])
-            elif cube.ndim == 3 and grid_areas.ndim == 2:
-                grid_areas = da.tile(grid_areas, [cube.shape[0], 1, 1])
-            else:
+            if (cube.ndim not in (3, 4) or grid_areas.ndim < 2
+                    or grid_areas.ndim >= cube.ndim):
                 raise ValueError('Grid and dataset number of dimensions not '
                                  'recognised: {} and {}.'
                                  ''.format(cube.ndim, grid_areas.ndim))
+            grid_areas = grid_areas.reshape(
+                (1, ) * (cube.ndim - grid_areas.ndim) + grid_areas.shape)
     return grid_areas
 
 
@@ -247,7 +249,7 @@ def area_statistics(cube, operator, fx_variables=None):
     ValueError
         if input data cube has different shape than grid area weights
     """
-    grid_areas = tile_grid_areas(cube, fx_variables)
+    grid_areas = get_grid_areas(cube, fx_variables)
 
     if not fx_variables and cube.coord('latitude').points.ndim == 2:
         coord_names = [coord.standard_name for coord in cube.coords()]
@@ -258,7 +260,7 @@ def area_statistics(cube, operator, fx_variables=None):
             cube_tmp.coord('grid_latitude').rename('latitude')
             cube_tmp.remove_coord('longitude')
             cube_tmp.coord('grid_longitude').rename('longitude')
-            grid_areas = iris.analysis.cartography.area_weights(cube_tmp)
+            grid_areas = get_area_weights(cube_tmp)
             logger.info('Calculated grid area shape: %s', grid_areas.shape)
         else:
             logger.error(
@@ -270,10 +272,10 @@ def area_statistics(cube, operator, fx_variables=None):
     coord_names = ['longitude', 'latitude']
     if grid_areas is None or not grid_areas.any():
         cube = guess_bounds(cube, coord_names)
-        grid_areas = iris.analysis.cartography.area_weights(cube)
+        grid_areas = get_area_weights(cube)
         logger.info('Calculated grid area shape: %s', grid_areas.shape)
 
-    if cube.shape != grid_areas.shape:
+    if not is_broadcastable(grid_areas, cube.shape):
         raise ValueError('Cube shape ({}) doesn`t match grid area shape '
                          '({})'.format(cube.shape, grid_areas.shape))
 
@@ -283,7 +285,9 @@ def area_statistics(cube, operator, fx_variables=None):
     # See iris issue: https://github.com/SciTools/iris/issues/3208
 
     if operator_accept_weights(operator):
-        return cube.collapsed(coord_names, operation, weights=grid_areas)
+        return cube.collapsed(coord_names,
+                              operation,
+                              weights=broadcast_weights(cube, grid_areas))
 
     # Many IRIS analysis functions do not accept weights arguments.
     return cube.collapsed(coord_names, operation)
@@ -373,11 +377,23 @@ def _select_representative_point(shape, lon, lat):
     return select
 
 
+def _get_mask_from_geometry(item, lon, lat, method):
+    """Select the grid points for a single shape."""
+    shape = shapely.geometry.shape(item['geometry'])
+    if method == 'contains':
+        select = contains(shape, lon, lat)
+    if method == 'representative' or not select.any():
+        select = _select_representative_point(shape, lon, lat)
+    return select
+
+
 def _get_masks_from_geometries(geometries,
                                lon,
                                lat,
                                method='contains',
-                               decomposed=False):
+                               decomposed=False,
+                               shapefile=None,
+                               masks_dir=None):
 
     if method not in {'contains', 'representative'}:
         raise ValueError(
@@ -387,11 +403,14 @@ def _get_masks_from_geometries(geometries,
     selections = dict()
 
     for i, item in enumerate(geometries):
-        shape = shapely.geometry.shape(item['geometry'])
-        if method == 'contains':
-            select = shapely.vectorized.contains(shape, lon, lat)
-        if method == 'representative' or not select.any():
-            select = _select_representative_point(shape, lon, lat)
+        if shapefile is None:
+            select = _get_mask_from_geometry(item, lon, lat, method)
+        else:
+            key = get_mask_key(shapefile, i, method, lon, lat)
+            select = MASK_CACHE.get(key, masks_dir)
+            if select is None:
+                select = _get_mask_from_geometry(item, lon, lat, method)
+                MASK_CACHE.add(key, select, masks_dir)
         if 'ID' in item['properties']:
             id_ = int(item['properties']['ID'])
         elif 'id' in item['properties']:
@@ -455,7 +474,8 @@ def extract_shape(cube,
                   shapefile,
                   method='contains',
                   crop=True,
-                  decomposed=False):
+                  decomposed=False,
+                  masks_dir=None):
     """Extract a region defined by a shapefile.
 
     Note that this function does not work for shapes crossing the
@@ -479,6 +499,10 @@ def extract_shape(cube,
         Whether or not to retain the sub shapes of the shapefile in the output.
         If this is set to True, the output cube has a dimension for the sub
         shapes.
+    masks_dir: str, optional
+        Directory where the masks of the shapes on the grid of the cube are
+        stored, so they can be reused by other processes and later runs.
+        The masks are always cached in memory.
 
     Returns
     -------
@@ -505,7 +529,9 @@ def extract_shape(cube,
                                                 lon,
                                                 lat,
                                                 method=method,
-                                                decomposed=decomposed)
+                                                decomposed=decomposed,
+                                                shapefile=shapefile,
+                                                masks_dir=masks_dir)
 
     cubelist = iris.cube.CubeList()
 
@@ -0,0 +1,183 @@
+"""Cache of preprocessed files that is shared between recipe runs."""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+from .._version import __version__
+
+logger = logging.getLogger(__name__)
+
+# Settings that do not influence the content of a preprocessed file, mostly
+# because they contain paths inside the output directory of the run.
+IGNORED_SETTINGS = {
+    'download': ('dest_folder', ),
+    'extract_shape': ('masks_dir', ),
+    'fix_file': ('output_dir', ),
+    'mask_glaciated': ('masks_dir', ),
+    'mask_landsea': ('masks_dir', ),
+    'multi_model_statistics': ('output_products', ),
+    'regrid': ('weights_dir', ),
+    'save': ('filename', ),
+    'cleanup': ('remove', ),
+}
+
+# Settings that may contain paths to files that are used as input. These are
+# replaced by a fingerprint of the files, so the key changes if they change.
+# The values of ``fx_variables`` are paths to fx files in all steps.
+PATH_SETTINGS = {
+    'extract_shape': ('shapefile', ),
+    'regrid': ('target_grid', ),
+}
+
+# Files that belong to a shapefile and are read together with it
+SHAPEFILE_SIDECARS = ('.dbf', '.shx', '.prj', '.cpg')
+
+
+def get_file_fingerprint(filename):
+    """Get the path, size and modification time of a file."""
+    filename = os.path.normpath(os.path.abspath(filename))
+    stat = os.stat(filename)
+    return [filename, stat.st_size, stat.st_mtime_ns]
+
+
+def _canonicalize(value):
+    """Convert a preprocessor setting to a JSON serializable value."""
+    if isinstance(value, dict):
+        return {str(k): _canonicalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonicalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((_canonicalize(v) for v in value), key=json.dumps)
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value
+    if callable(value):
+        return '{}.{}'.format(value.__module__, value.__qualname__)
+    return str(value)
+
+
+def _fingerprint_path(value):
+    """Replace a path to an existing file by a fingerprint of the file."""
+    if not isinstance(value, str) or not os.path.isfile(value):
+        return value
+    fingerprint = [get_file_fingerprint(value)]
+    root, extension = os.path.splitext(value)
+    if extension.lower() == '.shp':
+        for sidecar in SHAPEFILE_SIDECARS:
+            if os.path.isfile(root + sidecar):
+                fingerprint.append(get_file_fingerprint(root + sidecar))
+    return fingerprint
+
+
+def _fingerprint_paths(step, args):
+    """Replace the paths in the settings of a step by fingerprints."""
+    args = dict(args)
+    for key in PATH_SETTINGS.get(step, ()):
+        if key in args:
+            args[key] = _fingerprint_path(args[key])
+    if isinstance(args.get('fx_variables'), dict):
+        args['fx_variables'] = {
+            k: _fingerprint_path(v)
+            for k, v in args['fx_variables'].items()
+        }
+    return args
+
+
+def get_cache_key(settings, inputs, order):
+    """Compute the key of a preprocessed file in the cache.
+
+    Parameters
+    ----------
+    settings: dict
+        Preprocessor settings of the file.
+    inputs: list
+        JSON serializable description of the input data, e.g. the file
+        fingerprints or the cache keys of the ancestors.
+    order: list of str
+        Order in which the preprocessor steps are applied.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the ESMValCore version, settings,
+        step order and inputs.
+    """
+    settings = {
+        step: _fingerprint_paths(step, {
+            k: v
+            for k, v in (args or {}).items()
+            if k not in IGNORED_SETTINGS.get(step, ())
+        })
+        for step, args in settings.items()
+    }
+    content = {
+        'version': __version__,
+        'order': [step for step in order if step in settings],
+        'settings': _canonicalize(settings),
+        'inputs': inputs,
+    }
+    text = json.dumps(content, sort_keys=True)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ProductCache:
+    """Content-addressed store of preprocessed files.
+
+    Each file is stored under its cache key, together with a small JSON
+    record with information that is needed to restore its provenance.
+    Files are hard linked from the cache into the preprocessor directory
+    where possible, so they must not be modified by diagnostics.
+
+    Parameters
+    ----------
+    cache_dir: str
+        Directory where ESMValTool keeps caches, the files are stored in
+        the ``preproc`` subdirectory.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = os.path.join(cache_dir, 'preproc')
+
+    def _get_path(self, key, extension):
+        return os.path.join(self.cache_dir, key[:2], key + extension)
+
+    def __contains__(self, key):
+        """Return True if a file with this key is in the cache."""
+        return all(
+            os.path.exists(self._get_path(key, ext))
+            for ext in ('.nc', '.json'))
+
+    def load(self, key, filename):
+        """Link or copy a cached file to `filename` and return its record."""
+        with open(self._get_path(key, '.json')) as file:
+            record = json.load(file)
+        source = self._get_path(key, '.nc')
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        if os.path.exists(filename):
+            os.remove(filename)
+        try:
+            os.link(source, filename)
+        except OSError:
+            shutil.copy2(source, filename)
+        logger.debug("Using cached file %s for %s", source, filename)
+        return record
+
+    def store(self, key, filename, record):
+        """Copy `filename` to the cache together with its record."""
+        dirname = os.path.dirname(self._get_path(key, '.nc'))
+        os.makedirs(dirname, exist_ok=True)
+        # Write to temporary files first, so concurrent runs never see a
+        # partially written file.
+        with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as tmp:
+            tmp_nc = tmp.name
+        shutil.copy2(filename, tmp_nc)
+        os.replace(tmp_nc, self._get_path(key, '.nc'))
+        with tempfile.NamedTemporaryFile('w', dir=dirname,
+                                         delete=False) as file:
+            json.dump(record, file)
+        os.replace(file.name, self._get_path(key, '.json'))
+        logger.debug("Stored %s in cache as %s", filename, key)
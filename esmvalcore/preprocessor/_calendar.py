@@ -0,0 +1,573 @@
+"""Vectorized calendar operations on time coordinates.
+
+Decoding time points to dates with :mod:`cftime` one point at a time, as
+done by :mod:`iris.coord_categorisation` and :meth:`iris.cube.Cube.extract`
+with time constraints, is slow for long high frequency time series. The
+dates of the points are therefore computed with array arithmetic for all
+CF calendars, in both directions: :func:`decode_time` gives the calendar
+fields (year, month, day, ...) of a time coordinate and
+:func:`encode_time` converts calendar fields to time points. The decoded
+fields are cached per time coordinate, so they can be reused by all time
+preprocessor functions.
+"""
+import hashlib
+import logging
+from collections import OrderedDict
+
+import cftime
+import iris.coords
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TIME_FIELDS = (
+    'year',
+    'month',
+    'day',
+    'hour',
+    'minute',
+    'second',
+    'day_of_year',
+)
+"""Names of the calendar fields of decoded time points."""
+
+SEASONS = ('djf', 'mam', 'jja', 'son')
+"""Names of the meteorological seasons, in the order of their number."""
+
+# Season number of each month, indexed by month number.
+_MONTH_SEASON_NUMBERS = np.array([-1, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+
+_SECONDS_PER_UNIT = {
+    'seconds': 1,
+    'second': 1,
+    'secs': 1,
+    'sec': 1,
+    's': 1,
+    'minutes': 60,
+    'minute': 60,
+    'mins': 60,
+    'min': 60,
+    'hours': 3600,
+    'hour': 3600,
+    'hrs': 3600,
+    'hr': 3600,
+    'h': 3600,
+    'days': 86400,
+    'day': 86400,
+    'd': 86400,
+}
+
+_SECONDS_PER_DAY = 86400
+
+_CALENDAR_ALIASES = {
+    'gregorian': 'standard',
+    'noleap': '365_day',
+    'all_leap': '366_day',
+}
+
+# Number of days before each month in calendars with years of equal length
+_CUMULATIVE_DAYS = {
+    '360_day': np.arange(0, 361, 30),
+    '365_day': np.array(
+        [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365]),
+    '366_day': np.array(
+        [0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335, 366]),
+}
+
+
+def get_time_key(coord):
+    """Compute a key that identifies the points of a time coordinate.
+
+    Parameters
+    ----------
+    coord: iris.coords.Coord
+        Time coordinate.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest of the units, calendar and points.
+    """
+    hasher = hashlib.sha256()
+    points = np.ascontiguousarray(coord.points, dtype=np.float64)
+    content = (str(coord.units), coord.units.calendar, points.shape)
+    hasher.update(repr(content).encode('utf-8'))
+    hasher.update(points.tobytes())
+    return hasher.hexdigest()
+
+
+def _decode_dates(points, units):
+    """Decode time points one date at a time, for uncommon units."""
+    dates = np.ravel(units.num2date(points))
+    fields = np.array([(date.year, date.month, date.day, date.hour,
+                        date.minute, date.second, date.dayofyr)
+                       for date in dates],
+                      dtype=np.int64).reshape(dates.shape + (7, ))
+    return {
+        name: fields[:, i].reshape(points.shape)
+        for i, name in enumerate(TIME_FIELDS)
+    }
+
+
+def _get_calendar(units):
+    """Get the normalized name of the calendar of time units."""
+    calendar = (units.calendar or 'standard').lower()
+    return _CALENDAR_ALIASES.get(calendar, calendar)
+
+
+def _to_days_gregorian(year, month, day):
+    """Count days since 0000-03-01 in the proleptic Gregorian calendar."""
+    # Years start on 1 March, so the leap day is the last day of a year.
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    return (era * 146097 + year_of_era * 365 + year_of_era // 4 -
+            year_of_era // 100 + day_of_year)
+
+
+def _from_days_gregorian(days):
+    """Inverse of :func:`_to_days_gregorian`."""
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 -
+                   day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 -
+                                year_of_era // 100)
+    return _from_march_day_of_year(era * 400 + year_of_era, day_of_year)
+
+
+def _to_days_julian(year, month, day):
+    """Count days in the Julian calendar, aligned with the Gregorian."""
+    year = year - (month <= 2)
+    cycle = year // 4
+    year_of_cycle = year - cycle * 4
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    return (cycle * 1461 + year_of_cycle * 365 + day_of_year +
+            _JULIAN_OFFSET)
+
+
+def _from_days_julian(days):
+    """Inverse of :func:`_to_days_julian`."""
+    days = days - _JULIAN_OFFSET
+    cycle = days // 1461
+    day_of_cycle = days - cycle * 1461
+    year_of_cycle = (day_of_cycle - day_of_cycle // 1460) // 365
+    day_of_year = day_of_cycle - 365 * year_of_cycle
+    return _from_march_day_of_year(cycle * 4 + year_of_cycle, day_of_year)
+
+
+def _from_march_day_of_year(year, day_of_year):
+    """Get the date from a day of a year that starts on 1 March."""
+    month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * month + 2) // 5 + 1
+    month = np.where(month < 10, month + 3, month - 9)
+    return year + (month <= 2), month, day
+
+
+# Julian 1582-10-04 is followed by Gregorian 1582-10-15 in the standard
+# calendar, i.e. Julian 0000-03-01 is Gregorian 0000-02-28.
+_JULIAN_OFFSET = -2
+
+# Day number of the first day of the Gregorian calendar
+_GREGORIAN_START = _to_days_gregorian(1582, 10, 15)
+
+
+def date2days(year, month, day, calendar):
+    """Convert dates to day numbers.
+
+    Parameters
+    ----------
+    year: numpy.ndarray
+        Years, must be positive.
+    month: numpy.ndarray
+        Months.
+    day: numpy.ndarray
+        Days of the month.
+    calendar: str
+        One of the CF calendars, except ``none``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer number of days since an arbitrary reference date, which is
+        the same for all dates in the calendar.
+
+    Raises
+    ------
+    ValueError
+        The calendar is not supported.
+    """
+    calendar = _CALENDAR_ALIASES.get(calendar, calendar)
+    year, month, day = (np.asarray(a, dtype=np.int64)
+                        for a in (year, month, day))
+    if calendar in _CUMULATIVE_DAYS:
+        cumulative_days = _CUMULATIVE_DAYS[calendar]
+        return (year * cumulative_days[-1] + cumulative_days[month - 1] +
+                day - 1)
+    if calendar == 'proleptic_gregorian':
+        return _to_days_gregorian(year, month, day)
+    if calendar == 'julian':
+        return _to_days_julian(year, month, day)
+    if calendar == 'standard':
+        days = _to_days_gregorian(year, month, day)
+        return np.where(days >= _GREGORIAN_START, days,
+                        _to_days_julian(year, month, day))
+    raise ValueError(f"Calendar '{calendar}' not supported")
+
+
+def days2date(days, calendar):
+    """Convert day numbers to dates.
+
+    This is the inverse of :func:`date2days`.
+
+    Parameters
+    ----------
+    days: numpy.ndarray
+        Integer day numbers.
+    calendar: str
+        One of the CF calendars, except ``none``.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Years, months and days of the month.
+
+    Raises
+    ------
+    ValueError
+        The calendar is not supported.
+    """
+    calendar = _CALENDAR_ALIASES.get(calendar, calendar)
+    days = np.asarray(days, dtype=np.int64)
+    if calendar in _CUMULATIVE_DAYS:
+        cumulative_days = _CUMULATIVE_DAYS[calendar]
+        year, day_of_year = np.divmod(days, cumulative_days[-1])
+        month = np.searchsorted(cumulative_days, day_of_year, side='right')
+        return year, month, day_of_year - cumulative_days[month - 1] + 1
+    if calendar == 'proleptic_gregorian':
+        return _from_days_gregorian(days)
+    if calendar == 'julian':
+        return _from_days_julian(days)
+    if calendar == 'standard':
+        gregorian = days >= _GREGORIAN_START
+        return tuple(
+            np.where(gregorian, *dates)
+            for dates in zip(_from_days_gregorian(days),
+                             _from_days_julian(days)))
+    raise ValueError(f"Calendar '{calendar}' not supported")
+
+
+def _is_vectorized(units, years=()):
+    """Check if dates in `units` can be computed with array arithmetic.
+
+    Calendars without a year zero are only supported from year 1 onwards.
+    In the standard calendar, cftime counts the days of the year 1582 as if
+    the days skipped by the calendar reform exist, so that year is left to
+    cftime.
+    """
+    unit_name = str(units).split(' since ')[0].strip().lower()
+    if unit_name not in _SECONDS_PER_UNIT:
+        return False
+    calendar = _get_calendar(units)
+    if calendar in _CUMULATIVE_DAYS:
+        return True
+    if calendar not in ('proleptic_gregorian', 'julian', 'standard'):
+        return False
+    for year in years:
+        if np.any(np.asarray(year) < 1):
+            return False
+        if calendar == 'standard' and np.any(np.asarray(year) == 1582):
+            return False
+    return True
+
+
+def _get_seconds_of_day(date):
+    """Get the seconds since midnight of a date."""
+    return (date.hour * 3600 + date.minute * 60 + date.second +
+            date.microsecond * 1e-6)
+
+
+def _decode_fields(points, units):
+    """Decode time points to calendar fields.
+
+    The dates are computed with array arithmetic, except for units and
+    dates that are not supported by :func:`days2date`.
+    """
+    if not _is_vectorized(units):
+        return _decode_dates(points, units)
+
+    unit_name = str(units).split(' since ')[0].strip().lower()
+    origin = units.num2date(0)
+    seconds = (np.asarray(points, dtype=np.float64) *
+               _SECONDS_PER_UNIT[unit_name] + _get_seconds_of_day(origin))
+    days = np.floor(seconds / _SECONDS_PER_DAY)
+    # Round to microseconds, like cftime does.
+    microseconds = np.round(
+        (seconds - days * _SECONDS_PER_DAY) * 1e6).astype(np.int64)
+    next_day = microseconds >= _SECONDS_PER_DAY * 10**6
+    days[next_day] += 1
+    microseconds[next_day] -= _SECONDS_PER_DAY * 10**6
+    seconds_of_day = microseconds // 10**6
+
+    calendar = _get_calendar(units)
+    days = days.astype(np.int64) + date2days(origin.year, origin.month,
+                                             origin.day, calendar)
+    year, month, day = days2date(days, calendar)
+    if not _is_vectorized(units, [origin.year, year]):
+        return _decode_dates(points, units)
+    return {
+        'year': year,
+        'month': month,
+        'day': day,
+        'hour': seconds_of_day // 3600,
+        'minute': seconds_of_day % 3600 // 60,
+        'second': seconds_of_day % 60,
+        'day_of_year': days - date2days(year, 1, 1, calendar) + 1,
+    }
+
+
+def encode_time(units, year, month=1, day=1, hour=0, minute=0, second=0):
+    """Encode dates as time points.
+
+    This is the inverse of :func:`decode_time`.
+
+    Parameters
+    ----------
+    units: cf_units.Unit
+        Time units of the points.
+    year: numpy.ndarray
+        Years.
+    month: numpy.ndarray, optional
+        Months.
+    day: numpy.ndarray, optional
+        Days of the month.
+    hour: numpy.ndarray, optional
+        Hours.
+    minute: numpy.ndarray, optional
+        Minutes.
+    second: numpy.ndarray, optional
+        Seconds.
+
+    Returns
+    -------
+    numpy.ndarray
+        Time points of the dates in `units`, with the broadcast shape of
+        the date fields.
+    """
+    fields = np.broadcast_arrays(
+        *(np.asarray(a, dtype=np.int64)
+          for a in (year, month, day, hour, minute, second)))
+    if not _is_vectorized(units, [fields[0]]):
+        dates = [
+            cftime.datetime(*date, calendar=units.calendar)
+            for date in zip(*(a.ravel().tolist() for a in fields))
+        ]
+        points = units.date2num(dates) if dates else []
+        return np.reshape(np.asarray(points, dtype=np.float64),
+                          fields[0].shape)
+
+    year, month, day, hour, minute, second = fields
+    unit_name = str(units).split(' since ')[0].strip().lower()
+    origin = units.num2date(0)
+    calendar = _get_calendar(units)
+    days = (date2days(year, month, day, calendar) -
+            date2days(origin.year, origin.month, origin.day, calendar))
+    seconds = (days * _SECONDS_PER_DAY + hour * 3600 + minute * 60 + second -
+               _get_seconds_of_day(origin))
+    return seconds / _SECONDS_PER_UNIT[unit_name]
+
+
+class TimeFieldsCache:
+    """Least recently used cache of decoded time coordinates.
+
+    The calendar fields of the points of a time coordinate are stored as
+    read-only integer arrays with the shape of the coordinate, keyed by
+    :func:`get_time_key`.
+
+    Parameters
+    ----------
+    max_size: int
+        Maximum number of time coordinates in the cache.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._fields = OrderedDict()
+
+    def __len__(self):
+        """Return the number of cached time coordinates."""
+        return len(self._fields)
+
+    def clear(self):
+        """Remove all decoded time coordinates from the cache."""
+        self._fields.clear()
+
+    def get(self, coord):
+        """Get the calendar fields of the points of a time coordinate."""
+        key = get_time_key(coord)
+        if key in self._fields:
+            self._fields.move_to_end(key)
+            return self._fields[key]
+        logger.debug("Decoding %s time points", coord.points.size)
+        fields = _decode_fields(coord.points, coord.units)
+        for array in fields.values():
+            array.flags.writeable = False
+        self._fields[key] = fields
+        while len(self._fields) > self.max_size:
+            self._fields.popitem(last=False)
+        return fields
+
+
+TIME_FIELDS_CACHE = TimeFieldsCache()
+
+
+def decode_time(coord):
+    """Decode the points of a time coordinate to calendar fields.
+
+    Parameters
+    ----------
+    coord: iris.coords.Coord
+        Time coordinate.
+
+    Returns
+    -------
+    dict of str: numpy.ndarray
+        Read-only integer arrays with the shape of the coordinate, for each
+        of the fields in :data:`TIME_FIELDS`.
+    """
+    return TIME_FIELDS_CACHE.get(coord)
+
+
+def get_season_number(month):
+    """Get the number of the season of months, as in :data:`SEASONS`."""
+    return _MONTH_SEASON_NUMBERS[month]
+
+
+def get_time_category(coord, name):
+    """Compute a category of the points of a time coordinate.
+
+    The categories are the same as those computed by the functions in
+    :mod:`iris.coord_categorisation`.
+
+    Parameters
+    ----------
+    coord: iris.coords.Coord
+        Time coordinate.
+    name: str
+        Name of the category, one of ``year``, ``month_number``,
+        ``day_of_month``, ``day_of_year``, ``hour``, ``season_number``,
+        ``clim_season``, ``season_year`` or ``decade``.
+
+    Returns
+    -------
+    numpy.ndarray
+        Category of each point of the coordinate.
+
+    Raises
+    ------
+    ValueError
+        The category is not supported.
+    """
+    fields = decode_time(coord)
+    if name == 'year':
+        return fields['year'].copy()
+    if name == 'month_number':
+        return fields['month'].copy()
+    if name == 'day_of_month':
+        return fields['day'].copy()
+    if name == 'day_of_year':
+        return fields['day_of_year'].copy()
+    if name == 'hour':
+        return fields['hour'].copy()
+    if name == 'season_number':
+        return get_season_number(fields['month'])
+    if name == 'clim_season':
+        # Same string type as used by iris.coord_categorisation
+        seasons = np.array(SEASONS, dtype='U64')
+        return seasons[get_season_number(fields['month'])]
+    if name == 'season_year':
+        return fields['year'] + (fields['month'] == 12)
+    if name == 'decade':
+        return fields['year'] - fields['year'] % 10
+    raise ValueError(f"Time category '{name}' not supported")
+
+
+def add_time_coord(cube, name, coord='time'):
+    """Add a categorical time coordinate to a cube.
+
+    This is a fast replacement for the functions in
+    :mod:`iris.coord_categorisation`, see :func:`get_time_category` for the
+    supported categories.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Input cube, the new coordinate is added to it.
+    name: str
+        Name of the category and of the new coordinate.
+    coord: str or iris.coords.Coord, optional
+        Time coordinate that is categorised.
+
+    Raises
+    ------
+    ValueError
+        The cube already has a coordinate called `name` or the category is
+        not supported.
+    """
+    if isinstance(coord, str):
+        coord = cube.coord(coord)
+    if cube.coords(name):
+        raise ValueError(f'A coordinate "{name}" already exists in the cube.')
+    new_coord = iris.coords.AuxCoord(
+        get_time_category(coord, name),
+        long_name=name,
+        units='no_unit' if name == 'clim_season' else '1',
+        attributes=coord.attributes.copy(),
+    )
+    cube.add_aux_coord(new_coord, cube.coord_dims(coord))
+
+
+def _get_date_key(year, month, day):
+    """Get an integer that increases with the date."""
+    return year * 10000 + month * 100 + day
+
+
+def select_dates(coord, start, end):
+    """Select the points of a time coordinate in a range of dates.
+
+    The dates are converted to the units of the coordinate once, after
+    which the points are selected with a binary search if they are
+    monotonic. Dates that do not exist in the calendar of the coordinate
+    are compared to the decoded dates of the points instead.
+
+    Parameters
+    ----------
+    coord: iris.coords.Coord
+        One-dimensional time coordinate.
+    start: tuple of int
+        Year, month and day of the first date in the range.
+    end: tuple of int
+        Year, month and day of the first date after the range.
+
+    Returns
+    -------
+    slice or numpy.ndarray
+        Slice or integer indices of the selected points.
+    """
+    calendar = coord.units.calendar
+    try:
+        bounds = [
+            coord.units.date2num(cftime.datetime(*date, calendar=calendar))
+            for date in (start, end)
+        ]
+        values = coord.points
+    except ValueError:
+        fields = decode_time(coord)
+        bounds = [_get_date_key(*date) for date in (start, end)]
+        values = _get_date_key(fields['year'], fields['month'],
+                               fields['day'])
+
+    if values.size < 2 or np.all(np.diff(values) >= 0):
+        return slice(*np.searchsorted(values, bounds, side='left'))
+    return np.flatnonzero((values >= bounds[0]) & (values < bounds[1]))
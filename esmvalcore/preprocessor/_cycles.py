@@ -4,6 +4,8 @@ import logging
 import iris
 import iris.coord_categorisation
 
+from ._groupby import aggregate_by
+
 logger = logging.getLogger(__name__)
 
 
@@ -63,9 +65,9 @@ def amplitude(cube, coords):
                 f"iris.coord_categorisation")
 
     # Calculate amplitude
-    max_cube = cube.aggregated_by(coords, iris.analysis.MAX)
-    min_cube = cube.aggregated_by(coords, iris.analysis.MIN)
-    amplitude_cube = max_cube - min_cube
+    # Compute maximum and minimum in a single pass over the data
+    stats = aggregate_by(cube, coords, ['max', 'min'])
+    amplitude_cube = stats['max'] - stats['min']
     amplitude_cube.metadata = cube.metadata
 
     return amplitude_cube
@@ -2,6 +2,7 @@
 
 import importlib
 import logging
+from collections.abc import Mapping
 from copy import deepcopy
 from pathlib import Path
 
@@ -10,23 +11,49 @@ import iris
 logger = logging.getLogger(__name__)
 
 
+class _DerivedVariables(Mapping):
+    """Registry of all possible derived variables.
+
+    The derived variables are discovered from the names of the modules in
+    this package, but a module is only imported when its python class is
+    first requested, so importing this package stays cheap.
+    """
+
+    def __init__(self):
+        self._short_names = sorted(
+            path.stem for path in Path(__file__).parent.glob('[a-z]*.py'))
+        self._derivers = {}
+
+    def __getitem__(self, short_name):
+        if short_name not in self._derivers:
+            if short_name not in self._short_names:
+                raise KeyError(short_name)
+            module = importlib.import_module(
+                f'esmvalcore.preprocessor._derive.{short_name}')
+            self._derivers[short_name] = getattr(module, 'DerivedVariable')
+        return self._derivers[short_name]
+
+    def __contains__(self, short_name):
+        return short_name in self._short_names
+
+    def __iter__(self):
+        return iter(self._short_names)
+
+    def __len__(self):
+        return len(self._short_names)
+
+
 def _get_all_derived_variables():
     """Get all possible derived variables.
 
     Returns
     -------
-    dict
+    collections.abc.Mapping
         All derived variables with `short_name` (keys) and the associated
-        python classes (values).
+        python classes (values), which are imported on first access.
 
     """
-    derivers = {}
-    for path in Path(__file__).parent.glob('[a-z]*.py'):
-        short_name = path.stem
-        module = importlib.import_module(
-            f'esmvalcore.preprocessor._derive.{short_name}')
-        derivers[short_name] = getattr(module, 'DerivedVariable')
-    return derivers
+    return _DerivedVariables()
 
 
 ALL_DERIVED_VARIABLES = _get_all_derived_variables()
@@ -0,0 +1,330 @@
+"""Statistics over groups of points along a dimension.
+
+:meth:`iris.cube.Cube.aggregated_by` builds a separate computation for
+every group and computes every statistic separately, which is slow for
+many groups (e.g. daily statistics of a long time series) and reads the
+data once per statistic. The functions in this module sort the points by
+group, align the chunks of the data with the groups and compute all
+requested statistics of all groups in a chunk in a single pass over the
+data.
+"""
+import logging
+
+import dask.array as da
+import iris.analysis
+import iris.coords
+import iris.exceptions
+import numpy as np
+
+from ._shared import get_iris_analysis_operation
+
+logger = logging.getLogger(__name__)
+
+
+def _group_sizes(starts, size):
+    """Get the number of points in each group."""
+    return np.diff(np.append(starts, size))
+
+
+def _group_count(values, mask, starts, axis):
+    """Count the unmasked points in each group."""
+    return np.add.reduceat((~mask).astype(np.int64), starts, axis=axis)
+
+
+def _group_sum(values, mask, starts, axis):
+    # Accumulate floating point numbers in double precision
+    dtype = np.float64 if np.issubdtype(values.dtype, np.floating) else None
+    return np.add.reduceat(np.where(mask, 0, values),
+                           starts,
+                           axis=axis,
+                           dtype=dtype)
+
+
+def _group_mean(values, mask, starts, axis):
+    count = _group_count(values, mask, starts, axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _group_sum(values, mask, starts, axis) / count
+
+
+def _group_min(values, mask, starts, axis):
+    fill_value = np.ma.minimum_fill_value(values)
+    return np.minimum.reduceat(np.where(mask, fill_value, values),
+                               starts,
+                               axis=axis)
+
+
+def _group_max(values, mask, starts, axis):
+    fill_value = np.ma.maximum_fill_value(values)
+    return np.maximum.reduceat(np.where(mask, fill_value, values),
+                               starts,
+                               axis=axis)
+
+
+def _group_variance(values, mask, starts, axis):
+    """Compute the variance with one degree of freedom, like iris."""
+    count = _group_count(values, mask, starts, axis)
+    mean = _group_mean(values, mask, starts, axis)
+    sizes = _group_sizes(starts, values.shape[axis])
+    deviation = np.where(mask, 0., values - np.repeat(mean, sizes, axis=axis))
+    squares = np.add.reduceat(deviation**2, starts, axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return squares / (count - 1)
+
+
+def _group_std_dev(values, mask, starts, axis):
+    return np.sqrt(_group_variance(values, mask, starts, axis))
+
+
+def _group_median(values, mask, starts, axis):
+    stops = np.append(starts[1:], values.shape[axis])
+    data = np.ma.masked_array(values, mask=mask)
+    return np.ma.stack([
+        np.ma.filled(
+            np.ma.median(np.take(data, range(start, stop), axis=axis),
+                         axis=axis), 0.) for start, stop in zip(starts, stops)
+    ],
+                       axis=axis)
+
+
+# Function and minimum number of unmasked points of each statistic
+_GROUP_STATISTICS = {
+    'count': (_group_count, 0),
+    'max': (_group_max, 1),
+    'mean': (_group_mean, 1),
+    'median': (_group_median, 1),
+    'min': (_group_min, 1),
+    'std_dev': (_group_std_dev, 2),
+    'sum': (_group_sum, 1),
+    'variance': (_group_variance, 2),
+}
+
+
+def _get_dtype(operator, dtype, masked=False):
+    """Get the data type of a statistic, the same as iris would use.
+
+    For realized data with a mask, iris computes the mean, standard
+    deviation and variance in double precision.
+    """
+    if operator in ('max', 'min'):
+        return dtype
+    if operator == 'count':
+        return np.dtype(np.int64)
+    if operator == 'sum':
+        return np.zeros(1, dtype=dtype).sum().dtype
+    if np.issubdtype(dtype, np.floating) and not (
+            masked and operator in ('mean', 'std_dev', 'variance')):
+        return dtype
+    return np.result_type(dtype, np.float64)
+
+
+def _compute_group_statistics(data, labels, operators, axis, masked=False):
+    """Compute statistics of groups of consecutive points.
+
+    Parameters
+    ----------
+    data: numpy.ndarray or numpy.ma.MaskedArray
+        Input data.
+    labels: numpy.ndarray
+        Sorted group label of each point along `axis`.
+    operators: tuple of str
+        Statistics to compute.
+    axis: int
+        Axis along which the groups are defined.
+    masked: bool
+        Use the data types of the statistics of realized data with a mask.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        The statistics stacked along a new first axis, with one point per
+        group along `axis`.
+    """
+    values = np.ma.getdata(data)
+    mask = np.ma.getmaskarray(data)
+    starts = np.flatnonzero(np.append(True, labels[1:] != labels[:-1]))
+    count = _group_count(values, mask, starts, axis)
+    dtype = np.result_type(*(_get_dtype(operator, values.dtype, masked)
+                             for operator in operators))
+    results = []
+    for operator in operators:
+        function, min_count = _GROUP_STATISTICS[operator]
+        result = function(values, mask, starts, axis)
+        result = result.astype(_get_dtype(operator, values.dtype, masked))
+        results.append(np.ma.masked_where(count < min_count, result))
+    return np.ma.stack(results).astype(dtype)
+
+
+def _get_chunks(sizes, chunk_size):
+    """Get chunks that contain whole groups and about `chunk_size` points.
+
+    Returns the chunks and the number of groups in each chunk.
+    """
+    chunks = []
+    groups = []
+    for size in sizes.tolist():
+        if chunks and chunks[-1] + size <= chunk_size:
+            chunks[-1] += size
+            groups[-1] += 1
+        else:
+            chunks.append(size)
+            groups.append(1)
+    return tuple(chunks), tuple(groups)
+
+
+def _get_group_data(data, labels, operators, axis):
+    """Compute statistics of the groups of points in `data`."""
+    order = np.argsort(labels, kind='stable')
+    labels = labels[order]
+    if np.any(order != np.arange(len(order))):
+        data = data[(slice(None), ) * axis + (order, )]
+
+    if not isinstance(data, da.Array):
+        masked = np.ma.getmask(data) is not np.ma.nomask
+        return _compute_group_statistics(data, labels, operators, axis,
+                                         masked)
+
+    sizes = np.bincount(labels)
+    chunks, groups = _get_chunks(sizes, max(data.chunks[axis]))
+    data = data.rechunk(
+        {i: chunks if i == axis else 'auto'
+         for i in range(data.ndim)})
+    labels = da.from_array(labels, chunks=(chunks, ))
+
+    ind = tuple(range(data.ndim))
+    dtype = np.result_type(
+        *(_get_dtype(operator, data.dtype) for operator in operators))
+    return da.blockwise(
+        _compute_group_statistics,
+        (data.ndim, ) + ind,
+        data,
+        ind,
+        labels,
+        (axis, ),
+        new_axes={data.ndim: len(operators)},
+        adjust_chunks={axis: groups},
+        dtype=dtype,
+        meta=np.ma.array([], dtype=dtype),
+        operators=operators,
+        axis=axis,
+    )
+
+
+def _get_groupby(cube, coords):
+    """Get the groups of the points of a cube.
+
+    Returns the sorted grouping coordinates, the dimension, the
+    :class:`iris.analysis._Groupby` instance and the group label of each
+    point along the dimension, in the same way as
+    :meth:`iris.cube.Cube.aggregated_by`.
+    """
+    if isinstance(coords, (str, iris.coords.Coord)):
+        coords = [coords]
+    coords = sorted((cube.coord(coord) for coord in coords),
+                    key=lambda coord: coord.metadata)
+    dims = {cube.coord_dims(coord) for coord in coords}
+    if len(dims) != 1 or len(next(iter(dims))) != 1:
+        raise iris.exceptions.CoordinateCollapseError(
+            "Can only compute statistics over groups defined by coordinates "
+            f"along the same single dimension, got {dims}")
+    dim = next(iter(dims))[0]
+
+    shared_coords = [
+        coord for coord in cube.coords(contains_dimension=dim)
+        if coord not in coords
+    ]
+    shared_coords_and_dims = [(coord, index) for coord in shared_coords
+                              for (index, coord_dim) in enumerate(
+                                  cube.coord_dims(coord)) if coord_dim == dim]
+    # pylint: disable=protected-access
+    groupby = iris.analysis._Groupby(coords, shared_coords_and_dims)
+
+    labels = np.empty(cube.shape[dim], dtype=np.int64)
+    for label, index in enumerate(groupby.group()):
+        labels[np.asarray(index) if isinstance(index, tuple) else index] = (
+            label)
+    return coords, dim, groupby, labels
+
+
+def _get_template(cube, dim, groupby, coords):
+    """Get a cube with the coordinates of the statistics."""
+    dummy = da.broadcast_to(da.zeros((), dtype=cube.dtype), cube.shape)
+    template = cube.copy(dummy)
+    for ancillary_variable in template.ancillary_variables():
+        if dim in template.ancillary_variable_dims(ancillary_variable):
+            template.remove_ancillary_variable(ancillary_variable)
+    for cell_measure in template.cell_measures():
+        if dim in template.cell_measure_dims(cell_measure):
+            template.remove_cell_measure(cell_measure)
+    template = template[(slice(None), ) * dim + (slice(0, len(groupby)), )]
+    for coord in template.coords(contains_dimension=dim):
+        template.remove_coord(coord)
+
+    dim_coord = cube.coords(dimensions=dim, dim_coords=True)
+    dim_coord = dim_coord[0] if dim_coord else None
+    for coord in groupby.coords:
+        if (dim_coord is not None and dim_coord.metadata == coord.metadata
+                and isinstance(coord, iris.coords.DimCoord)):
+            template.add_dim_coord(coord.copy(), dim)
+        else:
+            template.add_aux_coord(coord.copy(), cube.coord_dims(coord))
+    return template
+
+
+def aggregate_by(cube, coords, operators):
+    """Compute statistics over groups of points.
+
+    This computes the same statistics as
+    :meth:`iris.cube.Cube.aggregated_by`, but several statistics are
+    computed in a single pass over the data, and the number of tasks in the
+    computation does not depend on the number of groups.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Input cube.
+    coords: str or iris.coords.Coord or list
+        Coordinate(s) that define the groups. They must all describe the
+        same single dimension of the cube.
+    operators: list of str
+        Statistics to compute. Available operators: 'mean', 'median',
+        'std_dev', 'sum', 'variance', 'min', 'max' and 'count', the number
+        of unmasked points in each group.
+
+    Returns
+    -------
+    dict of str: iris.cube.Cube
+        Cube with the statistic over each group, for each operator. The
+        data of the cubes is lazy if the data of the input cube is lazy;
+        when computed together, the input data is read only once.
+
+    Raises
+    ------
+    ValueError
+        An operator is not recognised.
+    iris.exceptions.CoordinateCollapseError
+        The coordinates do not describe the same single dimension.
+    """
+    aggregators = {
+        operator: (iris.analysis.COUNT if operator.lower() == 'count' else
+                   get_iris_analysis_operation(operator))
+        for operator in operators
+    }
+    names = tuple(operator.lower() for operator in operators)
+    masked = (not cube.has_lazy_data()
+              and np.ma.getmask(cube.data) is not np.ma.nomask)
+    coords, dim, groupby, labels = _get_groupby(cube, coords)
+    data = _get_group_data(cube.core_data(), labels, names, dim)
+    template = _get_template(cube, dim, groupby, coords)
+
+    result = {}
+    for i, (operator, name) in enumerate(zip(operators, names)):
+        cube_data = data[i].astype(_get_dtype(name, cube.dtype, masked))
+        if not cube.has_lazy_data() and not np.ma.is_masked(cube_data):
+            cube_data = np.ma.getdata(cube_data)
+        stat_cube = template.copy()
+        aggregators[operator].update_metadata(stat_cube,
+                                              coords,
+                                              aggregate=True)
+        result[operator] = aggregators[operator].post_process(
+            stat_cube, cube_data, coords)
+    return result
@@ -11,6 +11,7 @@ import iris
 import iris.exceptions
 import numpy as np
 import yaml
+from netCDF4 import Dataset
 
 from .._task import write_ncl_settings
 from ..cmor._fixes.shared import AtmosphereSigmaFactory
@@ -268,6 +269,26 @@ def save(cubes, filename, optimize_access='', compress=False, **kwargs):
     return filename
 
 
+def _get_data_size(filename):
+    """Get the size in bytes of the largest variable in a file in memory.
+
+    Falls back to the size of the file if it cannot be read as NetCDF.
+    Returns 0 if the file does not exist (yet).
+    """
+    if not os.path.exists(filename):
+        return 0
+    try:
+        with Dataset(filename, 'r') as dataset:
+            return max(
+                (int(np.prod(var.shape)) * var.dtype.itemsize
+                 for var in dataset.variables.values()
+                 if isinstance(var.dtype, np.dtype)),
+                default=0,
+            )
+    except OSError:
+        return os.path.getsize(filename)
+
+
 def _get_debug_filename(filename, step):
     """Get a filename for debugging the preprocessor."""
     dirname = os.path.splitext(filename)[0]
@@ -3,6 +3,7 @@
 
 import collections
 
+import dask.array as da
 import iris
 import numpy as np
 
@@ -218,12 +219,73 @@ def map_slices(src, func, src_rep, dst_rep):
     src_keep_dims = list(set(range(src.ndim)) - set(src_slice_dims))
     src_keep_spec = get_slice_spec(src, src_keep_dims)
     res_shape = src_keep_spec[0] + dst_rep.shape
+    dst = _create_mapped_cube(src, src_keep_spec, dst_rep,
+                              get_empty_data(res_shape, dtype=src.dtype))
+    for src_ind, dst_ind in index_iterator(src_slice_dims, src.shape):
+        res = func(src[src_ind])
+        dst.data[dst_ind] = res
+    return dst
+
+
+def map_slices_lazy(src, func, src_rep, dst_rep):
+    """
+    Map blocks of a cube lazily, replacing slices with different slices.
+
+    This is the lazy equivalent of :func:`map_slices`. Instead of calling
+    `func` for every slice, the data is rechunked such that the dimensions
+    of the source representant are contained in a single chunk and `func`
+    is applied to every chunk of the (lazy) data with
+    :func:`dask.array.map_blocks`, so it processes many slices per call.
+
+    Parameters
+    ----------
+    src: :class:`iris.cube.Cube`
+        Source cube to be mapped.
+    func: callable
+        Callable that takes an array where the last dimensions correspond to
+        the dimensions of `src_rep` and returns an array where they are
+        replaced by the dimensions of `dst_rep`.
+    src_rep: :class:`iris.cube.Cube`
+        Source representant that specifies the dimensions to be removed from
+        the source cube.
+    dst_rep: :class:`iris.cube.Cube`
+        Destination representant that specifies the shape of the new
+        dimensions.
+
+    Returns
+    -------
+    :class:`iris.cube.Cube`:
+        New cube with lazy data, as described in :func:`map_slices`.
+    """
+    ref_to_slice = get_slice_coords(src_rep)
+    src_slice_dims = ref_to_dims_index(src, ref_to_slice)
+    src_keep_dims = list(set(range(src.ndim)) - set(src_slice_dims))
+    src_keep_spec = get_slice_spec(src, src_keep_dims)
+    data = da.transpose(src.lazy_data(), src_keep_dims + src_slice_dims)
+    n_keep = len(src_keep_dims)
+    data = data.rechunk({
+        i: 'auto' if i < n_keep else -1
+        for i in range(data.ndim)
+    })
+    if data.ndim - n_keep != len(dst_rep.shape):
+        raise ValueError(
+            "Source and destination representant should have the same "
+            "number of dimensions, got {} and {}".format(
+                data.ndim - n_keep, len(dst_rep.shape)))
+    chunks = data.chunks[:n_keep] + tuple((n, ) for n in dst_rep.shape)
+    meta = np.ma.masked_array(np.empty((0, ) * data.ndim, dtype=src.dtype))
+    res = da.map_blocks(func, data, chunks=chunks, dtype=src.dtype, meta=meta)
+    return _create_mapped_cube(src, src_keep_spec, dst_rep, res)
+
+
+def _create_mapped_cube(src, src_keep_spec, dst_rep, data):
+    """Create the result cube of mapping slices of `src`."""
     dim_coords = src_keep_spec[1] + dst_rep.coords(dim_coords=True)
     dim_coords_and_dims = [(c, i) for i, c in enumerate(dim_coords)]
     aux_coords_and_dims = [(c, src.coord_dims(c)) for c in src_keep_spec[2]]
     aux_coords_and_dims += [(c, src.coord_dims(c)) for c in dst_rep.aux_coords]
     dst = iris.cube.Cube(
-        data=get_empty_data(res_shape, dtype=src.dtype),
+        data=data,
         standard_name=src.standard_name,
         long_name=src.long_name,
         var_name=src.var_name,
@@ -233,7 +295,4 @@ def map_slices(src, func, src_rep, dst_rep):
         dim_coords_and_dims=dim_coords_and_dims,
         aux_coords_and_dims=aux_coords_and_dims,
     )
-    for src_ind, dst_ind in index_iterator(src_slice_dims, src.shape):
-        res = func(src[src_ind])
-        dst.data[dst_ind] = res
     return dst
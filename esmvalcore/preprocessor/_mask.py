@@ -7,16 +7,19 @@ Natural Earth shapefiles (land or ocean), masking on thresholds,
 missing values masking.
 """
 
+import functools
 import logging
 import os
 
 import cartopy.io.shapereader as shpreader
-import iris
+import dask.array as da
 import numpy as np
-import shapely.vectorized as shp_vect
 from iris.analysis import Aggregator
 from iris.util import rolling_window
 
+from ._shapes import MASK_CACHE, contains, get_mask_key
+from ._shared import load_fx_cube
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,38 +46,64 @@ def _check_dims(cube, mask_cube):
 
 
 def _get_fx_mask(fx_data, fx_option, mask_type):
-    """Build a percentage-thresholded mask from an fx file."""
-    inmask = np.zeros_like(fx_data, bool)
+    """Build a percentage-thresholded mask from an fx file.
+
+    The mask is lazy if `fx_data` is a dask array.
+    """
     if mask_type == 'sftlf':
         if fx_option == 'land':
             # Mask land out
-            inmask[fx_data > 50.] = True
-        elif fx_option == 'sea':
+            return fx_data > 50.
+        if fx_option == 'sea':
             # Mask sea out
-            inmask[fx_data <= 50.] = True
+            return fx_data <= 50.
     elif mask_type == 'sftof':
         if fx_option == 'land':
             # Mask land out
-            inmask[fx_data < 50.] = True
-        elif fx_option == 'sea':
+            return fx_data < 50.
+        if fx_option == 'sea':
             # Mask sea out
-            inmask[fx_data >= 50.] = True
+            return fx_data >= 50.
     elif mask_type == 'sftgif':
         if fx_option == 'ice':
             # Mask ice out
-            inmask[fx_data > 50.] = True
-        elif fx_option == 'landsea':
+            return fx_data > 50.
+        if fx_option == 'landsea':
             # Mask landsea out
-            inmask[fx_data <= 50.] = True
+            return fx_data <= 50.
+
+    if isinstance(fx_data, da.Array):
+        return da.zeros_like(fx_data, dtype=bool)
+    return np.zeros_like(fx_data, bool)
+
+
+def _broadcast_mask(mask, data):
+    """Broadcast a mask lazily against the trailing dimensions of `data`.
 
-    return inmask
+    The mask is chunked like `data`, so it is only expanded one chunk at a
+    time when the data is computed.
+    """
+    data = da.asanyarray(data)
+    mask = da.asarray(mask)
+    mask = mask.rechunk(data.chunks[data.ndim - mask.ndim:])
+    return da.broadcast_to(mask, data.shape, chunks=data.chunks)
 
 
 def _apply_fx_mask(fx_mask, var_data):
-    """Apply the fx data extracted mask on the actual processed data."""
+    """Apply the fx data extracted mask on the actual processed data.
+
+    The result is lazy if either the mask or the data is a dask array.
+    """
+    if isinstance(fx_mask, da.Array) or isinstance(var_data, da.Array):
+        var_data = da.ma.asanyarray(var_data)
+        var_mask = (_broadcast_mask(fx_mask, var_data)
+                    | da.ma.getmaskarray(var_data))
+        return da.ma.masked_array(da.ma.getdata(var_data),
+                                  mask=var_mask,
+                                  fill_value=1e+20)
+
     # Broadcast mask
-    var_mask = np.zeros_like(var_data, bool)
-    var_mask = np.broadcast_to(fx_mask, var_mask.shape).copy()
+    var_mask = np.broadcast_to(fx_mask, var_data.shape).copy()
 
     # Apply mask across
     if np.ma.is_masked(var_data):
@@ -86,7 +115,11 @@ def _apply_fx_mask(fx_mask, var_data):
     return var_data
 
 
-def mask_landsea(cube, fx_variables, mask_out, always_use_ne_mask=False):
+def mask_landsea(cube,
+                 fx_variables,
+                 mask_out,
+                 always_use_ne_mask=False,
+                 masks_dir=None):
     """
     Mask out either land mass or sea (oceans, seas and lakes).
 
@@ -110,6 +143,10 @@ def mask_landsea(cube, fx_variables, mask_out, always_use_ne_mask=False):
         always apply Natural Earths mask, regardless if fx files are available
         or not.
 
+    masks_dir: str, optional
+        directory where the Natural Earth masks on the grid of the cube are
+        stored, so they can be reused by other processes and later runs.
+
     Returns
     -------
     iris.cube.Cube
@@ -140,26 +177,26 @@ def mask_landsea(cube, fx_variables, mask_out, always_use_ne_mask=False):
             fxfile_members = os.path.basename(fx_file).split('_')
             for fx_root in ['sftlf', 'sftof']:
                 if fx_root in fxfile_members:
-                    fx_cubes[fx_root] = iris.load_cube(fx_file)
+                    fx_cubes[fx_root] = load_fx_cube(fx_file)
 
         # preserve importance order: try stflf first then sftof
         if ('sftlf' in fx_cubes.keys()
                 and _check_dims(cube, fx_cubes['sftlf'])):
-            landsea_mask = _get_fx_mask(fx_cubes['sftlf'].data, mask_out,
-                                        'sftlf')
-            cube.data = _apply_fx_mask(landsea_mask, cube.data)
+            landsea_mask = _get_fx_mask(fx_cubes['sftlf'].core_data(),
+                                        mask_out, 'sftlf')
+            cube.data = _apply_fx_mask(landsea_mask, cube.core_data())
             logger.debug("Applying land-sea mask: sftlf")
         elif ('sftof' in fx_cubes.keys()
               and _check_dims(cube, fx_cubes['sftof'])):
-            landsea_mask = _get_fx_mask(fx_cubes['sftof'].data, mask_out,
-                                        'sftof')
-            cube.data = _apply_fx_mask(landsea_mask, cube.data)
+            landsea_mask = _get_fx_mask(fx_cubes['sftof'].core_data(),
+                                        mask_out, 'sftof')
+            cube.data = _apply_fx_mask(landsea_mask, cube.core_data())
             logger.debug("Applying land-sea mask: sftof")
         else:
             if cube.coord('longitude').points.ndim < 2:
                 cube = _mask_with_shp(cube, shapefiles[mask_out], [
                     0,
-                ])
+                ], masks_dir)
                 logger.debug(
                     "Applying land-sea mask from Natural Earth"
                     " shapefile: \n%s", shapefiles[mask_out])
@@ -171,7 +208,7 @@ def mask_landsea(cube, fx_variables, mask_out, always_use_ne_mask=False):
         if cube.coord('longitude').points.ndim < 2:
             cube = _mask_with_shp(cube, shapefiles[mask_out], [
                 0,
-            ])
+            ], masks_dir)
             logger.debug(
                 "Applying land-sea mask from Natural Earth"
                 " shapefile: \n%s", shapefiles[mask_out])
@@ -220,11 +257,12 @@ def mask_landseaice(cube, fx_variables, mask_out):
         for fx_file in fx_files:
             if not fx_file:
                 continue
-            fx_cube = iris.load_cube(fx_file)
+            fx_cube = load_fx_cube(fx_file)
 
             if _check_dims(cube, fx_cube):
-                landice_mask = _get_fx_mask(fx_cube.data, mask_out, 'sftgif')
-                cube.data = _apply_fx_mask(landice_mask, cube.data)
+                landice_mask = _get_fx_mask(fx_cube.core_data(), mask_out,
+                                            'sftgif')
+                cube.data = _apply_fx_mask(landice_mask, cube.core_data())
                 logger.debug("Applying landsea-ice mask: sftgif")
             else:
                 msg = "Landsea-ice mask and data have different dimensions."
@@ -236,7 +274,7 @@ def mask_landseaice(cube, fx_variables, mask_out):
     return cube
 
 
-def mask_glaciated(cube, mask_out):
+def mask_glaciated(cube, mask_out, masks_dir=None):
     """
     Mask out glaciated areas.
 
@@ -251,6 +289,10 @@ def mask_glaciated(cube, mask_out):
     mask_out: str
         "glaciated" to mask out glaciated areas
 
+    masks_dir: str, optional
+        directory where the Natural Earth masks on the grid of the cube are
+        stored, so they can be reused by other processes and later runs.
+
     Returns
     -------
     iris.cube.Cube
@@ -280,7 +322,7 @@ def mask_glaciated(cube, mask_out):
             1662,
             1578,
             1606,
-        ])
+        ], masks_dir)
         logger.debug(
             "Applying glaciated areas mask from Natural Earth"
             " shapefile: \n%s", shapefiles[mask_out])
@@ -291,11 +333,16 @@ def mask_glaciated(cube, mask_out):
     return cube
 
 
+@functools.lru_cache(maxsize=None)
 def _get_geometries_from_shp(shapefilename):
-    """Get the mask geometries out from a shapefile."""
+    """Get the mask geometries out from a shapefile.
+
+    The geometries are read once per process, because reading the detailed
+    Natural Earth shapefiles takes much longer than using them.
+    """
     reader = shpreader.Reader(shapefilename)
     # Index 0 grabs the lowest resolution mask (no zoom)
-    geometries = [contour for contour in reader.geometries()]
+    geometries = tuple(reader.geometries())
     if not geometries:
         msg = "Could not find any geometry in {}".format(shapefilename)
         raise ValueError(msg)
@@ -306,7 +353,7 @@ def _get_geometries_from_shp(shapefilename):
     return geometries
 
 
-def _mask_with_shp(cube, shapefilename, region_indices=None):
+def _mask_with_shp(cube, shapefilename, region_indices=None, masks_dir=None):
     """
     Apply a Natural Earth land/sea mask.
 
@@ -318,15 +365,9 @@ def _mask_with_shp(cube, shapefilename, region_indices=None):
     region_indices is a list of indices that the user will want to index
     the regions on (select a region by its index as it is listed in
     the shapefile).
+    The mask is computed once per grid and cached, see
+    :class:`esmvalcore.preprocessor._shapes.ShapeMaskCache`.
     """
-    # Create the region
-    regions = _get_geometries_from_shp(shapefilename)
-    if region_indices:
-        regions = [regions[idx] for idx in region_indices]
-
-    # Create a mask for the data
-    mask = np.zeros(cube.shape, dtype=bool)
-
     # Create a set of x,y points from the cube
     # 1D regular grids
     if cube.coord('longitude').points.ndim < 2:
@@ -348,20 +389,24 @@ def _mask_with_shp(cube, shapefilename, region_indices=None):
     y_p_0 = np.where(y_p == -90., y_p + 1., y_p)
     y_p_90 = np.where(y_p_0 == 90., y_p_0 - 1., y_p_0)
 
-    for region in regions:
+    key = get_mask_key(shapefilename, region_indices, 'contains', x_p_180,
+                       y_p_90)
+    mask = MASK_CACHE.get(key, masks_dir)
+    if mask is None:
+        # Create the region
+        regions = _get_geometries_from_shp(shapefilename)
+        if region_indices:
+            regions = [regions[idx] for idx in region_indices]
+
         # Build mask with vectorization
-        if cube.ndim == 2:
-            mask = shp_vect.contains(region, x_p_180, y_p_90)
-        elif cube.ndim == 3:
-            mask[:] = shp_vect.contains(region, x_p_180, y_p_90)
-        elif cube.ndim == 4:
-            mask[:, :] = shp_vect.contains(region, x_p_180, y_p_90)
-
-        # Then apply the mask
-        if isinstance(cube.data, np.ma.MaskedArray):
-            cube.data.mask |= mask
-        else:
-            cube.data = np.ma.masked_array(cube.data, mask)
+        mask = np.zeros(x_p_180.shape, dtype=bool)
+        for region in regions:
+            mask |= contains(region, x_p_180, y_p_90)
+        MASK_CACHE.add(key, mask, masks_dir)
+
+    # Then apply the mask
+    data = cube.core_data()
+    cube.data = da.ma.masked_where(_broadcast_mask(mask, data), data)
 
     return cube
 
@@ -426,6 +471,20 @@ def count_spells(data, threshold, axis, spell_length):
     return spell_point_counts
 
 
+def _count_spells_lazy(data, threshold, axis, spell_length):
+    """Count data occurrences lazily, see :func:`count_spells`."""
+    if axis < 0:
+        axis += data.ndim
+    data = data.rechunk({axis: -1})
+    return da.map_blocks(count_spells,
+                         data,
+                         threshold,
+                         axis,
+                         spell_length,
+                         drop_axis=axis,
+                         dtype=int)
+
+
 def mask_above_threshold(cube, threshold):
     """
     Mask above a specific threshold value.
@@ -447,7 +506,8 @@ def mask_above_threshold(cube, threshold):
         thresholded cube.
 
     """
-    cube.data = np.ma.masked_where(cube.data > threshold, cube.data)
+    data = cube.core_data()
+    cube.data = da.ma.masked_where(data > threshold, data)
     return cube
 
 
@@ -471,7 +531,8 @@ def mask_below_threshold(cube, threshold):
         thresholded cube.
 
     """
-    cube.data = np.ma.masked_where(cube.data < threshold, cube.data)
+    data = cube.core_data()
+    cube.data = da.ma.masked_where(data < threshold, data)
     return cube
 
 
@@ -497,7 +558,7 @@ def mask_inside_range(cube, minimum, maximum):
         thresholded cube.
 
     """
-    cube.data = np.ma.masked_inside(cube.data, minimum, maximum)
+    cube.data = da.ma.masked_inside(cube.core_data(), minimum, maximum)
     return cube
 
 
@@ -523,7 +584,7 @@ def mask_outside_range(cube, minimum, maximum):
         thresholded cube.
 
     """
-    cube.data = np.ma.masked_outside(cube.data, minimum, maximum)
+    cube.data = da.ma.masked_outside(cube.core_data(), minimum, maximum)
     return cube
 
 
@@ -574,7 +635,7 @@ def mask_fillvalues(products,
     used = set()
     for product in products:
         for cube in product.cubes:
-            cube.data = np.ma.fix_invalid(cube.data, copy=False)
+            cube.data = da.ma.masked_invalid(cube.core_data())
             mask = _get_fillvalues_mask(cube, threshold_fraction,
                                         min_value, time_window)
             if combined_mask is None:
@@ -600,7 +661,9 @@ def mask_fillvalues(products,
         used = {p.copy_provenance() for p in used}
         for product in products:
             for cube in product.cubes:
-                cube.data.mask |= combined_mask
+                data = cube.core_data()
+                cube.data = da.ma.masked_where(
+                    _broadcast_mask(combined_mask, data), data)
             for other in used:
                 if other.filename != product.filename:
                     product.wasderivedfrom(other)
@@ -636,7 +699,8 @@ def _get_fillvalues_mask(cube, threshold_fraction, min_value, time_window):
     # Make an aggregator
     spell_count = Aggregator('spell_count',
                              count_spells,
-                             units_func=lambda units: 1)
+                             units_func=lambda units: 1,
+                             lazy_func=_count_spells_lazy)
 
     # Calculate the statistic.
     counts_windowed_cube = cube.collapsed('time',
@@ -13,13 +13,13 @@ It operates on different (time) spans:
 """
 
 import logging
-from datetime import datetime
-from functools import reduce
 
 import cf_units
+import dask.array as da
 import iris
 import numpy as np
 
+from ._calendar import date2days, decode_time
 from ._time import regrid_time
 
 logger = logging.getLogger(__name__)
@@ -33,77 +33,59 @@ def _get_time_offset(time_unit):
     return time_offset
 
 
-def _plev_fix(dataset, pl_idx):
-    """Extract valid plev data.
+_STATISTIC_FUNCTIONS = {
+    'mean': np.ma.mean,
+    'median': np.ma.median,
+    'std': np.ma.std,
+    'max': np.ma.max,
+    'min': np.ma.min,
+}
 
-    this function takes care of situations
-    in which certain plevs are completely
-    masked due to unavailable interpolation
-    boundaries.
-    """
-    if np.ma.is_masked(dataset):
-        # keep only the valid plevs
-        if not np.all(dataset.mask[pl_idx]):
-            statj = np.ma.array(dataset[pl_idx], mask=dataset.mask[pl_idx])
-        else:
-            logger.debug('All vals in plev are masked, ignoring.')
-            statj = None
-    else:
-        mask = np.zeros_like(dataset[pl_idx], bool)
-        statj = np.ma.array(dataset[pl_idx], mask=mask)
 
-    return statj
+def _compute_statistic_chunk(chunk, statistic_function):
+    """Compute a statistic over the model axis of a single chunk."""
+    chunk = np.ma.asarray(chunk)
+    return np.ma.asarray(statistic_function(chunk, axis=0))
 
 
 def _compute_statistic(data, statistic_name):
-    """Compute multimodel statistic."""
-    data = np.ma.array(data)
-    statistic = data[0]
-
-    if statistic_name == 'median':
-        statistic_function = np.ma.median
-    elif statistic_name == 'mean':
-        statistic_function = np.ma.mean
-    elif statistic_name == 'std':
-        statistic_function = np.ma.std
-    elif statistic_name == 'max':
-        statistic_function = np.ma.max
-    elif statistic_name == 'min':
-        statistic_function = np.ma.min
-    else:
-        raise NotImplementedError
+    """Compute multimodel statistic.
 
-    # no plevs
-    if len(data[0].shape) < 3:
-        # get all NOT fully masked data - u_data
-        # data is per time point
-        # so we can safely NOT compute stats for single points
-        if data.ndim == 1:
-            u_datas = [d for d in data]
-        else:
-            u_datas = [d for d in data if not np.all(d.mask)]
-        if len(u_datas) > 1:
-            statistic = statistic_function(data, axis=0)
-        else:
-            statistic.mask = True
-        return statistic
+    The statistic is computed lazily along the first (model) axis of
+    ``data``, which is expected to have shape (model, time, ...). Each
+    chunk holds all models for a part of the domain, so the statistic is
+    computed in a single pass over the data.
 
-    # plevs
-    for j in range(statistic.shape[0]):
-        plev_check = []
-        for cdata in data:
-            fixed_data = _plev_fix(cdata, j)
-            if fixed_data is not None:
-                plev_check.append(fixed_data)
-
-        # check for nr datasets
-        if len(plev_check) > 1:
-            plev_check = np.ma.array(plev_check)
-            statistic[j] = statistic_function(plev_check, axis=0)
-        else:
-            statistic.mask[j] = True
+    A time step (or a time step and vertical level, for data with a
+    vertical dimension) is masked if fewer than two models have valid
+    data for it.
+    """
+    if statistic_name not in _STATISTIC_FUNCTIONS:
+        raise NotImplementedError
+    statistic_function = _STATISTIC_FUNCTIONS[statistic_name]
+
+    data = da.asarray(data).rechunk({0: -1})
+    statistic = da.map_blocks(
+        _compute_statistic_chunk,
+        data,
+        statistic_function,
+        drop_axis=0,
+        dtype=data.dtype,
+        meta=np.ma.array([], dtype=data.dtype),
+    )
+
+    # time series do not need any check on the number of valid models
+    if data.ndim < 3:
+        return statistic
 
-    return statistic
+    # mask time steps (and vertical levels) with less than two valid models
+    n_horizontal = min(data.ndim - 2, 2)
+    horizontal_axes = tuple(range(data.ndim - n_horizontal, data.ndim))
+    valid = ~da.ma.getmaskarray(data)
+    n_valid = valid.any(axis=horizontal_axes).sum(axis=0)
+    mask = (n_valid < 2).reshape(n_valid.shape + (1, ) * n_horizontal)
+    mask = da.broadcast_to(mask, statistic.shape, chunks=statistic.chunks)
+    return da.ma.masked_where(mask, statistic)
 
 
 def _put_in_cube(template_cube, cube_data, statistic, t_axis):
@@ -150,7 +132,7 @@ def _put_in_cube(template_cube, cube_data, statistic, t_axis):
         ]
 
     # correct dspec if necessary
-    fixed_dspec = np.ma.fix_invalid(cube_data, copy=False, fill_value=1e+20)
+    fixed_dspec = da.ma.fix_invalid(cube_data, fill_value=1e+20)
     # put in cube
     stats_cube = iris.cube.Cube(
         fixed_dspec, dim_coords_and_dims=cspec, long_name=statistic)
@@ -167,32 +149,31 @@ def _put_in_cube(template_cube, cube_data, statistic, t_axis):
 
 
 def _datetime_to_int_days(cube):
-    """Return list of int(days) converted from cube datetime cells."""
+    """Return array of int(days) converted from cube time points."""
     cube = _align_yearly_axes(cube)
-    time_cells = [cell.point for cell in cube.coord('time').cells()]
-
-    # extract date info
-    real_dates = []
-    for date_obj in time_cells:
-        # real_date resets the actual data point day
-        # to the 1st of the month so that there are no
-        # wrong overlap indices
-        real_date = datetime(date_obj.year, date_obj.month, 1, 0, 0, 0)
-        real_dates.append(real_date)
-
-    # get the number of days starting from the reference unit
+    fields = decode_time(cube.coord('time'))
+
+    # get the number of days starting from the reference unit, after
+    # resetting the day of each point to the 1st of the month so that there
+    # are no wrong overlap indices
     time_unit = cube.coord('time').units.name
     time_offset = _get_time_offset(time_unit)
-    days = [(date_obj - time_offset).days for date_obj in real_dates]
-
+    days = (
+        date2days(fields['year'], fields['month'], 1, 'proleptic_gregorian') -
+        date2days(time_offset.year, time_offset.month, time_offset.day,
+                  'proleptic_gregorian'))
+    # like datetime.timedelta.days, round down if the offset is not midnight
+    if (time_offset.hour, time_offset.minute, time_offset.second,
+            time_offset.microsecond) != (0, 0, 0, 0):
+        days -= 1
     return days
 
 
 def _align_yearly_axes(cube):
     """Perform a time-regridding operation to align time axes for yr data."""
-    years = [cell.point.year for cell in cube.coord('time').cells()]
+    years = decode_time(cube.coord('time'))['year']
     # be extra sure that the first point is not in the previous year
-    if 0 not in np.diff(years):
+    if not np.any(np.diff(years) == 0):
         return regrid_time(cube, 'yr')
     return cube
 
@@ -208,16 +189,12 @@ def _get_overlap(cubes):
     takes the floor of first date and
     ceil of last date.
     """
-    all_times = []
-    for cube in cubes:
-        span = _datetime_to_int_days(cube)
-        start, stop = span[0], span[-1]
-        all_times.append([start, stop])
-    bounds = [range(b[0], b[-1] + 1) for b in all_times]
-    time_pts = reduce(np.intersect1d, bounds)
-    if len(time_pts) > 1:
-        time_bounds_list = [time_pts[0], time_pts[-1]]
-        return time_bounds_list
+    spans = [_datetime_to_int_days(cube)[[0, -1]] for cube in cubes]
+    start = max(span[0] for span in spans)
+    stop = min(span[-1] for span in spans)
+    if stop > start:
+        return [start, stop]
+    return None
 
 
 def _slice_cube(cube, t_1, t_2):
@@ -227,54 +204,47 @@ def _slice_cube(cube, t_1, t_2):
     Simple cube data slicer on indices
     of common time-data elements.
     """
-    time_pts = [t for t in cube.coord('time').points]
-    converted_t = _datetime_to_int_days(cube)
-    idxs = sorted([
-        time_pts.index(ii) for ii, jj in zip(time_pts, converted_t)
-        if t_1 <= jj <= t_2
-    ])
+    days = _datetime_to_int_days(cube)
+    idxs = np.flatnonzero((days >= t_1) & (days <= t_2))
     return [idxs[0], idxs[-1]]
 
 
 def _monthly_t(cubes):
     """Rearrange time points for monthly data."""
     # get original cubes tpoints
-    days = {day for cube in cubes for day in _datetime_to_int_days(cube)}
-    return sorted(days)
-
-
-def _full_time_slice(cubes, ndat, indices, ndatarr, t_idx):
-    """Construct a contiguous collection over time."""
-    for idx_cube, cube in enumerate(cubes):
-        # reset mask
-        ndat.mask = True
-        ndat[indices[idx_cube]] = cube.data
-        if np.ma.is_masked(cube.data):
-            ndat.mask[indices[idx_cube]] = cube.data.mask
-        else:
-            ndat.mask[indices[idx_cube]] = False
-        ndatarr[idx_cube] = ndat[t_idx]
+    return np.unique(
+        np.concatenate([_datetime_to_int_days(cube) for cube in cubes]))
+
 
-    # return time slice
-    return ndatarr
+def _full_time_data(cube, time_axis):
+    """Lazily put the data of a cube on the full time axis.
+
+    Time points of ``time_axis`` that are not covered by the cube are
+    masked.
+    """
+    days = _datetime_to_int_days(cube)
+    source = np.full(len(time_axis), -1)
+    source[np.searchsorted(time_axis, days)] = np.arange(len(days))
+    missing = source < 0
+
+    # keep the index monotonic, so dask does not need to shuffle chunks
+    source = np.maximum.accumulate(np.where(missing, 0, source))
+    data = cube.lazy_data()[source]
+    mask = missing.reshape((-1, ) + (1, ) * (data.ndim - 1))
+    mask = da.broadcast_to(mask, data.shape, chunks=data.chunks)
+    return da.ma.masked_where(mask, data)
 
 
 def _assemble_overlap_data(cubes, interval, statistic):
     """Get statistical data in iris cubes for OVERLAP."""
     start, stop = interval
     sl_1, sl_2 = _slice_cube(cubes[0], start, stop)
-    stats_dats = np.ma.zeros(cubes[0].data[sl_1:sl_2 + 1].shape)
-
-    # keep this outside the following loop
-    # this speeds up the code by a factor of 15
     indices = [_slice_cube(cube, start, stop) for cube in cubes]
-
-    for i in range(stats_dats.shape[0]):
-        time_data = [
-            cube.data[indx[0]:indx[1] + 1][i]
-            for cube, indx in zip(cubes, indices)
-        ]
-        stats_dats[i] = _compute_statistic(time_data, statistic)
+    data = da.stack([
+        cube.lazy_data()[indx[0]:indx[1] + 1]
+        for cube, indx in zip(cubes, indices)
+    ])
+    stats_dats = _compute_statistic(data, statistic)
     stats_cube = _put_in_cube(
         cubes[0][sl_1:sl_2 + 1], stats_dats, statistic, t_axis=None)
     return stats_cube
@@ -283,38 +253,9 @@ def _assemble_overlap_data(cubes, interval, statistic):
 def _assemble_full_data(cubes, statistic):
     """Get statistical data in iris cubes for FULL."""
     # all times, new MONTHLY data time axis
-    time_axis = [float(fl) for fl in _monthly_t(cubes)]
-
-    # new big time-slice array shape
-    new_shape = [len(time_axis)] + list(cubes[0].shape[1:])
-
-    # assemble an array to hold all time data
-    # for all cubes; shape is (ncubes,(plev), lat, lon)
-    new_arr = np.ma.empty([len(cubes)] + list(new_shape[1:]))
-
-    # data array for stats computation
-    stats_dats = np.ma.zeros(new_shape)
-
-    # assemble indices list to chop new_arr on
-    indices_list = []
-
-    # empty data array to hold time slices
-    empty_arr = np.ma.empty(new_shape)
-
-    # loop through cubes and populate empty_arr with points
-    for cube in cubes:
-        time_redone = _datetime_to_int_days(cube)
-        oidx = [time_axis.index(s) for s in time_redone]
-        indices_list.append(oidx)
-    for i in range(new_shape[0]):
-        # hold time slices only
-        new_datas_array = _full_time_slice(cubes, empty_arr, indices_list,
-                                           new_arr, i)
-        # list to hold time slices
-        time_data = []
-        for j in range(len(cubes)):
-            time_data.append(new_datas_array[j])
-        stats_dats[i] = _compute_statistic(time_data, statistic)
+    time_axis = _monthly_t(cubes).astype(np.float64)
+    data = da.stack([_full_time_data(cube, time_axis) for cube in cubes])
+    stats_dats = _compute_statistic(data, statistic)
     stats_cube = _put_in_cube(cubes[0], stats_dats, statistic, time_axis)
     return stats_cube
 
@@ -393,8 +334,8 @@ def multi_model_statistics(products, span, statistics, output_products=None):
             statistic_cube = _assemble_overlap_data(cubes, interval, statistic)
         elif span == 'full':
             statistic_cube = _assemble_full_data(cubes, statistic)
-        statistic_cube.data = np.ma.array(
-            statistic_cube.data, dtype=np.dtype('float32'))
+        statistic_cube.data = statistic_cube.lazy_data().astype(
+            np.dtype('float32'))
 
         if output_products:
             # Add to output product and log provenance
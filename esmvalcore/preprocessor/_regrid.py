@@ -4,11 +4,11 @@ import os
 import re
 from copy import deepcopy
 
+import dask.array as da
 import numpy as np
 import stratify
 import iris
 from iris.analysis import AreaWeighted, Linear, Nearest, UnstructuredNearest
-from iris.util import broadcast_to_shape
 
 from ..cmor.fix import fix_file, fix_metadata
 from ..cmor.table import CMOR_TABLES
@@ -257,7 +257,12 @@ def extract_point(cube, latitude, longitude, scheme):
     return cube
 
 
-def regrid(cube, target_grid, scheme, lat_offset=True, lon_offset=True):
+def regrid(cube,
+           target_grid,
+           scheme,
+           lat_offset=True,
+           lon_offset=True,
+           weights_dir=None):
     """
     Perform horizontal regridding.
 
@@ -285,6 +290,10 @@ def regrid(cube, target_grid, scheme, lat_offset=True, lon_offset=True):
         Offset the grid centers of the longitude coordinate w.r.t. Greenwich
         meridian by half a grid step.
         This argument is ignored if `target_grid` is a cube or file.
+    weights_dir : str, optional
+        Directory where the weights for regridding irregular grids with
+        ESMF are stored, so they can be reused in later runs. If None, the
+        weights are only cached in memory.
 
     Returns
     -------
@@ -332,7 +341,7 @@ def regrid(cube, target_grid, scheme, lat_offset=True, lon_offset=True):
 
     # Perform the horizontal regridding.
     if _attempt_irregular_regridding(cube, scheme):
-        cube = esmpy_regrid(cube, target_grid, scheme)
+        cube = esmpy_regrid(cube, target_grid, scheme, weights_dir)
     else:
         cube = cube.regrid(target_grid, HORIZONTAL_SCHEMES[scheme])
 
@@ -421,27 +430,20 @@ def _create_cube(src_cube, data, src_levels, levels, ):
     return result
 
 
-def _vertical_interpolate(cube, src_levels, levels, interpolation,
-                          extrapolation):
-    """Perform vertical interpolation."""
-    # Determine the source levels and axis for vertical interpolation.
-    z_axis, = cube.coord_dims(cube.coord(axis='z', dim_coords=True))
-
-    # Broadcast the 1d source cube vertical coordinate to fully
-    # describe the spatial extent that will be interpolated.
-    src_levels_broadcast = broadcast_to_shape(
-        src_levels.points, cube.shape, cube.coord_dims(src_levels))
-
+def _interpolate_block(data, src_levels, levels, axis, interpolation,
+                       extrapolation):
+    """Vertically interpolate a block of data with stratify."""
+    if not np.issubdtype(data.dtype, np.floating):
+        data = data.astype(np.float64)
     # force mask onto data as nan's
-    if np.ma.is_masked(cube.data):
-        cube.data[cube.data.mask] = np.nan
+    data = np.ma.filled(data, np.nan)
+    src_levels = np.broadcast_to(src_levels, data.shape)
 
-    # Now perform the actual vertical interpolation.
     new_data = stratify.interpolate(
         levels,
-        src_levels_broadcast,
-        cube.data,
-        axis=z_axis,
+        src_levels,
+        data,
+        axis=axis,
         interpolation=interpolation,
         extrapolation=extrapolation)
 
@@ -452,6 +454,57 @@ def _vertical_interpolate(cube, src_levels, levels, interpolation,
         # Ensure that the data is masked appropriately.
         new_data = np.ma.array(new_data, mask=mask, fill_value=_MDI)
 
+    return new_data
+
+
+def _vertical_interpolate(cube, src_levels, levels, interpolation,
+                          extrapolation):
+    """Perform vertical interpolation.
+
+    The interpolation is done lazily, block by block. The data is
+    rechunked such that the vertical dimension is contained in a single
+    chunk, so only the data for a part of the other dimensions needs to be
+    in memory at the same time.
+    """
+    # Determine the source levels and axis for vertical interpolation.
+    z_axis, = cube.coord_dims(cube.coord(axis='z', dim_coords=True))
+
+    data = cube.lazy_data()
+    data = data.rechunk({
+        i: -1 if i == z_axis else 'auto'
+        for i in range(data.ndim)
+    })
+
+    # Reshape the source cube vertical coordinate such that it can be
+    # broadcast to the blocks of the data.
+    src_dims = cube.coord_dims(src_levels)
+    points = da.asarray(src_levels.core_points())
+    points = da.transpose(points, np.argsort(src_dims))
+    points = points.reshape([
+        cube.shape[i] if i in src_dims else 1 for i in range(cube.ndim)
+    ])
+    points = points.rechunk([
+        data.chunks[i] if i in src_dims else -1 for i in range(cube.ndim)
+    ])
+
+    dtype = data.dtype
+    if not np.issubdtype(dtype, np.floating):
+        dtype = np.dtype(np.float64)
+    chunks = list(data.chunks)
+    chunks[z_axis] = (len(levels), )
+    new_data = da.map_blocks(
+        _interpolate_block,
+        data,
+        points,
+        levels=levels,
+        axis=z_axis,
+        interpolation=interpolation,
+        extrapolation=extrapolation,
+        chunks=chunks,
+        dtype=dtype,
+        meta=np.ma.masked_array(np.empty((0, ) * data.ndim, dtype=dtype)),
+    )
+
     # Construct the resulting cube with the interpolated data.
     return _create_cube(cube, new_data, src_levels, levels.astype(float))
 
@@ -1,12 +1,20 @@
 # -*- coding: utf-8 -*-
 """Provides regridding for irregular grids."""
 
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
 import ESMF
 import iris
 import numpy as np
+import scipy.sparse
 
-from ._mapping import get_empty_data, map_slices, ref_to_dims_index
+from ._mapping import get_empty_data, map_slices_lazy, ref_to_dims_index
 
+logger = logging.getLogger(__name__)
 
 ESMF_MANAGER = ESMF.Manager(debug=False)
 
@@ -32,6 +40,93 @@ MASK_REGRIDDING_MASK_VALUE = {
 #     'nearest_dtos': ESMF.RegridMethod.NEAREST_DTOS,
 # }
 
+WEIGHTS_CACHE_MAX_BYTES = 512 * 2**20
+"""Maximum size in bytes of the regridding weights cached per process."""
+
+
+class RegridWeightsCache:
+    """Least recently used cache of regridding weights.
+
+    The weights are stored as sparse matrices together with the mask of
+    the destination grid. Entries are keyed by a hash of the source and
+    destination grid coordinates, the source mask and the regridding
+    method, see :func:`get_weights_key`. The total size of the cached
+    weights is limited to ``max_bytes``. If a ``directory`` is passed to
+    :meth:`get` and :meth:`add`, the weights are also stored on disk, so
+    they can be reused by other processes and later runs.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Maximum total size of the cached weights in bytes.
+    """
+
+    def __init__(self, max_bytes=WEIGHTS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._weights = OrderedDict()
+
+    @property
+    def nbytes(self):
+        """Total size of the cached weights in bytes."""
+        return sum(
+            _get_nbytes(weights, dst_mask)
+            for weights, dst_mask in self._weights.values())
+
+    def clear(self):
+        """Remove all weights from the cache."""
+        self._weights.clear()
+
+    def get(self, key, directory=None):
+        """Get weights and destination mask, or None if not available."""
+        if key in self._weights:
+            self._weights.move_to_end(key)
+            return self._weights[key]
+        if directory is None:
+            return None
+        filename = os.path.join(directory, key + '.npz')
+        if not os.path.exists(filename):
+            return None
+        logger.debug("Loading regridding weights from %s", filename)
+        with np.load(filename) as content:
+            weights = scipy.sparse.csr_matrix(
+                (content['data'], content['indices'], content['indptr']),
+                shape=tuple(content['shape']))
+            dst_mask = content['dst_mask']
+        self.add(key, weights, dst_mask)
+        return weights, dst_mask
+
+    def add(self, key, weights, dst_mask, directory=None):
+        """Add weights and destination mask to the cache."""
+        if _get_nbytes(weights, dst_mask) <= self.max_bytes:
+            self._weights[key] = (weights, dst_mask)
+            self._shrink()
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix='.npz',
+                                         delete=False) as file:
+            np.savez(file,
+                     data=weights.data,
+                     indices=weights.indices,
+                     indptr=weights.indptr,
+                     shape=weights.shape,
+                     dst_mask=dst_mask)
+        os.replace(file.name, os.path.join(directory, key + '.npz'))
+
+    def _shrink(self):
+        """Remove least recently used weights until the cache fits."""
+        while self.nbytes > self.max_bytes:
+            self._weights.popitem(last=False)
+
+
+def _get_nbytes(weights, dst_mask):
+    """Get the size of sparse weights and a mask in bytes."""
+    return (weights.data.nbytes + weights.indices.nbytes +
+            weights.indptr.nbytes + dst_mask.nbytes)
+
+
+WEIGHTS_CACHE = RegridWeightsCache()
+
 
 def cf_2d_bounds_to_esmpy_corners(bounds, circular):
     """Convert cf style 2d bounds to normal (esmpy style) corners."""
@@ -144,10 +239,56 @@ def get_representant(cube, ref_to_slice):
     return cube[rep_ind]
 
 
-def build_regridder_2d(src_rep, dst_rep, regrid_method, mask_threshold):
-    """Build regridder for 2d regridding."""
+def get_weights_key(src_rep, dst_rep, regrid_method, mask_threshold):
+    """Compute the key of the regridding weights in the cache.
+
+    The key is a hash of the horizontal coordinates of the source and
+    destination grid, the mask of the source grid and the regridding
+    method, so all datasets on the same grid share the same weights.
+    """
+    hasher = hashlib.sha256()
+    for rep in (src_rep, dst_rep):
+        for name in ('latitude', 'longitude'):
+            coord = rep.coord(name)
+            hasher.update(
+                np.ascontiguousarray(coord.points, dtype=np.float64))
+            if coord.has_bounds():
+                hasher.update(
+                    np.ascontiguousarray(coord.bounds, dtype=np.float64))
+        hasher.update(str(rep.shape).encode())
+    hasher.update(np.ascontiguousarray(np.ma.getmaskarray(src_rep.data)))
+    hasher.update(f'{regrid_method}-{mask_threshold}'.encode())
+    return hasher.hexdigest()
+
+
+def _get_weights_matrix(shape, **regridding_arguments):
+    """Compute the weights of an ESMF regridder as a sparse matrix."""
+    esmf_regridder = ESMF.Regrid(factors=True, **regridding_arguments)
+    weights = esmf_regridder.get_weights_dict(deep_copy=True)
+    esmf_regridder.destroy()
+    # ESMF uses 1-based indices of the flattened grids, which have the
+    # same order as the flattened (latitude, longitude) data of a cube.
+    return scipy.sparse.csr_matrix(
+        (weights['weights'], (weights['row_dst'] - 1,
+                              weights['col_src'] - 1)),
+        shape=shape,
+    )
+
+
+def compute_weights(src_rep, dst_rep, regrid_method, mask_threshold):
+    """Compute the weights for 2d regridding with ESMF.
+
+    Returns
+    -------
+    tuple of :class:`scipy.sparse.csr_matrix` and :class:`numpy.ndarray`
+        The regridding weights, which map the flattened source grid to the
+        flattened destination grid, and the mask of the destination grid.
+    """
     dst_field = cube_to_empty_field(dst_rep)
     src_field = cube_to_empty_field(src_rep)
+    src_mask = np.ma.getmaskarray(src_rep.data)
+    dst_shape = tuple(dst_rep.shape)
+    shape = (int(np.prod(dst_shape)), src_mask.size)
     regridding_arguments = {
         'srcfield': src_field,
         'dstfield': dst_field,
@@ -155,73 +296,117 @@ def build_regridder_2d(src_rep, dst_rep, regrid_method, mask_threshold):
         'unmapped_action': ESMF.UnmappedAction.IGNORE,
         'ignore_degenerate': True,
     }
-    if np.ma.is_masked(src_rep.data):
-        src_field.data[...] = ~src_rep.data.mask.T
-        src_mask = src_field.grid.get_item(ESMF.GridItem.MASK,
-                                           ESMF.StaggerLoc.CENTER)
-        src_mask[...] = src_rep.data.mask.T
-        center_mask = dst_field.grid.get_item(ESMF.GridItem.MASK,
-                                              ESMF.StaggerLoc.CENTER)
-        center_mask[...] = 0
-        mask_regridder = ESMF.Regrid(
+    center_mask = dst_field.grid.get_item(ESMF.GridItem.MASK,
+                                          ESMF.StaggerLoc.CENTER)
+    center_mask[...] = 0
+    if src_mask.any():
+        grid_mask = src_field.grid.get_item(ESMF.GridItem.MASK,
+                                            ESMF.StaggerLoc.CENTER)
+        grid_mask[...] = src_mask.T
+        mask_weights = _get_weights_matrix(
+            shape,
             src_mask_values=MASK_REGRIDDING_MASK_VALUE[regrid_method],
             dst_mask_values=np.array([]),
             **regridding_arguments)
-        regr_field = mask_regridder(src_field, dst_field)
-        dst_mask = regr_field.data[...].T < mask_threshold
+        valid_fraction = mask_weights.dot(
+            (~src_mask).ravel().astype(np.float64))
+        dst_mask = valid_fraction.reshape(dst_shape) < mask_threshold
         center_mask[...] = dst_mask.T
     else:
-        dst_mask = False
-    field_regridder = ESMF.Regrid(src_mask_values=np.array([1]),
+        dst_mask = np.zeros(dst_shape, dtype=bool)
+    weights = _get_weights_matrix(shape,
+                                  src_mask_values=np.array([1]),
                                   dst_mask_values=np.array([1]),
                                   **regridding_arguments)
+    # Mask destination points that are not covered by the source grid.
+    dst_mask |= (weights.getnnz(axis=1) == 0).reshape(dst_shape)
+    return weights, dst_mask
+
+
+def get_weights(src_rep, dst_rep, regrid_method, mask_threshold,
+                weights_dir=None):
+    """Get the weights for 2d regridding, from the cache if available."""
+    key = get_weights_key(src_rep, dst_rep, regrid_method, mask_threshold)
+    cached = WEIGHTS_CACHE.get(key, weights_dir)
+    if cached is not None:
+        logger.debug("Using cached regridding weights %s", key)
+        return cached
+    weights, dst_mask = compute_weights(src_rep, dst_rep, regrid_method,
+                                        mask_threshold)
+    WEIGHTS_CACHE.add(key, weights, dst_mask, weights_dir)
+    return weights, dst_mask
+
+
+def apply_weights(data, weights, dst_mask):
+    """Regrid the last two dimensions of an array with sparse weights.
+
+    Parameters
+    ----------
+    data: numpy.ndarray or numpy.ma.MaskedArray
+        Source data, the last two dimensions are the horizontal grid.
+    weights: scipy.sparse.csr_matrix
+        Regridding weights from :func:`compute_weights`.
+    dst_mask: numpy.ndarray
+        Mask of the destination grid.
+
+    Returns
+    -------
+    numpy.ma.MaskedArray
+        Regridded data, the last two dimensions are replaced by the
+        destination grid.
+    """
+    shape = data.shape[:-2] + dst_mask.shape
+    src = np.ma.getdata(data).reshape(-1, weights.shape[1])
+    res = weights.dot(src.T).T.reshape(shape).astype(data.dtype, copy=False)
+    mask = np.broadcast_to(dst_mask, shape)
+    return np.ma.masked_array(res, mask.copy())
+
+
+def build_regridder_2d(src_rep, dst_rep, regrid_method, mask_threshold,
+                       weights_dir=None):
+    """Build regridder for 2d regridding."""
+    weights, dst_mask = get_weights(src_rep, dst_rep, regrid_method,
+                                    mask_threshold, weights_dir)
 
-    def regridder(src):
+    def regridder(data):
         """Regrid 2d for irregular grids."""
-        res = get_empty_data(dst_rep.shape, src.dtype)
-        data = src.data
-        if np.ma.is_masked(data):
-            data = data.data
-        src_field.data[...] = data.T
-        regr_field = field_regridder(src_field, dst_field)
-        res.data[...] = regr_field.data[...].T
-        res.mask[...] = dst_mask
-        return res
+        return apply_weights(data, weights, dst_mask)
 
     return regridder
 
 
-def build_regridder_3d(src_rep, dst_rep, regrid_method, mask_threshold):
-    # pylint: disable=too-many-locals
-    # The necessary refactoring will be done for the full 3d regridding.
+def build_regridder_3d(src_rep, dst_rep, regrid_method, mask_threshold,
+                       weights_dir=None):
     """Build regridder for 2.5d regridding."""
-    esmf_regridders = []
+    level_weights = []
     no_levels = src_rep.shape[0]
     for level in range(no_levels):
-        esmf_regridders.append(
-            build_regridder_2d(src_rep[level], dst_rep[level],
-                               regrid_method, mask_threshold)
-        )
+        level_weights.append(
+            get_weights(src_rep[level], dst_rep[level], regrid_method,
+                        mask_threshold, weights_dir))
 
-    def regridder(src):
+    def regridder(data):
         """Regrid 2.5d for irregular grids."""
-        res = get_empty_data(dst_rep.shape, src.dtype)
-        for i, esmf_regridder in enumerate(esmf_regridders):
-            res[i, ...] = esmf_regridder(src[i])
-        return res
+        return np.ma.stack([
+            apply_weights(data[..., i, :, :], weights, dst_mask)
+            for i, (weights, dst_mask) in enumerate(level_weights)
+        ], axis=-3)
 
     return regridder
 
 
-def build_regridder(src_rep, dst_rep, method, mask_threshold=.99):
+def build_regridder(src_rep, dst_rep, method, mask_threshold=.99,
+                    weights_dir=None):
     """Build regridders from representants."""
     regrid_method = ESMF_REGRID_METHODS[method]
     if src_rep.ndim == 2:
         regridder = build_regridder_2d(src_rep, dst_rep,
-                                       regrid_method, mask_threshold)
+                                       regrid_method, mask_threshold,
+                                       weights_dir)
     elif src_rep.ndim == 3:
         regridder = build_regridder_3d(src_rep, dst_rep,
-                                       regrid_method, mask_threshold)
+                                       regrid_method, mask_threshold,
+                                       weights_dir)
     return regridder
 
 
@@ -299,7 +484,7 @@ def get_grid_representants(src, dst):
     return src_rep, dst_rep
 
 
-def regrid(src, dst, method='linear'):
+def regrid(src, dst, method='linear', weights_dir=None):
     """
     Regrid src_cube to the grid defined by dst_cube.
 
@@ -316,11 +501,15 @@ def regrid(src, dst, method='linear'):
         Selects the regridding method.
         Can be 'linear', 'area_weighted',
         or 'nearest'. See ESMPy_.
+    weights_dir: str, optional
+        Directory where the regridding weights are stored, so they can be
+        reused by other processes and later runs. If None, the weights are
+        only cached in memory.
 
     Returns
     -------
     :class:`iris.cube.Cube`:
-        The regridded cube.
+        The regridded cube, its data is lazy.
 
 
     .. _ESMPy: http://www.earthsystemmodeling.org/
@@ -328,6 +517,7 @@ def regrid(src, dst, method='linear'):
        RegridMethod.html#ESMF.api.constants.RegridMethod
     """
     src_rep, dst_rep = get_grid_representants(src, dst)
-    regridder = build_regridder(src_rep, dst_rep, method)
-    res = map_slices(src, regridder, src_rep, dst_rep)
+    regridder = build_regridder(src_rep, dst_rep, method,
+                                weights_dir=weights_dir)
+    res = map_slices_lazy(src, regridder, src_rep, dst_rep)
     return res
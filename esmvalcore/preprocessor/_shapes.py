@@ -0,0 +1,154 @@
+"""Masks of shapes on model grids.
+
+Computing which grid points lie inside a shape is expensive for detailed
+shapes and fine grids, while the result only depends on the shape and the
+grid. The masks are therefore cached, keyed by the shape and the grid, so
+they are computed once for all datasets and variables on the same grid.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+import shapely.vectorized
+
+from ._cache import get_file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MASK_CACHE_MAX_BYTES = 256 * 2**20
+"""Maximum size in bytes of the shape masks cached in memory per process."""
+
+
+def get_mask_key(shapefile, shape_id, method, lon, lat):
+    """Compute the key of the mask of a shape on a grid.
+
+    Parameters
+    ----------
+    shapefile: str
+        Path to the file that contains the shape.
+    shape_id: object
+        Identifier of the shape(s) within the file, e.g. an index or a
+        list of indices. Its ``repr`` is used in the key.
+    method: str
+        Method used to select the grid points.
+    lon: numpy.ndarray
+        Longitudes of the grid points.
+    lat: numpy.ndarray
+        Latitudes of the grid points.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 digest.
+    """
+    hasher = hashlib.sha256()
+    content = (get_file_fingerprint(shapefile), shape_id, method)
+    hasher.update(repr(content).encode('utf-8'))
+    for points in (lon, lat):
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        hasher.update(repr(points.shape).encode('utf-8'))
+        hasher.update(points.tobytes())
+    return hasher.hexdigest()
+
+
+class ShapeMaskCache:
+    """Least recently used cache of shape masks.
+
+    The masks are boolean arrays with the shape of the horizontal grid,
+    keyed by :func:`get_mask_key`. The total size of the cached masks is
+    limited to ``max_bytes``. If a ``directory`` is passed to :meth:`get`
+    and :meth:`add`, the masks are also stored on disk, so they can be
+    reused by other processes and later runs.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Maximum total size of the cached masks in bytes.
+    """
+
+    def __init__(self, max_bytes=MASK_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._masks = OrderedDict()
+
+    @property
+    def nbytes(self):
+        """Total size of the cached masks in bytes."""
+        return sum(mask.nbytes for mask in self._masks.values())
+
+    def clear(self):
+        """Remove all masks from the cache."""
+        self._masks.clear()
+
+    def get(self, key, directory=None):
+        """Get a mask, or None if not available."""
+        if key in self._masks:
+            self._masks.move_to_end(key)
+            return self._masks[key]
+        if directory is None:
+            return None
+        filename = os.path.join(directory, key + '.npy')
+        if not os.path.exists(filename):
+            return None
+        logger.debug("Loading shape mask from %s", filename)
+        mask = np.load(filename)
+        self.add(key, mask)
+        return mask
+
+    def add(self, key, mask, directory=None):
+        """Add a mask to the cache."""
+        mask.flags.writeable = False
+        if mask.nbytes <= self.max_bytes:
+            self._masks[key] = mask
+            while self.nbytes > self.max_bytes:
+                self._masks.popitem(last=False)
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory,
+                                         suffix='.npy',
+                                         delete=False) as file:
+            np.save(file, mask)
+        os.replace(file.name, os.path.join(directory, key + '.npy'))
+
+
+MASK_CACHE = ShapeMaskCache()
+
+
+def contains(shape, lon, lat):
+    """Select the grid points inside a shape.
+
+    Shapes consisting of many parts, such as coastlines, are handled part
+    by part and each part is only tested against the grid points inside
+    its bounding box, which is much faster than testing all grid points
+    against the complete shape.
+
+    Parameters
+    ----------
+    shape: shapely.geometry.base.BaseGeometry
+        The shape.
+    lon: numpy.ndarray
+        Longitudes of the grid points.
+    lat: numpy.ndarray
+        Latitudes of the grid points, with the same shape as `lon`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Boolean array with the shape of `lon`, True inside the shape.
+    """
+    lon = np.asarray(lon)
+    lat = np.asarray(lat)
+    select = np.zeros(lon.shape, dtype=bool)
+    for part in getattr(shape, 'geoms', [shape]):
+        if part.is_empty:
+            continue
+        min_lon, min_lat, max_lon, max_lat = part.bounds
+        candidates = ((lon >= min_lon) & (lon <= max_lon) & (lat >= min_lat)
+                      & (lat <= max_lat) & ~select)
+        if candidates.any():
+            select[candidates] = shapely.vectorized.contains(
+                part, lon[candidates], lat[candidates])
+    return select
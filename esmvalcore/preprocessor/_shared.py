@@ -4,12 +4,111 @@ Shared functions for preprocessor.
 Utility functions that can be used for multiple preprocessor steps
 """
 import logging
+import os
+from collections import OrderedDict
 
+import dask.array as da
 import iris
 import iris.analysis
+import iris.analysis.cartography
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+FX_CACHE_MAX_BYTES = 512 * 2**20
+"""Maximum size in bytes of the fx variables cached in memory per process."""
+
+
+class FxCubeCache:
+    """Least recently used cache of fx variables loaded from file.
+
+    Cubes are keyed by file path and modification time, so a file that
+    changes on disk is loaded again. The data of each cached cube is read
+    from disk once and the total size of the cached data is limited to
+    ``max_bytes``; larger files are not cached and their data is not
+    read. Cached data is read-only and handed out as lazy data, so callers
+    always receive an independent cube.
+
+    Parameters
+    ----------
+    max_bytes: int
+        Maximum total size of the cached data in bytes.
+    """
+
+    def __init__(self, max_bytes=FX_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._cubes = OrderedDict()
+
+    @property
+    def nbytes(self):
+        """Total size of the cached data in bytes."""
+        return sum(_get_nbytes(cube.data) for cube in self._cubes.values())
+
+    def clear(self):
+        """Remove all cubes from the cache."""
+        self._cubes.clear()
+
+    def load_cube(self, filename):
+        """Load an fx variable from file, or from the cache if available."""
+        filename = os.path.abspath(filename)
+        key = (filename, os.stat(filename).st_mtime_ns)
+        if key in self._cubes:
+            logger.debug("Using cached fx variable from %s", filename)
+            self._cubes.move_to_end(key)
+            cube = self._cubes[key]
+        else:
+            logger.debug("Loading fx variable from %s", filename)
+            cube = iris.load_cube(filename)
+            if cube.lazy_data().nbytes > self.max_bytes:
+                # Too large to cache, keep the data lazy
+                return cube
+            _set_read_only(cube.data)
+            if _get_nbytes(cube.data) <= self.max_bytes:
+                self._cubes[key] = cube
+                self._shrink()
+        data = da.from_array(cube.data, chunks=cube.shape)
+        return cube.copy(data=data)
+
+    def _shrink(self):
+        """Remove least recently used cubes until the cache fits."""
+        while self.nbytes > self.max_bytes:
+            self._cubes.popitem(last=False)
+
+
+def _get_nbytes(data):
+    """Get the size of a (masked) array in bytes."""
+    nbytes = data.nbytes
+    if np.ma.isMaskedArray(data):
+        nbytes += np.ma.getmaskarray(data).nbytes
+    return nbytes
+
+
+def _set_read_only(data):
+    """Make a (masked) array read-only, so it can be shared safely."""
+    data.flags.writeable = False
+    mask = np.ma.getmask(data)
+    if mask is not np.ma.nomask:
+        mask.flags.writeable = False
+
+
+FX_CACHE = FxCubeCache()
+
+
+def load_fx_cube(filename):
+    """Load an fx variable using the per-process cache.
+
+    Parameters
+    ----------
+    filename: str
+        Path to the file containing the fx variable.
+
+    Returns
+    -------
+    iris.cube.Cube
+        The fx variable, with lazy data.
+    """
+    return FX_CACHE.load_cube(filename)
+
 
 # guess bounds tool
 def guess_bounds(cube, coords):
@@ -67,3 +166,87 @@ def operator_accept_weights(operator):
 
     """
     return operator.lower() in ('mean', 'sum')
+
+
+def get_broadcastable(array, dims, ndim):
+    """Reshape an array so it can be broadcast against a cube.
+
+    Weights such as cell areas, layer thicknesses or time step lengths only
+    vary along a few dimensions of a cube. They are kept at that low rank,
+    with length one along all other dimensions, until they are needed.
+
+    Parameters
+    ----------
+    array: numpy.ndarray or dask.array.Array
+        Array spanning the cube dimensions `dims`, in increasing order.
+    dims: tuple of int
+        Cube dimensions spanned by `array`.
+    ndim: int
+        Number of dimensions of the cube.
+
+    Returns
+    -------
+    numpy.ndarray or dask.array.Array
+        Array with `ndim` dimensions.
+    """
+    shape = [1] * ndim
+    for dim, size in zip(dims, array.shape):
+        shape[dim] = size
+    return array.reshape(shape)
+
+
+def get_area_weights(cube):
+    """Compute the cell areas of the horizontal grid of a cube.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Input cube with latitude and longitude coordinates with bounds.
+
+    Returns
+    -------
+    numpy.ndarray
+        Cell areas, with length one along the non-horizontal dimensions.
+    """
+    horizontal_dims = sorted(
+        set(cube.coord_dims('latitude') + cube.coord_dims('longitude')))
+    index = tuple(
+        slice(None) if dim in horizontal_dims else 0
+        for dim in range(cube.ndim))
+    area = iris.analysis.cartography.area_weights(cube[index])
+    return get_broadcastable(area, horizontal_dims, cube.ndim)
+
+
+def is_broadcastable(weights, shape):
+    """Check whether `weights` can be broadcast to an array of `shape`."""
+    return weights.ndim == len(shape) and all(
+        size in (1, target) for size, target in zip(weights.shape, shape))
+
+
+def broadcast_weights(cube, weights):
+    """Broadcast low-rank weights to the shape of a cube without copying.
+
+    For cubes with realized data a read-only view is returned, for cubes
+    with lazy data the weights are chunked like the data, so they are only
+    expanded one chunk at a time during the computation.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Cube the weights apply to.
+    weights: numpy.ndarray or dask.array.Array
+        Weights with the same number of dimensions as the cube.
+
+    Returns
+    -------
+    numpy.ndarray or dask.array.Array
+        Weights with the shape of the cube.
+    """
+    if not cube.has_lazy_data():
+        return np.broadcast_to(np.asarray(weights), cube.shape)
+    chunks = cube.lazy_data().chunks
+    weights = da.asarray(weights)
+    weights = weights.rechunk(
+        tuple((1, ) if size == 1 else chunk
+              for size, chunk in zip(weights.shape, chunks)))
+    return da.broadcast_to(weights, cube.shape, chunks=chunks)
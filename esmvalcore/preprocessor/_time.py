@@ -4,20 +4,31 @@ Allows for selecting data subsets using certain time bounds;
 constructing seasonal and area averages.
 """
 import copy
-import datetime
 import logging
 from warnings import filterwarnings
 
 import dask.array as da
 import iris
-import iris.coord_categorisation
 import iris.cube
 import iris.exceptions
 import iris.util
 import numpy as np
-from iris.time import PartialDateTime
 
-from ._shared import get_iris_analysis_operation, operator_accept_weights
+from ._calendar import (
+    SEASONS,
+    add_time_coord,
+    decode_time,
+    encode_time,
+    get_season_number,
+    select_dates,
+)
+from ._groupby import aggregate_by
+from ._shared import (
+    broadcast_weights,
+    get_broadcastable,
+    get_iris_analysis_operation,
+    operator_accept_weights,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -83,15 +94,10 @@ def extract_time(cube, start_year, start_month, start_day, end_year, end_month,
             start_day = 30
         if end_day > 30:
             end_day = 30
-    t_1 = PartialDateTime(
-        year=int(start_year), month=int(start_month), day=int(start_day))
-    t_2 = PartialDateTime(
-        year=int(end_year), month=int(end_month), day=int(end_day))
+    start = (int(start_year), int(start_month), int(start_day))
+    end = (int(end_year), int(end_month), int(end_day))
 
-    constraint = iris.Constraint(
-        time=lambda t: t_1 <= t.point < t_2)
-
-    cube_slice = cube.extract(constraint)
+    cube_slice = _select_time(cube, select_dates(time_coord, start, end))
     if cube_slice is None:
         raise ValueError(
             f"Time slice {start_year:0>4d}-{start_month:0>2d}-{start_day:0>2d}"
@@ -108,6 +114,41 @@ def extract_time(cube, start_year, start_month, start_day, end_year, end_month,
     return cube_slice
 
 
+def _select_time(cube, indices):
+    """Select time points from a cube.
+
+    Like :meth:`iris.cube.Cube.extract`, None is returned if no points are
+    selected and the time dimension is removed if a single point is
+    selected.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Input cube.
+    indices: slice or numpy.ndarray
+        Slice, integer indices or boolean mask of the selected time points.
+
+    Returns
+    -------
+    iris.cube.Cube or None
+        Cube with the selected time points.
+    """
+    time_coord = cube.coord('time')
+    indices = np.arange(time_coord.shape[0])[indices]
+    if indices.size == 0:
+        return None
+    if indices.size == 1:
+        indices = indices[0]
+    elif np.all(np.diff(indices) == 1):
+        indices = slice(indices[0], indices[-1] + 1)
+    dims = cube.coord_dims(time_coord)
+    if not dims:
+        return cube
+    slicer = [slice(None)] * cube.ndim
+    slicer[dims[0]] = indices
+    return cube[tuple(slicer)]
+
+
 def extract_season(cube, season):
     """
     Slice cube to get only the data belonging to a specific season.
@@ -124,13 +165,17 @@ def extract_season(cube, season):
     iris.cube.Cube
         data cube for specified season.
     """
+    season = season.lower()
+    if season not in SEASONS:
+        raise ValueError(f"Unknown season '{season}', choose from "
+                         f"{', '.join(s.upper() for s in SEASONS)}.")
     if not cube.coords('clim_season'):
-        iris.coord_categorisation.add_season(cube, 'time', name='clim_season')
+        add_time_coord(cube, 'clim_season')
     if not cube.coords('season_year'):
-        iris.coord_categorisation.add_season_year(cube,
-                                                  'time',
-                                                  name='season_year')
-    return cube.extract(iris.Constraint(clim_season=season.lower()))
+        add_time_coord(cube, 'season_year')
+    month = decode_time(cube.coord('time'))['month']
+    return _select_time(
+        cube, get_season_number(month) == SEASONS.index(season))
 
 
 def extract_month(cube, month):
@@ -152,9 +197,9 @@ def extract_month(cube, month):
     if month not in range(1, 13):
         raise ValueError('Please provide a month number between 1 and 12.')
     if not cube.coords('month_number'):
-        iris.coord_categorisation.add_month_number(cube, 'time',
-                                                   name='month_number')
-    return cube.extract(iris.Constraint(month_number=month))
+        add_time_coord(cube, 'month_number')
+    month_number = decode_time(cube.coord('time'))['month']
+    return _select_time(cube, month_number == month)
 
 
 def get_time_weights(cube):
@@ -169,19 +214,17 @@ def get_time_weights(cube):
     Returns
     -------
     numpy.array
-        Array of time weights for averaging.
+        Array of time weights for averaging, with length one along all
+        dimensions except time. Use
+        :func:`esmvalcore.preprocessor._shared.broadcast_weights` to
+        broadcast them to the shape of the cube.
     """
     time = cube.coord('time')
-    time_thickness = time.bounds[..., 1] - time.bounds[..., 0]
+    time_thickness = np.abs(time.bounds[..., 1] - time.bounds[..., 0])
 
     # The weights need to match the dimensionality of the cube.
-    slices = [None for i in cube.shape]
-    coord_dim = cube.coord_dims('time')[0]
-    slices[coord_dim] = slice(None)
-    time_thickness = np.abs(time_thickness[tuple(slices)])
-    ones = np.ones_like(cube.data)
-    time_weights = time_thickness * ones
-    return time_weights
+    return get_broadcastable(time_thickness, cube.coord_dims(time),
+                             cube.ndim)
 
 
 def daily_statistics(cube, operator='mean'):
@@ -205,12 +248,11 @@ def daily_statistics(cube, operator='mean'):
         Daily statistics cube
     """
     if not cube.coords('day_of_year'):
-        iris.coord_categorisation.add_day_of_year(cube, 'time')
+        add_time_coord(cube, 'day_of_year')
     if not cube.coords('year'):
-        iris.coord_categorisation.add_year(cube, 'time')
+        add_time_coord(cube, 'year')
 
-    operator = get_iris_analysis_operation(operator)
-    cube = cube.aggregated_by(['day_of_year', 'year'], operator)
+    cube = aggregate_by(cube, ['day_of_year', 'year'], [operator])[operator]
 
     cube.remove_coord('day_of_year')
     cube.remove_coord('year')
@@ -238,12 +280,11 @@ def monthly_statistics(cube, operator='mean'):
         Monthly statistics cube
     """
     if not cube.coords('month_number'):
-        iris.coord_categorisation.add_month_number(cube, 'time')
+        add_time_coord(cube, 'month_number')
     if not cube.coords('year'):
-        iris.coord_categorisation.add_year(cube, 'time')
+        add_time_coord(cube, 'year')
 
-    operator = get_iris_analysis_operation(operator)
-    cube = cube.aggregated_by(['month_number', 'year'], operator)
+    cube = aggregate_by(cube, ['month_number', 'year'], [operator])[operator]
     return cube
 
 
@@ -268,15 +309,12 @@ def seasonal_statistics(cube, operator='mean'):
         Seasonal statistic cube
     """
     if not cube.coords('clim_season'):
-        iris.coord_categorisation.add_season(cube, 'time', name='clim_season')
+        add_time_coord(cube, 'clim_season')
     if not cube.coords('season_year'):
-        iris.coord_categorisation.add_season_year(cube,
-                                                  'time',
-                                                  name='season_year')
-
-    operator = get_iris_analysis_operation(operator)
+        add_time_coord(cube, 'season_year')
 
-    cube = cube.aggregated_by(['clim_season', 'season_year'], operator)
+    cube = aggregate_by(cube, ['clim_season', 'season_year'],
+                        [operator])[operator]
 
     # CMOR Units are days so we are safe to operate on days
     # Ranging on [90, 92] days makes this calendar-independent
@@ -325,11 +363,9 @@ def annual_statistics(cube, operator='mean'):
     # TODO: Add weighting in time dimension. See iris issue 3290
     # https://github.com/SciTools/iris/issues/3290
 
-    operator = get_iris_analysis_operation(operator)
-
     if not cube.coords('year'):
-        iris.coord_categorisation.add_year(cube, 'time')
-    return cube.aggregated_by('year', operator)
+        add_time_coord(cube, 'year')
+    return aggregate_by(cube, 'year', [operator])[operator]
 
 
 def decadal_statistics(cube, operator='mean'):
@@ -357,19 +393,10 @@ def decadal_statistics(cube, operator='mean'):
     # TODO: Add weighting in time dimension. See iris issue 3290
     # https://github.com/SciTools/iris/issues/3290
 
-    operator = get_iris_analysis_operation(operator)
-
     if not cube.coords('decade'):
+        add_time_coord(cube, 'decade')
 
-        def get_decade(coord, value):
-            """Categorize time coordinate into decades."""
-            date = coord.units.num2date(value)
-            return date.year - date.year % 10
-
-        iris.coord_categorisation.add_categorised_coord(
-            cube, 'decade', 'time', get_decade)
-
-    return cube.aggregated_by('decade', operator)
+    return aggregate_by(cube, 'decade', [operator])[operator]
 
 
 def climate_statistics(cube, operator='mean', period='full'):
@@ -403,7 +430,7 @@ def climate_statistics(cube, operator='mean', period='full'):
     if period in ('full', ):
         operator_method = get_iris_analysis_operation(operator)
         if operator_accept_weights(operator):
-            time_weights = get_time_weights(cube)
+            time_weights = broadcast_weights(cube, get_time_weights(cube))
             cube = cube.collapsed('time',
                                   operator_method,
                                   weights=time_weights)
@@ -412,8 +439,7 @@ def climate_statistics(cube, operator='mean', period='full'):
         return cube
 
     clim_coord = _get_period_coord(cube, period)
-    operator = get_iris_analysis_operation(operator)
-    clim_cube = cube.aggregated_by(clim_coord, operator)
+    clim_cube = aggregate_by(cube, clim_coord, [operator])[operator]
     clim_cube.remove_coord('time')
     if clim_cube.coord(clim_coord.name()).is_monotonic():
         iris.util.promote_aux_coord_to_dim_coord(clim_cube, clim_coord.name())
@@ -470,43 +496,93 @@ def anomalies(cube, period, reference=None, standardize=False):
             cube = cube / cube_stddev
         return cube
 
-    cube = _compute_anomalies(cube, reference, period)
+    cube = _apply_period_reference(cube, reference, period, np.subtract)
 
     # standardize the results if requested
     if standardize:
         cube_stddev = climate_statistics(cube,
                                          operator='std_dev',
                                          period=period)
-        tdim = cube.coord_dims('time')[0]
-        reps = cube.shape[tdim] / cube_stddev.shape[tdim]
-        if not reps % 1 == 0:
-            raise ValueError(
-                "Cannot safely apply preprocessor to this dataset, "
-                "since the full time period of this dataset is not "
-                f"a multiple of the period '{period}'"
-            )
-        cube.data = cube.core_data() / da.concatenate(
-            [cube_stddev.core_data() for _ in range(int(reps))], axis=tdim)
+        cube = _apply_period_reference(cube, cube_stddev, period, np.divide)
     return cube
 
 
-def _compute_anomalies(cube, reference, period):
+def _get_period_indices(cube_coord, ref_coord):
+    """Get the index of the period of each point in the reference."""
+    ref_points = ref_coord.points
+    sorter = np.argsort(ref_points)
+    indices = np.searchsorted(ref_points, cube_coord.points, sorter=sorter)
+    indices = sorter[np.clip(indices, 0, len(sorter) - 1)]
+    missing = ref_points[indices] != cube_coord.points
+    if missing.any():
+        points = ', '.join(
+            str(p) for p in np.unique(cube_coord.points[missing]))
+        raise ValueError(
+            f"Reference has no data for {cube_coord.name()} {points}")
+    return indices
+
+
+def _apply_period_values(data, reference, indices, function, axis):
+    """Apply `function` to a block of data and its reference values."""
+    slicer = (slice(None), ) * axis + (indices, )
+    return function(data, reference[slicer])
+
+
+def _apply_period_reference(cube, reference, period, function):
+    """Combine a cube with a reference for each period.
+
+    The reference values are gathered by the period of each time point and
+    combined with the data in a single blockwise operation, so the size of
+    the task graph does not depend on the number of time points.
+
+    Parameters
+    ----------
+    cube: iris.cube.Cube
+        Input cube.
+    reference: iris.cube.Cube
+        Reference with one value per period, e.g. a climatology computed
+        with :func:`climate_statistics`.
+    period: str
+        Period of the reference, see :func:`climate_statistics`.
+    function: callable
+        Function that combines the data and the reference, e.g.
+        :obj:`numpy.subtract`.
+
+    Returns
+    -------
+    iris.cube.Cube
+        Cube with the lazily combined data.
+    """
     cube_coord = _get_period_coord(cube, period)
     ref_coord = _get_period_coord(reference, period)
-
-    data = cube.core_data()
-    cube_time = cube.coord('time')
-    ref = {}
-    for ref_slice in reference.slices_over(ref_coord):
-        ref[ref_slice.coord(ref_coord).points[0]] = ref_slice.core_data()
-
-    cube_coord_dim = cube.coord_dims(cube_coord)[0]
-    slicer = [slice(None)] * len(data.shape)
-    new_data = []
-    for i in range(cube_time.shape[0]):
-        slicer[cube_coord_dim] = i
-        new_data.append(data[tuple(slicer)] - ref[cube_coord.points[i]])
-    data = da.stack(new_data, axis=cube_coord_dim)
+    indices = _get_period_indices(cube_coord, ref_coord)
+
+    axis = cube.coord_dims(cube_coord)[0]
+    data = da.asarray(cube.core_data())
+    ref_data = da.moveaxis(da.asarray(reference.core_data()),
+                           reference.coord_dims(ref_coord)[0], axis)
+    ref_data = ref_data.rechunk(
+        tuple(-1 if i == axis else c for i, c in enumerate(data.chunks)))
+    indices = da.from_array(indices, chunks=(data.chunks[axis], ))
+
+    out_ind = tuple(range(data.ndim))
+    ref_ind = tuple(data.ndim if i == axis else i for i in out_ind)
+    dtype = function(np.ones(1, dtype=data.dtype),
+                     np.ones(1, dtype=ref_data.dtype)).dtype
+    data = da.blockwise(
+        _apply_period_values,
+        out_ind,
+        data,
+        out_ind,
+        ref_data,
+        ref_ind,
+        indices,
+        (axis, ),
+        dtype=dtype,
+        concatenate=True,
+        function=function,
+        axis=axis,
+    )
     cube = cube.copy(data)
     cube.remove_coord(cube_coord)
     return cube
@@ -516,15 +592,15 @@ def _get_period_coord(cube, period):
     """Get periods."""
     if period in ['daily', 'day']:
         if not cube.coords('day_of_year'):
-            iris.coord_categorisation.add_day_of_year(cube, 'time')
+            add_time_coord(cube, 'day_of_year')
         return cube.coord('day_of_year')
     if period in ['monthly', 'month', 'mon']:
         if not cube.coords('month_number'):
-            iris.coord_categorisation.add_month_number(cube, 'time')
+            add_time_coord(cube, 'month_number')
         return cube.coord('month_number')
     if period in ['seasonal', 'season']:
         if not cube.coords('season_number'):
-            iris.coord_categorisation.add_season_number(cube, 'time')
+            add_time_coord(cube, 'season_number')
         return cube.coord('season_number')
     raise ValueError(f"Period '{period}' not supported")
 
@@ -551,40 +627,37 @@ def regrid_time(cube, frequency):
     -------
     iris.cube.Cube
         cube with converted time axis and units.
+
+    Raises
+    ------
+    ValueError
+        if the frequency is not supported
     """
     # standardize time points
-    time_c = [cell.point for cell in cube.coord('time').cells()]
+    time_coord = cube.coord('time')
+    fields = decode_time(time_coord)
+    year = fields['year']
+    month = fields['month']
+    day = fields['day']
+    hour = np.zeros_like(fields['hour'])
     if frequency == 'yr':
-        time_cells = [
-            datetime.datetime(t.year, 7, 1, 0, 0, 0) for t in time_c
-        ]
+        month = 7
+        day = 1
     elif frequency == 'mon':
-        time_cells = [
-            datetime.datetime(t.year, t.month, 15, 0, 0, 0) for t in time_c
-        ]
+        day = 15
     elif frequency == 'day':
-        time_cells = [
-            datetime.datetime(t.year, t.month, t.day, 0, 0, 0) for t in time_c
-        ]
+        pass
     elif frequency == '1hr':
-        time_cells = [
-            datetime.datetime(t.year, t.month, t.day, t.hour, 0, 0)
-            for t in time_c
-        ]
+        hour = fields['hour']
     elif frequency == '3hr':
-        time_cells = [
-            datetime.datetime(t.year, t.month, t.day, t.hour - t.hour % 3, 0,
-                              0) for t in time_c
-        ]
+        hour = fields['hour'] - fields['hour'] % 3
     elif frequency == '6hr':
-        time_cells = [
-            datetime.datetime(t.year, t.month, t.day, t.hour - t.hour % 6, 0,
-                              0) for t in time_c
-        ]
+        hour = fields['hour'] - fields['hour'] % 6
+    else:
+        raise ValueError(f"Frequency '{frequency}' not supported, choose "
+                         "from yr, mon, day, 1hr, 3hr or 6hr")
 
-    cube.coord('time').points = [
-        cube.coord('time').units.date2num(cl)
-        for cl in time_cells]
+    time_coord.points = encode_time(time_coord.units, year, month, day, hour)
 
     # uniformize bounds
     cube.coord('time').bounds = None
@@ -597,12 +670,8 @@ def regrid_time(cube, frequency):
             cube.remove_coord(auxcoord)
 
     # re-add the converted aux coords
-    iris.coord_categorisation.add_day_of_month(cube,
-                                               cube.coord('time'),
-                                               name='day_of_month')
-    iris.coord_categorisation.add_day_of_year(cube,
-                                              cube.coord('time'),
-                                              name='day_of_year')
+    add_time_coord(cube, 'day_of_month')
+    add_time_coord(cube, 'day_of_year')
 
     return cube
 
@@ -641,6 +710,148 @@ def low_pass_weights(window, cutoff):
     return weights[1:-1]
 
 
+def _get_filter_weights(filter_type, window, span):
+    """Get the weights of a Lanczos filter."""
+    supported_filters = ['lowpass', 'highpass', 'bandpass']
+    if filter_type not in supported_filters:
+        raise NotImplementedError(
+            "Filter type {} not implemented, \
+            please choose one of {}".format(filter_type,
+                                            ", ".join(supported_filters)))
+    if filter_type == 'bandpass':
+        if np.ndim(span) != 1 or len(span) != 2:
+            raise ValueError(
+                "A bandpass filter requires a span with the shortest and "
+                f"longest period to keep, got {span}")
+        short_span, long_span = sorted(span)
+        return (low_pass_weights(window, 1. / short_span) -
+                low_pass_weights(window, 1. / long_span))
+    if np.ndim(span) != 0:
+        raise ValueError(
+            f"A {filter_type} filter requires a single span, got {span}")
+    wgts = low_pass_weights(window, 1. / span)
+    if filter_type == 'highpass':
+        wgts = -wgts
+        wgts[len(wgts) // 2] += 1.
+    return wgts
+
+
+def _weighted_window_sum(data, weights, axis, normalize):
+    """Compute the weighted sum (or mean) over all complete windows.
+
+    The result is `len(weights) - 1` points shorter than `data` along
+    `axis`. Instead of creating a view of all windows, the data is
+    shifted by one point at a time, so only memory for the result is
+    needed.
+    """
+    size = data.shape[axis] - len(weights) + 1
+    dtype = np.result_type(data.dtype, weights.dtype)
+
+    def shift(array, start):
+        return array[(slice(None), ) * axis + (slice(start, start + size), )]
+
+    mask = np.ma.getmask(data)
+    masked = mask is not np.ma.nomask and mask.any()
+    values = np.ma.getdata(data)
+    if masked:
+        values = np.where(mask, 0, values)
+    result = np.zeros(shift(values, 0).shape, dtype=dtype)
+    for i, weight in enumerate(weights):
+        result += weight * shift(values, i)
+    if not masked:
+        return result / weights.sum() if normalize else result
+
+    valid = ~mask
+    count = np.zeros(result.shape, dtype=np.int64)
+    weight_sum = np.zeros(result.shape, dtype=dtype)
+    for i, weight in enumerate(weights):
+        count += shift(valid, i)
+        weight_sum += weight * shift(valid, i)
+    if normalize:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = result / weight_sum
+    return np.ma.masked_where(count == 0, result)
+
+
+def _get_filter_chunks(chunks, min_size):
+    """Merge chunks so every chunk contains at least `min_size` points."""
+    new_chunks = []
+    for chunk in chunks:
+        if new_chunks and new_chunks[-1] < min_size:
+            new_chunks[-1] += chunk
+        else:
+            new_chunks.append(chunk)
+    if len(new_chunks) > 1 and new_chunks[-1] < min_size:
+        new_chunks[-2] += new_chunks.pop()
+    return tuple(new_chunks)
+
+
+def _filter_data(data, weights, axis, normalize):
+    """Apply a filter with `weights` along `axis` of `data`.
+
+    Lazy data is filtered chunk by chunk, with each chunk extended by a
+    halo of half the filter length from its neighbours.
+    """
+    if not isinstance(data, da.Array):
+        return _weighted_window_sum(data, weights, axis, normalize)
+
+    depth = len(weights) // 2
+    chunks = _get_filter_chunks(data.chunks[axis], depth + 1)
+    data = data.rechunk({axis: chunks})
+    # Without a halo at the outer edges, the first and last chunk shrink
+    axis_chunks = list(chunks)
+    axis_chunks[0] -= depth
+    axis_chunks[-1] -= depth
+    out_chunks = list(data.chunks)
+    out_chunks[axis] = tuple(axis_chunks)
+    dtype = np.result_type(data.dtype, weights.dtype)
+    return da.map_overlap(
+        _weighted_window_sum,
+        data,
+        depth={axis: depth},
+        boundary='none',
+        trim=False,
+        chunks=tuple(out_chunks),
+        dtype=dtype,
+        meta=da.utils.meta_from_array(data, dtype=dtype),
+        weights=weights,
+        axis=axis,
+        normalize=normalize,
+    )
+
+
+def _get_filter_template(cube, dim, window):
+    """Get a cube with the coordinates of the filtered data.
+
+    The coordinates along `dim` describe the windows in the same way as
+    :meth:`iris.cube.Cube.rolling_window`.
+    """
+    dummy = da.broadcast_to(da.zeros((), dtype=cube.dtype), cube.shape)
+    template = cube.copy(dummy)
+    for ancillary_variable in template.ancillary_variables():
+        if dim in template.ancillary_variable_dims(ancillary_variable):
+            template.remove_ancillary_variable(ancillary_variable)
+    for cell_measure in template.cell_measures():
+        if dim in template.cell_measure_dims(cell_measure):
+            template.remove_cell_measure(cell_measure)
+    template = template[(slice(None), ) * dim +
+                        (slice(0, cube.shape[dim] - window + 1), )]
+
+    for coord in cube.coords(dimensions=dim):
+        bounds = iris.util.rolling_window(coord.points, window)
+        if np.issubdtype(bounds.dtype, np.str_):
+            points = np.apply_along_axis(lambda x: "|".join(x), -1, bounds)
+        else:
+            points = None
+        bounds = bounds[:, (0, -1)]
+        if points is None:
+            points = np.mean(bounds, axis=-1)
+        new_coord = template.coord(coord)
+        new_coord.points = points
+        new_coord.bounds = bounds
+    return template
+
+
 def timeseries_filter(cube, window, span,
                       filter_type='lowpass', filter_stats='sum'):
     """
@@ -650,9 +861,12 @@ def timeseries_filter(cube, window, span,
     <https://scitools.org.uk/iris/docs/latest/examples/General/
     SOI_filtering.html?highlight=running%20mean>`_
 
-    Apply each filter using the rolling_window method used with the weights
-    keyword argument. A weighted sum is required because the magnitude of
-    the weights are just as important as their relative sizes.
+    Apply each filter as a weighted sum over a rolling window. A weighted
+    sum is required because the magnitude of the weights are just as
+    important as their relative sizes. The result and its coordinates are
+    the same as those of :meth:`iris.cube.Cube.rolling_window` with the
+    filter weights, but lazy data is filtered chunk by chunk, so the
+    memory use does not grow with the length of the window.
 
     See also the `iris rolling window
     <https://scitools.org.uk/iris/docs/v2.0/iris/iris/
@@ -664,52 +878,66 @@ def timeseries_filter(cube, window, span,
         input cube.
     window: int
         The length of the filter window (in units of cube time coordinate).
-    span: int
+    span: int or list of int
         Number of months/days (depending on data frequency) on which
         weights should be computed e.g. 2-yearly: span = 24 (2 x 12 months).
-        Span should have same units as cube time coordinate.
+        Span should have same units as cube time coordinate. For the
+        'bandpass' filter, a list with the shortest and longest period to
+        keep.
     filter_type: str, optional
         Type of filter to be applied; default 'lowpass'.
-        Available types: 'lowpass'.
+        Available types: 'lowpass', 'highpass', 'bandpass'.
     filter_stats: str, optional
         Type of statistic to aggregate on the rolling window; default 'sum'.
-        Available operators: 'mean', 'median', 'std_dev', 'sum', 'min', 'max'
+        Available operators: 'sum', 'mean' (only for the 'lowpass' filter).
 
     Returns
     -------
     iris.cube.Cube
-        cube time-filtered using 'rolling_window'.
+        cube time-filtered using a rolling window.
 
     Raises
     ------
     iris.exceptions.CoordinateNotFoundError:
         Cube does not have time coordinate.
     NotImplementedError:
-        If filter_type is not implemented.
+        If filter_type or filter_stats is not implemented.
+    ValueError:
+        If the span does not match the filter type or the filter is longer
+        than the time series.
     """
     try:
-        cube.coord('time')
+        time_coord = cube.coord('time')
     except iris.exceptions.CoordinateNotFoundError:
         logger.error("Cube %s does not have time coordinate", cube)
         raise
 
     # Construct weights depending on frequency
-    # TODO implement more filters!
-    supported_filters = ['lowpass', ]
-    if filter_type in supported_filters:
-        if filter_type == 'lowpass':
-            wgts = low_pass_weights(window, 1. / span)
-    else:
+    wgts = _get_filter_weights(filter_type, window, span)
+
+    supported_stats = ['sum', 'mean'] if filter_type == 'lowpass' else ['sum']
+    if filter_stats not in supported_stats:
         raise NotImplementedError(
-            "Filter type {} not implemented, \
-            please choose one of {}".format(filter_type,
-                                            ", ".join(supported_filters)))
+            f"Filter statistic {filter_stats} not implemented for filter "
+            f"type {filter_type}, please choose one of "
+            f"{', '.join(supported_stats)}")
+
+    dim = cube.coord_dims(time_coord)[0]
+    if len(wgts) > cube.shape[dim]:
+        raise ValueError(
+            f"Filter with {len(wgts)} weights is longer than the time "
+            f"series with {cube.shape[dim]} points")
 
     # Apply filter
     aggregation_operator = get_iris_analysis_operation(filter_stats)
-    cube = cube.rolling_window('time',
-                               aggregation_operator,
-                               len(wgts),
-                               weights=wgts)
-
-    return cube
+    data = _filter_data(cube.core_data(),
+                        wgts,
+                        dim,
+                        normalize=filter_stats == 'mean')
+    result = _get_filter_template(cube, dim, len(wgts))
+    aggregation_operator.update_metadata(
+        result, [time_coord],
+        action=f"with a rolling window of length {len(wgts)} over",
+        weights=wgts)
+    return aggregation_operator.post_process(result, data, [time_coord],
+                                             weights=wgts)
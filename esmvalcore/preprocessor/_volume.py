@@ -4,12 +4,24 @@ Volume and z coordinate operations on data cubes.
 Allows for selecting data subsets using certain volume bounds;
 selecting depth or height regions; constructing volumetric averages;
 """
-from copy import deepcopy
-
+import hashlib
 import logging
+from collections import OrderedDict
 
+import dask.array as da
 import iris
 import numpy as np
+import scipy.spatial
+
+from ._shared import (
+    broadcast_weights,
+    get_area_weights,
+    get_broadcastable,
+    get_iris_analysis_operation,
+    is_broadcastable,
+    load_fx_cube,
+    operator_accept_weights,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -53,86 +65,13 @@ def extract_volume(cube, z_min, z_max):
     return cube.extract(z_constraint)
 
 
-def _create_cube_time(src_cube, data, times):
-    """
-    Generate a new cube with the volume averaged data.
-
-    The resultant cube is seeded with `src_cube` metadata and coordinates,
-    excluding any source coordinates that span the associated vertical
-    dimension. The `times` of interpolation are used along with the
-    associated source cube time coordinate metadata to add a new
-    time coordinate to the resultant cube.
-
-    Based on the _create_cube method from _regrid.py.
-
-    Parameters
-    ----------
-    src_cube : cube
-        The source cube that was vertically interpolated.
-    data : array
-        The payload resulting from interpolating the source cube
-        over the specified times.
-    times : array
-        The array of times.
-
-    Returns
-    -------
-    cube
-    .. note::
-        If there is only one level of interpolation, the resultant cube
-        will be collapsed over the associated vertical dimension, and a
-        scalar vertical coordinate will be added.
-    """
-    # Get the source cube vertical coordinate and associated dimension.
-    src_times = src_cube.coord('time')
-    t_dim, = src_cube.coord_dims(src_times)
-
-    if data.shape[t_dim] != len(times):
-        emsg = ('Mismatch between data and times for data dimension {!r}, '
-                'got data shape {!r} with times shape {!r}.')
-        raise ValueError(emsg.format(t_dim, data.shape, times.shape))
-
-    # Construct the resultant cube with the interpolated data
-    # and the source cube metadata.
-    kwargs = deepcopy(src_cube.metadata)._asdict()
-    result = iris.cube.Cube(data, **kwargs)
-
-    # Add the appropriate coordinates to the cube, excluding
-    # any coordinates that span the z-dimension of interpolation.
-    for coord in src_cube.dim_coords:
-        [dim] = src_cube.coord_dims(coord)
-        if dim != t_dim:
-            result.add_dim_coord(coord.copy(), dim)
-
-    for coord in src_cube.aux_coords:
-        dims = src_cube.coord_dims(coord)
-        if t_dim not in dims:
-            result.add_aux_coord(coord.copy(), dims)
-
-    for coord in src_cube.derived_coords:
-        dims = src_cube.coord_dims(coord)
-        if t_dim not in dims:
-            result.add_aux_coord(coord.copy(), dims)
-
-    # Construct the new vertical coordinate for the interpolated
-    # z-dimension, using the associated source coordinate metadata.
-    kwargs = deepcopy(src_times._as_defn())._asdict()
-
-    try:
-        coord = iris.coords.DimCoord(times, **kwargs)
-        result.add_dim_coord(coord, t_dim)
-    except ValueError:
-        coord = iris.coords.AuxCoord(times, **kwargs)
-        result.add_aux_coord(coord, t_dim)
-
-    return result
-
-
 def calculate_volume(cube):
     """
     Calculate volume from a cube.
 
     This function is used when the volume netcdf fx_variables can't be found.
+    The grid volume is returned with length one along the dimensions it
+    does not vary over, so it can be broadcast against the cube.
 
     Parameters
     ----------
@@ -141,27 +80,22 @@ def calculate_volume(cube):
 
     Returns
     -------
-    float
+    np.ndarray
         grid volume.
     """
     # ####
-    # Load depth field and figure out which dim is which.
+    # Load depth field and figure out which dims it spans.
     depth = cube.coord(axis='z')
-    z_dim = cube.coord_dims(cube.coord(axis='z'))[0]
+    z_dims = cube.coord_dims(depth)
 
     # ####
     # Load z direction thickness
-    thickness = depth.bounds[..., 1] - depth.bounds[..., 0]
+    thickness = np.abs(depth.bounds[..., 1] - depth.bounds[..., 0])
+    thickness = get_broadcastable(thickness, z_dims, cube.ndim)
 
     # ####
     # Calculate grid volume:
-    area = iris.analysis.cartography.area_weights(cube)
-    if thickness.ndim == 1 and z_dim == 1:
-        grid_volume = area * thickness[None, :, None, None]
-    if thickness.ndim == 4 and z_dim == 1:
-        grid_volume = area * thickness[:, :]
-
-    return grid_volume
+    return get_area_weights(cube) * thickness
 
 
 def volume_statistics(
@@ -175,12 +109,18 @@ def volume_statistics(
     is calculated from iris's cartography tool multiplied by the cell
     thickness.
 
+    The statistic is computed in a single (lazy) reduction over the `z`,
+    latitude and longitude dimensions, with the grid volume broadcast
+    against the cube instead of copied along the time dimension.
+
     Parameters
     ----------
         cube: iris.cube.Cube
             Input cube.
         operator: str
-            The operation to apply to the cube, options are: 'mean'.
+            The operation to apply to the cube, options are: mean, median,
+            min, max, std_dev, sum, variance. Only mean and sum are volume
+            weighted.
         fx_variables: dict
             dictionary of field:filename for the fx_variables
 
@@ -195,94 +135,36 @@ def volume_statistics(
         if input cube shape differs from grid volume cube shape.
     """
     # TODO: Test sigma coordinates.
-    # TODO: Add other operations.
+    operation = get_iris_analysis_operation(operator)
+    coords = [cube.coord(axis='z'), 'longitude', 'latitude']
 
-    # ####
-    # Load z coordinate field and figure out which dim is which.
-    t_dim = cube.coord_dims('time')[0]
+    if not operator_accept_weights(operator):
+        return cube.collapsed(coords, operation)
 
-    grid_volume_found = False
     grid_volume = None
     if fx_variables:
         for key, fx_file in fx_variables.items():
             if fx_file is None:
                 continue
             logger.info('Attempting to load %s from file: %s', key, fx_file)
-            fx_cube = iris.load_cube(fx_file)
+            fx_cube = load_fx_cube(fx_file)
 
-            grid_volume = fx_cube.data
-            grid_volume_found = True
-            cube_shape = cube.data.shape
+            grid_volume = fx_cube.core_data()
 
-    if not grid_volume_found:
+    if grid_volume is None:
         grid_volume = calculate_volume(cube)
 
-    # Check whether the dimensions are right.
-    if cube.data.ndim == 4 and grid_volume.ndim == 3:
-        grid_volume = np.tile(grid_volume,
-                              [cube_shape[0], 1, 1, 1])
-
-    if cube.data.shape != grid_volume.shape:
+    # Check whether the dimensions are right, a grid volume without the
+    # time dimension applies to all time steps.
+    if grid_volume.ndim < cube.ndim:
+        grid_volume = grid_volume.reshape(
+            (1, ) * (cube.ndim - grid_volume.ndim) + grid_volume.shape)
+    if not is_broadcastable(grid_volume, cube.shape):
         raise ValueError('Cube shape ({}) doesn`t match grid volume shape '
-                         '({})'.format(cube.data.shape, grid_volume.shape))
-
-    # #####
-    # Calculate global volume weighted average
-    result = []
-    # #####
-    # iterate over time and z-coordinate dimensions.
-    for time_itr in range(cube.shape[t_dim]):
-        # ####
-        # create empty output arrays
-        column = []
-        depth_volume = []
-
-        # ####
-        # iterate over time and z-coordinate dimensions.
-        for z_itr in range(cube.shape[1]):
-            # ####
-            # Calculate weighted mean for this time and layer
-            if operator == 'mean':
-                total = cube[time_itr, z_itr].collapsed(
-                    [cube.coord(axis='z'),
-                     'longitude', 'latitude'],
-                    iris.analysis.MEAN,
-                    weights=grid_volume[time_itr, z_itr]).data
-            else:
-                raise ValueError('Volume operator ({}) not '
-                                 'recognised.'.format(operator))
-            column.append(total)
-
-            try:
-                layer_vol = np.ma.masked_where(
-                    cube[time_itr, z_itr].data.mask,
-                    grid_volume[time_itr, z_itr]).sum()
-
-            except AttributeError:
-                # ####
-                # No mask in the cube data.
-                layer_vol = grid_volume.sum()
-            depth_volume.append(layer_vol)
-        # ####
-        # Calculate weighted mean over the water volumn
-        column = np.ma.array(column)
-        depth_volume = np.ma.array(depth_volume)
-        result.append(np.ma.average(column, weights=depth_volume))
+                         '({})'.format(cube.shape, grid_volume.shape))
 
-    # ####
-    # Send time series and dummy cube to cube creating tool.
-    times = np.array(cube.coord('time').points.astype(float))
-    result = np.ma.array(result)
-
-    # #####
-    # Create a small dummy output array for the output cube
-    if operator == 'mean':
-        src_cube = cube[:2, :2].collapsed([cube.coord(axis='z'),
-                                           'longitude', 'latitude'],
-                                          iris.analysis.MEAN,
-                                          weights=grid_volume[:2, :2], )
-
-    return _create_cube_time(src_cube, result, times)
+    weights = broadcast_weights(cube, grid_volume)
+    return cube.collapsed(coords, operation, weights=weights)
 
 
 def depth_integration(cube):
@@ -308,14 +190,10 @@ def depth_integration(cube):
     thickness = depth.bounds[..., 1] - depth.bounds[..., 0]
 
     if depth.ndim == 1:
-        slices = [None for i in cube.shape]
-        coord_dim = cube.coord_dims(cube.coord(axis='z'))[0]
-        slices[coord_dim] = slice(None)
-        thickness = np.abs(thickness[tuple(slices)])
-
-    ones = np.ones_like(cube.data)
-
-    weights = thickness * ones
+        thickness = np.abs(thickness)
+    thickness = get_broadcastable(thickness, cube.coord_dims(depth),
+                                  cube.ndim)
+    weights = broadcast_weights(cube, thickness)
 
     result = cube.collapsed(cube.coord(axis='z'), iris.analysis.SUM,
                             weights=weights)
@@ -327,6 +205,156 @@ def depth_integration(cube):
     return result
 
 
+def _get_horizontal_grid(cube):
+    """Get the horizontal dimensions and the 2D latitudes and longitudes."""
+    lats = cube.coord('latitude')
+    lons = cube.coord('longitude')
+    if lats.ndim == 1:
+        lat_dim, = cube.coord_dims(lats)
+        lon_dim, = cube.coord_dims(lons)
+        grid_lats, grid_lons = np.meshgrid(lats.points,
+                                           lons.points,
+                                           indexing='ij')
+        if lon_dim < lat_dim:
+            grid_lats, grid_lons = grid_lats.T, grid_lons.T
+        dims = tuple(sorted((lat_dim, lon_dim)))
+        return dims, grid_lats, grid_lons
+
+    dims = cube.coord_dims(lats)
+    if cube.coord_dims(lons) != dims:
+        raise ValueError('Latitude and longitude coordinates of the cube do '
+                         'not span the same dimensions')
+    order = np.argsort(dims)
+    return (tuple(sorted(dims)), np.transpose(lats.points, order),
+            np.transpose(lons.points, order))
+
+
+def _to_cartesian(latitudes, longitudes):
+    """Convert latitudes and longitudes to points on the unit sphere."""
+    lats = np.deg2rad(latitudes)
+    lons = np.deg2rad(longitudes)
+    x_coords = np.cos(lats) * np.cos(lons)
+    y_coords = np.cos(lats) * np.sin(lons)
+    z_coords = np.sin(lats)
+    return np.stack([x_coords, y_coords, z_coords], axis=-1)
+
+
+class _SpatialIndexCache:
+    """Least recently used cache of spatial indices of horizontal grids.
+
+    Building the spatial index of a large curvilinear grid takes much
+    longer than querying it, so the index is kept for grids that are
+    sampled again, e.g. for the next dataset or variable on the same
+    ocean grid.
+    """
+
+    def __init__(self, max_size=4):
+        self.max_size = max_size
+        self._trees = OrderedDict()
+
+    def get(self, grid_lats, grid_lons):
+        """Get the spatial index of the grid."""
+        hasher = hashlib.sha256()
+        for array in (grid_lats, grid_lons):
+            array = np.ascontiguousarray(array, dtype=np.float64)
+            hasher.update(repr(array.shape).encode('utf-8'))
+            hasher.update(array.tobytes())
+        key = hasher.hexdigest()
+        if key in self._trees:
+            self._trees.move_to_end(key)
+        else:
+            points = _to_cartesian(grid_lats, grid_lons).reshape(-1, 3)
+            self._trees[key] = scipy.spatial.cKDTree(points)
+            while len(self._trees) > self.max_size:
+                self._trees.popitem(last=False)
+        return self._trees[key]
+
+
+SPATIAL_INDEX_CACHE = _SpatialIndexCache()
+"""Cache of the spatial indices used by the trajectory sampler."""
+
+TRAJECTORY_SCHEMES = {
+    'nearest': 1,
+    'inverse_distance': 4,
+}
+"""Available sampling schemes and their number of neighbours."""
+
+
+def _weighted_average(values, weights):
+    """Average the neighbours along the last axis of a masked array."""
+    weights = np.broadcast_to(weights, values.shape)
+    return np.ma.average(values, axis=-1, weights=weights)
+
+
+def _sample_trajectory(cube, latitudes, longitudes, scheme='nearest'):
+    """Sample a cube at points using a spatial index of its grid.
+
+    The horizontal dimensions of the cube are replaced by a single
+    dimension along the requested points. All other dimensions are sampled
+    at once with a single gather of the neighbouring grid cells.
+    """
+    if scheme not in TRAJECTORY_SCHEMES:
+        raise ValueError("Unknown trajectory scheme '{}', choose from {}"
+                         "".format(scheme, ', '.join(TRAJECTORY_SCHEMES)))
+    neighbours = TRAJECTORY_SCHEMES[scheme]
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+
+    dims, grid_lats, grid_lons = _get_horizontal_grid(cube)
+    tree = SPATIAL_INDEX_CACHE.get(grid_lats, grid_lons)
+    distances, indices = tree.query(_to_cartesian(latitudes, longitudes),
+                                    k=neighbours)
+
+    # Move the horizontal dimensions to the end and flatten them.
+    other_dims = [dim for dim in range(cube.ndim) if dim not in dims]
+    data = cube.core_data().transpose(other_dims + list(dims))
+    shape = data.shape[:len(other_dims)]
+    if cube.has_lazy_data():
+        data = data.rechunk({len(other_dims): -1, len(other_dims) + 1: -1})
+    data = data.reshape(shape + (-1, ))
+
+    if neighbours == 1:
+        data = data[..., indices]
+    else:
+        data = data[..., indices.ravel()]
+        data = data.reshape(shape + indices.shape)
+        # Use the exact value where a point coincides with a grid cell.
+        with np.errstate(divide='ignore'):
+            weights = 1. / distances**2
+        exact = np.isinf(weights)
+        weights[exact.any(axis=-1)] = exact[exact.any(axis=-1)]
+        if cube.has_lazy_data():
+            data = data.rechunk({-1: -1})
+            data = da.map_blocks(_weighted_average,
+                                 data,
+                                 weights=weights,
+                                 drop_axis=data.ndim - 1,
+                                 dtype=np.result_type(data.dtype, weights))
+        else:
+            data = _weighted_average(data, weights)
+
+    # Construct the resulting cube with the metadata of the source cube.
+    result = iris.cube.Cube(data, **cube.metadata._asdict())
+    for coord in cube.dim_coords:
+        dim, = cube.coord_dims(coord)
+        if dim not in dims:
+            result.add_dim_coord(coord.copy(), other_dims.index(dim))
+    for coord in cube.aux_coords:
+        coord_dims = cube.coord_dims(coord)
+        if not set(coord_dims) & set(dims):
+            result.add_aux_coord(
+                coord.copy(), tuple(other_dims.index(d) for d in coord_dims))
+    for name, points in (('latitude', latitudes), ('longitude', longitudes)):
+        coord = cube.coord(name)
+        result.add_aux_coord(
+            iris.coords.AuxCoord(points,
+                                 standard_name=coord.standard_name,
+                                 long_name=coord.long_name,
+                                 var_name=coord.var_name,
+                                 units=coord.units), len(other_dims))
+    return result
+
+
 def extract_transect(cube, latitude=None, longitude=None):
     """
     Extract data along a line of constant latitude or longitude.
@@ -345,10 +373,10 @@ def extract_transect(cube, latitude=None, longitude=None):
     Also, `'extract_transect(cube, longitude=-28, latitude=[-50, 50])'` will
     produce a transect along 28 West  between 50 south and 50 North.
 
-    This function is not yet implemented for irregular arrays - instead
-    try the extract_trajectory function, but note that it is currently
-    very slow. Alternatively, use the regrid preprocessor to regrid along
-    a regular grid and then extract the transect.
+    On irregular grids, i.e. grids with two dimensional latitude and
+    longitude coordinates, the transect is sampled at the grid cells
+    nearest to points along the line, with as many points as the grid has
+    cells along the corresponding dimension.
 
     Parameters
     ----------
@@ -366,8 +394,6 @@ def extract_transect(cube, latitude=None, longitude=None):
 
     Raises
     ------
-    ValueError
-        slice extraction not implemented for irregular grids.
     ValueError
         latitude and longitude are both floats or lists; not allowed
         to slice on both axes at the same time.
@@ -378,11 +404,6 @@ def extract_transect(cube, latitude=None, longitude=None):
     lats = cube.coord('latitude')
     lons = cube.coord('longitude')
 
-    if lats.ndim == 2:
-        raise ValueError(
-            'extract_transect: Not implemented for irregular arrays!'
-            + '\nTry regridding the data first.')
-
     if isinstance(latitude, float) and isinstance(longitude, float):
         raise ValueError(
             "extract_transect: Can't slice along lat and lon at the same time"
@@ -393,6 +414,9 @@ def extract_transect(cube, latitude=None, longitude=None):
             "extract_transect: Can't reduce lat and lon at the same time"
         )
 
+    if lats.ndim == 2:
+        return _extract_irregular_transect(cube, latitude, longitude)
+
     for dim_name, dim_cut, coord in zip(['latitude', 'longitude'],
                                         [latitude, longitude], [lats, lons]):
         # ####
@@ -418,15 +442,44 @@ def extract_transect(cube, latitude=None, longitude=None):
     return cube[tuple(slices)]
 
 
-def extract_trajectory(cube, latitudes, longitudes, number_points=2):
+def _extract_irregular_transect(cube, latitude, longitude):
+    """Extract a transect from a cube with 2D latitude and longitude."""
+    dims, grid_lats, grid_lons = _get_horizontal_grid(cube)
+    if isinstance(latitude, float):
+        number_points = grid_lats.shape[1]
+        if isinstance(longitude, list):
+            start, end = longitude
+        else:
+            start, end = np.min(grid_lons), np.max(grid_lons)
+        longitudes = np.linspace(start, end, num=number_points)
+        latitudes = np.full_like(longitudes, latitude)
+    elif isinstance(longitude, float):
+        number_points = grid_lats.shape[0]
+        if isinstance(latitude, list):
+            start, end = latitude
+        else:
+            start, end = np.min(grid_lats), np.max(grid_lats)
+        latitudes = np.linspace(start, end, num=number_points)
+        longitudes = np.full_like(latitudes, longitude)
+    else:
+        raise ValueError(
+            "extract_transect: Either latitude or longitude needs to be a "
+            "float")
+    return _sample_trajectory(cube, latitudes, longitudes)
+
+
+def extract_trajectory(cube, latitudes, longitudes, number_points=2,
+                       scheme=None):
     """
     Extract data along a trajectory.
 
     latitudes and longitudes are the pairs of coordinates for two points.
     number_points is the number of points between the two points.
 
-    This version uses the expensive interpolate method, but it may be
-    necceasiry for irregular grids.
+    On regular grids, the data is linearly interpolated to the trajectory
+    by default. On irregular grids, and on regular grids if a `scheme`
+    is given, the data is sampled using a spatial index of the grid, which
+    is built once per grid and then reused.
 
     If only two latitude and longitude coordinates are given,
     extract_trajectory will produce a cube will extrapolate along a line
@@ -447,6 +500,11 @@ def extract_trajectory(cube, latitudes, longitudes, number_points=2):
         list of longitude coordinates (floats).
     number_points: int
         number of points to extrapolate (optional).
+    scheme: str, optional
+        sampling scheme, either 'nearest' to take the nearest grid cell or
+        'inverse_distance' to take the inverse distance weighted average of
+        the four nearest grid cells. Defaults to 'nearest' on irregular
+        grids.
 
     Returns
     -------
@@ -466,12 +524,12 @@ def extract_trajectory(cube, latitudes, longitudes, number_points=2):
         )
 
     if len(latitudes) == len(longitudes) == 2:
-        minlat, maxlat = np.min(latitudes), np.max(latitudes)
-        minlon, maxlon = np.min(longitudes), np.max(longitudes)
+        latitudes = np.linspace(*latitudes, num=number_points)
+        longitudes = np.linspace(*longitudes, num=number_points)
 
-        longitudes = np.linspace(minlat, maxlat, num=number_points)
-        latitudes = np.linspace(minlon, maxlon, num=number_points)
+    if scheme is None and cube.coord('latitude').ndim == 1:
+        points = [('latitude', latitudes), ('longitude', longitudes)]
+        return interpolate(cube, points)
 
-    points = [('latitude', latitudes), ('longitude', longitudes)]
-    interpolated_cube = interpolate(cube, points)  # Very slow!
-    return interpolated_cube
+    return _sample_trajectory(cube, latitudes, longitudes,
+                              scheme=scheme or 'nearest')
@@ -2,7 +2,7 @@
 
 import logging
 
-import iris
+from ._shared import load_fx_cube
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +18,7 @@ def _get_land_fraction(cube, fx_variables):
         if not fx_path:
             errors.append(f"File for '{fx_var}' not found.")
             continue
-        fx_cube = iris.load_cube(fx_path)
+        fx_cube = load_fx_cube(fx_path)
         if not _shape_is_broadcastable(fx_cube.shape, cube.shape):
             errors.append(
                 f"Cube '{fx_var}' with shape {fx_cube.shape} not "
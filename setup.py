@@ -39,6 +39,7 @@ REQUIREMENTS = {
         'prov[dot]',
         'psutil',
         'pyyaml',
+        'scipy',
         'scitools-iris>=2.2',
         'shapely[vectorized]',
         'stratify',
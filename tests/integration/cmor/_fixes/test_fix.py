@@ -2,6 +2,7 @@ import os
 import shutil
 import tempfile
 import unittest
+from unittest import mock
 
 import pytest
 from iris.cube import Cube
@@ -38,6 +39,14 @@ class TestFix(unittest.TestCase):
         self.assertListEqual(
             Fix.get_fixes('CMIP5', 'CESM1-BGC', 'Amon', 'gpp'), [Gpp(None)])
 
+    def test_get_fixes_memoized(self):
+        from esmvalcore.cmor._fixes.cmip5.canesm2 import FgCo2
+        Fix.get_fixes('CMIP5', 'CanESM2', 'Amon', 'fgco2')
+        with mock.patch('importlib.import_module') as import_module:
+            fixes = Fix.get_fixes('CMIP5', 'CanESM2', 'Omon', 'fgco2')
+            import_module.assert_not_called()
+        self.assertListEqual(fixes, [FgCo2(None)])
+
     def test_get_fix_no_project(self):
         with pytest.raises(KeyError):
             Fix.get_fixes('BAD_PROJECT', 'BNU-ESM', 'Amon', 'ch4')
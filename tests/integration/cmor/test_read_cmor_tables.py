@@ -1,7 +1,15 @@
+import os
+import pickle
 from pathlib import Path
 
 from esmvalcore._config import read_config_developer_file
-from esmvalcore.cmor.table import CMOR_TABLES
+from esmvalcore.cmor.table import (
+    CMIP5Info,
+    CMIP6Info,
+    CMOR_TABLES,
+    _load_cmor_info,
+    _prune_cache,
+)
 from esmvalcore.cmor.table import __file__ as root
 from esmvalcore.cmor.table import read_cmor_tables
 
@@ -33,3 +41,65 @@ def test_read_cmor_tables():
     table = CMOR_TABLES[project]
     assert Path(table._cmor_folder) == table_path / 'obs4mips' / 'Tables'
     assert table.strict is False
+
+
+def test_read_cmor_tables_compiled(tmp_path, monkeypatch):
+    """Test that the compiled tables are used when reading them again."""
+    cfg_developer = read_config_developer_file()
+    read_cmor_tables(cfg_developer, cache_dir=str(tmp_path))
+    assert list((tmp_path / 'cmor_tables').glob('*.pickle'))
+    expected = CMOR_TABLES['CMIP6'].get_variable('Amon', 'tas')
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("CMOR tables should not be parsed")
+
+    monkeypatch.setattr(CMIP6Info, '_load_table', _fail)
+    read_cmor_tables(cfg_developer, cache_dir=str(tmp_path))
+    var_info = CMOR_TABLES['CMIP6'].get_variable('Amon', 'tas')
+    assert var_info.units == expected.units
+    assert var_info.dimensions == expected.dimensions
+    assert CMOR_TABLES['CMIP6'].default is CMOR_TABLES['custom']
+
+
+def test_compiled_tables_invalidated(tmp_path):
+    """Test that the compiled tables are updated when a table changes."""
+    tables_dir = tmp_path / 'cmip5' / 'Tables'
+    tables_dir.mkdir(parents=True)
+    table_file = Path(root).parent / 'tables' / 'cmip5' / 'Tables' / 'CMIP5_fx'
+    text = table_file.read_text()
+    (tables_dir / 'CMIP5_fx').write_text(text)
+    cache_dir = str(tmp_path / 'cache')
+
+    table = _load_cmor_info(CMIP5Info, str(tmp_path / 'cmip5'), cache_dir)
+    assert table.get_variable('fx', 'sftlf').units == '%'
+
+    (tables_dir / 'CMIP5_fx').write_text(
+        text.replace('units:             %', 'units:             1'))
+    table = _load_cmor_info(CMIP5Info, str(tmp_path / 'cmip5'), cache_dir)
+    assert table.get_variable('fx', 'sftlf').units == '1'
+    assert len(list((tmp_path / 'cache' / 'cmor_tables').iterdir())) == 2
+
+
+def test_read_cmor_tables_no_cache(tmp_path, monkeypatch):
+    """Test that nothing is written to disk without a cache directory."""
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("CMOR tables should not be pickled")
+
+    monkeypatch.setattr(pickle, 'dump', _fail)
+    read_cmor_tables(read_config_developer_file())
+    assert CMOR_TABLES['CMIP6'].get_variable('Amon', 'tas') is not None
+    assert not list(tmp_path.iterdir())
+
+
+def test_compiled_tables_pruned(tmp_path):
+    """Test that the least recently used compiled tables are removed."""
+    for i, name in enumerate(['keep', 'old', 'new']):
+        (tmp_path / f'{name}.pickle').write_bytes(b'x' * 100)
+        os.utime(tmp_path / f'{name}.pickle', (i, i))
+
+    _prune_cache(str(tmp_path), str(tmp_path / 'keep.pickle'), max_bytes=250)
+
+    remaining = sorted(path.name for path in tmp_path.iterdir())
+    assert remaining == ['keep.pickle', 'new.pickle']
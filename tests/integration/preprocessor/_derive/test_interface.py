@@ -1,7 +1,13 @@
+import sys
+
+import pytest
 from iris.cube import Cube, CubeList
 
 from esmvalcore.preprocessor import derive
-from esmvalcore.preprocessor._derive import get_required
+from esmvalcore.preprocessor._derive import (
+    _get_all_derived_variables,
+    get_required,
+)
 from esmvalcore.preprocessor._derive.ohc import DerivedVariable
 
 
@@ -21,6 +27,27 @@ def test_get_required():
     assert variables == reference
 
 
+def test_get_all_derived_variables_lazy(monkeypatch):
+    monkeypatch.delitem(sys.modules, 'esmvalcore.preprocessor._derive.alb',
+                        raising=False)
+    derived_variables = _get_all_derived_variables()
+    assert 'alb' in derived_variables
+    assert 'ohc' in list(derived_variables)
+    assert 'esmvalcore.preprocessor._derive.alb' not in sys.modules
+
+    deriver = derived_variables['alb']
+    assert 'esmvalcore.preprocessor._derive.alb' in sys.modules
+    assert deriver.__module__ == 'esmvalcore.preprocessor._derive.alb'
+    assert 'shared' not in derived_variables
+    with pytest.raises(KeyError):
+        derived_variables['not_a_variable']
+
+
+def test_get_required_not_implemented():
+    with pytest.raises(NotImplementedError):
+        get_required('not_a_variable', 'CMIP5')
+
+
 def test_get_required_with_fx():
 
     variables = get_required('ohc', 'CMIP5')
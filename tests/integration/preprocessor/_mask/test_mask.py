@@ -10,8 +10,10 @@ import iris
 import numpy as np
 import pytest
 
+import esmvalcore.preprocessor._mask
 from esmvalcore.preprocessor import (PreprocessorFile, mask_fillvalues,
                                      mask_landsea, mask_landseaice)
+from esmvalcore.preprocessor._shapes import MASK_CACHE
 from tests import assert_array_equal
 
 
@@ -156,6 +158,28 @@ class Test:
         expected.mask = np.ones((3, 3), bool)
         assert_array_equal(result_sea.data, expected)
 
+    def test_mask_landsea_cached(self, tmp_path, monkeypatch):
+        """Test that the Natural Earth mask is computed once per grid."""
+        masks_dir = str(tmp_path / 'masks')
+        MASK_CACHE.clear()
+        cube = iris.cube.Cube(self.new_cube_data,
+                              dim_coords_and_dims=self.coords_spec)
+        expected = mask_landsea(cube, {}, 'sea', masks_dir=masks_dir)
+        assert len(list((tmp_path / 'masks').glob('*.npy'))) == 1
+
+        def _fail(*args, **kwargs):
+            raise AssertionError("Mask should not be computed again")
+
+        monkeypatch.setattr(esmvalcore.preprocessor._mask, 'contains', _fail)
+        MASK_CACHE.clear()
+        cube = iris.cube.Cube(np.ma.array(self.mock_data),
+                              dim_coords_and_dims=[(self.times, 0),
+                                                   (self.lats, 1),
+                                                   (self.lons, 2)])
+        result = mask_landsea(cube, {}, 'sea', masks_dir=masks_dir)
+        for i in range(result.shape[0]):
+            assert_array_equal(result.data.mask[i], expected.data.mask)
+
     def test_mask_landseaice(self, tmp_path):
         """Test mask_landseaice func."""
         sftgif_file = str(tmp_path / 'sftgif_mask.nc')
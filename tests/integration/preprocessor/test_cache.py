@@ -0,0 +1,116 @@
+"""Integration tests for the cache of preprocessed files."""
+import os
+
+import iris
+import numpy as np
+import pytest
+from iris.cube import Cube
+
+import esmvalcore.preprocessor
+from esmvalcore._provenance import TrackedFile, get_recipe_provenance
+from esmvalcore.preprocessor import PreprocessingTask, PreprocessorFile
+from esmvalcore.preprocessor._cache import ProductCache, get_cache_key
+
+
+def _create_input_file(path, value=1.):
+    cube = Cube(np.full((2, 3), value, dtype=np.float32),
+                var_name='tas',
+                units='K')
+    filename = str(path / 'tas.nc')
+    iris.save(cube, filename)
+    return filename
+
+
+def _create_task(input_file, output_dir, cache, units='degC'):
+    ancestor = TrackedFile(input_file, {'filename': input_file})
+    product = PreprocessorFile(
+        attributes={'filename': str(output_dir / 'tas.nc')},
+        settings={'convert_units': {'units': units}},
+        ancestors=[ancestor],
+    )
+    task = PreprocessingTask([product], name='diag/tas', cache=cache)
+    task.initialize_provenance(get_recipe_provenance({}, 'recipe_test.yml'))
+    return task
+
+
+def test_get_cache_key_ignores_output_location():
+    settings = {'regrid': {'target_grid': '1x1', 'scheme': 'linear'}}
+    key = get_cache_key(
+        dict(settings, save={'filename': '/run1/tas.nc'}), ['a'], ['regrid'])
+    assert key == get_cache_key(
+        dict(settings, save={'filename': '/run2/tas.nc'}), ['a'], ['regrid'])
+    assert key != get_cache_key(settings, ['b'], ['regrid'])
+    other = {'regrid': {'target_grid': '2x2', 'scheme': 'linear'}}
+    assert key != get_cache_key(other, ['a'], ['regrid'])
+
+
+def test_get_cache_key_independent_of_cwd(tmp_path, monkeypatch):
+    """Check that settings are not mistaken for files in cwd."""
+    settings = {
+        'regrid': {'target_grid': '1x1', 'scheme': 'linear'},
+        'area_statistics': {'operator': 'mean'},
+    }
+    order = ['regrid', 'area_statistics']
+    key = get_cache_key(settings, ['a'], order)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'linear').write_text('')
+    (tmp_path / 'mean').write_text('')
+    assert key == get_cache_key(settings, ['a'], order)
+
+
+def test_get_cache_key_shapefile(tmp_path):
+    """Check that the key changes if any file of a shapefile changes."""
+    shapefile = tmp_path / 'shape.shp'
+    shapefile.write_text('shp')
+    (tmp_path / 'shape.dbf').write_text('dbf')
+    settings = {'extract_shape': {'shapefile': str(shapefile)}}
+    key = get_cache_key(settings, ['a'], ['extract_shape'])
+    (tmp_path / 'shape.dbf').write_text('other dbf')
+    assert key != get_cache_key(settings, ['a'], ['extract_shape'])
+
+
+def test_preprocessing_task_cache(tmp_path, monkeypatch):
+    """Check that a second run reuses the file preprocessed in the first."""
+    input_file = _create_input_file(tmp_path)
+    cache = ProductCache(str(tmp_path / 'cache'))
+
+    task = _create_task(input_file, tmp_path / 'run1', cache)
+    task.run()
+    product = next(iter(task.products))
+    assert product.cache_key in cache
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("Preprocessor should not run")
+
+    monkeypatch.setattr(esmvalcore.preprocessor, 'preprocess', _fail)
+    task = _create_task(input_file, tmp_path / 'run2', cache)
+    task.run()
+    product = next(iter(task.products))
+    assert product.provenance is not None
+    cube = iris.load_cube(product.filename)
+    assert cube.units == 'degC'
+    np.testing.assert_allclose(cube.data, -272.15)
+
+    # Different settings should not use the cached file.
+    task = _create_task(input_file, tmp_path / 'run3', cache, units='degF')
+    with pytest.raises(AssertionError):
+        task.run()
+
+
+def test_preprocessing_task_cache_input_changed(tmp_path):
+    input_file = _create_input_file(tmp_path)
+    cache = ProductCache(str(tmp_path / 'cache'))
+    task = _create_task(input_file, tmp_path / 'run1', cache)
+    key = next(iter(task.products)).cache_key
+
+    stat = os.stat(input_file)
+    os.utime(input_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    task = _create_task(input_file, tmp_path / 'run2', cache)
+    assert next(iter(task.products)).cache_key != key
+
+
+def test_preprocessing_task_cache_missing_input(tmp_path):
+    input_file = str(tmp_path / 'missing.nc')
+    cache = ProductCache(str(tmp_path / 'cache'))
+    task = _create_task(input_file, tmp_path / 'run1', cache)
+    assert next(iter(task.products)).cache_key is None
@@ -5,7 +5,8 @@ from prov.model import ProvDocument
 
 import esmvalcore
 from esmvalcore._citation import (CMIP6_URL_STEM, ESMVALTOOL_PAPER,
-                                  _write_citation_files)
+                                  CitationCache, _write_citation_files,
+                                  get_cmip6_url_prefix)
 from esmvalcore._provenance import ESMVALTOOL_URI_PREFIX
 
 
@@ -116,3 +117,40 @@ def test_cmip6_data_citation_url(tmp_path):
         '',
     ])
     assert citation_url.read_text() == text
+
+
+def test_citation_cache(tmp_path, monkeypatch):
+    """Test4: CMIP6 citations are stored on disk and reused offline."""
+    urls = []
+
+    def get_response(url):
+        urls.append(url)
+        return mock_get_response(url)
+
+    monkeypatch.setattr(esmvalcore._citation, '_get_response', get_response)
+    url_prefixes = ['CMIP6.CMIP.A.B.historical', 'CMIP6.CMIP.A.C.historical']
+    cache = CitationCache(str(tmp_path))
+    cache.prefetch(url_prefixes * 2)
+    assert len(urls) == 2
+    assert 'title is found' in cache.get(url_prefixes[0])
+    assert len(urls) == 2
+
+    offline_cache = CitationCache(str(tmp_path), offline=True)
+    assert offline_cache.get(url_prefixes[1]) == cache.get(url_prefixes[1])
+    assert offline_cache.get('CMIP6.CMIP.A.D.historical') == ''
+    assert len(urls) == 2
+
+
+def test_get_cmip6_url_prefix():
+    attributes = {
+        'activity_id': 'CMIP',
+        'experiment_id': 'historical',
+        'institution_id': 'NCAR',
+        'mip_era': 'CMIP6',
+        'source_id': 'CESM2',
+        'variant_label': 'r1i1p1f1',
+    }
+    url_prefix = 'CMIP6.CMIP.NCAR.CESM2.historical'
+    assert get_cmip6_url_prefix(attributes) == url_prefix
+    attributes['mip_era'] = 'CMIP5'
+    assert get_cmip6_url_prefix(attributes) is None
@@ -7,7 +7,8 @@ import pytest
 import yaml
 
 import esmvalcore._config
-from esmvalcore._data_finder import get_input_filelist, get_output_file
+from esmvalcore._data_finder import (FileIndex, get_input_filelist,
+                                     get_output_file)
 from esmvalcore.cmor.table import read_cmor_tables
 
 # Initialize with standard config developer file
@@ -100,3 +101,47 @@ def test_get_input_filelist(root, cfg):
     assert sorted(input_filelist) == sorted(ref_files)
     assert sorted(dirnames) == sorted(ref_dirs)
     assert sorted(filenames) == sorted(ref_patterns)
+
+
+@pytest.mark.parametrize('cfg', CONFIG['get_input_filelist'])
+def test_get_input_filelist_index(root, cfg, tmp_path):
+    """Test retrieving input filelist using a file index."""
+    create_tree(root, cfg.get('available_files'),
+                cfg.get('available_symlinks'))
+
+    rootpath = {cfg['variable']['project']: [root]}
+    drs = {cfg['variable']['project']: cfg['drs']}
+    index = FileIndex(str(tmp_path / 'file_index.sqlite'))
+
+    ref_files = [os.path.join(root, file) for file in cfg['found_files']]
+    if cfg['dirs'] is None:
+        ref_dirs = []
+    else:
+        ref_dirs = [os.path.join(root, dir) for dir in cfg['dirs']]
+
+    # Run twice: the first time fills the index, the second time uses it
+    for _ in range(2):
+        (input_filelist, dirnames,
+         filenames) = get_input_filelist(dict(cfg['variable']), rootpath, drs,
+                                         index=index)
+        assert sorted(input_filelist) == sorted(ref_files)
+        assert sorted(dirnames) == sorted(ref_dirs)
+        assert sorted(filenames) == sorted(cfg['file_patterns'])
+
+
+def test_file_index_invalidation(tmp_path):
+    """Test that the file index notices new files."""
+    index = FileIndex(str(tmp_path / 'file_index.sqlite'))
+    data_dir = tmp_path / 'data'
+    create_file(str(data_dir / 'sub' / 'a_2000-2001.nc'))
+
+    assert index.listdir(str(data_dir)) == (['sub'], [])
+    assert index.get_start_end_year(
+        str(data_dir / 'sub' / 'a_2000-2001.nc')) == (2000, 2001)
+
+    create_file(str(data_dir / 'b_2002-2003.nc'))
+    os.utime(data_dir, ns=(0, 0))
+    assert index.listdir(str(data_dir)) == (['sub'], ['b_2002-2003.nc'])
+    assert index.glob_dirs(str(tmp_path / '*' / 's*')) == [
+        str(data_dir / 'sub')
+    ]
@@ -1,6 +1,12 @@
+import pickle
+from unittest import mock
+
 from prov.constants import PROV_ATTR_GENERATED_ENTITY, PROV_ATTR_USED_ENTITY
 from prov.model import ProvDerivation
 
+from esmvalcore._provenance import (TrackedFile, get_recipe_provenance,
+                                    get_task_provenance)
+
 
 def get_file_record(prov, filename):
     records = prov.get_record('file:' + filename)
@@ -45,3 +51,52 @@ def check_product_wasderivedfrom(product):
     else:
         for ancestor in product._ancestors:
             check_product_wasderivedfrom(ancestor)
+
+
+def _create_tracked_files():
+    """Create a multi model product derived from three datasets."""
+    recipe = get_recipe_provenance({'authors': ['doe_jo']}, 'recipe_test.yml')
+    task = mock.Mock()
+    task.name = 'diagnostic/tas'
+    activity = get_task_provenance(task, recipe)
+    inputs = [
+        TrackedFile('/input/tas_{}.nc'.format(i), {'tracking_id': str(i)})
+        for i in range(3)
+    ]
+    products = [
+        TrackedFile('/preproc/tas_{}.nc'.format(i), {}, [input_file])
+        for i, input_file in enumerate(inputs)
+    ]
+    for product in products:
+        product.initialize_provenance(activity)
+    product = TrackedFile('/preproc/tas_mean.nc', {}, products)
+    product.initialize_provenance(activity)
+    return product
+
+
+def test_provenance_not_duplicated():
+    product = _create_tracked_files()
+    check_provenance(product)
+    records = product.provenance.records
+    assert len(records) == len(set(records))
+    assert product.provenance.get_record('recipe:recipe_test.yml')
+    # Records of the ancestors are referenced, not copied.
+    ancestor = product._ancestors[0]
+    assert ancestor.entity not in product._provenance.records
+    ancestor.entity.add_attributes({'attribute:extra': 'value'})
+    record = get_file_record(product.provenance, ancestor.filename)
+    assert record == ancestor.entity
+
+
+def test_copy_provenance():
+    product = _create_tracked_files()
+    copy = product.copy_provenance()
+    assert copy.entity == product.entity
+    assert set(copy.provenance.records) == set(product.provenance.records)
+    # Changes to the copy should not affect the original.
+    copy.wasderivedfrom(product._ancestors[0]._ancestors[0])
+    assert len(copy.provenance.records) == len(product.provenance.records) + 1
+
+    restored = pickle.loads(pickle.dumps(product))
+    check_provenance(restored)
+    assert set(restored.provenance.records) == set(product.provenance.records)
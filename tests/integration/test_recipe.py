@@ -118,7 +118,7 @@ def patched_datafinder(tmp_path, monkeypatch):
 
     tracking_id = tracking_ids()
 
-    def find_files(_, filenames):
+    def find_files(_, filenames, index=None):
         # Any occurrence of [something] in filename should have
         # been replaced before this function is called.
         for filename in filenames:
@@ -137,7 +137,7 @@ def patched_failing_datafinder(tmp_path, monkeypatch):
 
     tracking_id = tracking_ids()
 
-    def find_files(_, filenames):
+    def find_files(_, filenames, index=None):
         # Any occurrence of [something] in filename should have
         # been replaced before this function is called.
         for filename in filenames:
@@ -1,12 +1,15 @@
 import os
+import threading
 from functools import partial
 from multiprocessing.pool import ThreadPool
 
 import pytest
 
 import esmvalcore
-from esmvalcore._task import (BaseTask, _run_tasks_parallel,
-                              _run_tasks_sequential, run_tasks)
+from esmvalcore._task import (BaseTask, _find_previous_resource_logs,
+                              _read_peak_memory, _run_tasks_parallel,
+                              _run_tasks_sequential, _TaskGraph,
+                              get_independent_tasks, run_tasks)
 
 
 @pytest.fixture
@@ -80,3 +83,150 @@ def test_runner_uses_priority(monkeypatch, runner, example_tasks):
     print(order)
     assert len(order) == 12
     assert order == sorted(order)
+
+
+def test_get_independent_tasks(example_tasks):
+    """Check that only tasks that are not an ancestor are returned."""
+    ancestor = example_tasks.pop()
+    ancestor.ancestors = []
+    for task in example_tasks:
+        task.ancestors.append(ancestor)
+    assert get_independent_tasks(example_tasks) == example_tasks
+
+
+def test_run_tasks_parallel_shared_ancestor(monkeypatch, example_tasks):
+    """Check that a task shared by several tasks is run once, first."""
+    order = []
+
+    def _run(self, input_files):
+        order.append(self.name)
+        return [f'{self.name}_test.nc']
+
+    ancestor = BaseTask(name='shared')
+    for task in example_tasks:
+        task.ancestors.append(ancestor)
+
+    monkeypatch.setattr(BaseTask, '_run', _run)
+    monkeypatch.setattr(esmvalcore._task, 'Pool', ThreadPool)
+
+    _run_tasks_parallel(example_tasks, max_parallel_tasks=2)
+    assert len(order) == 13
+    assert order.count('shared') == 1
+    for task in example_tasks:
+        assert order.index('shared') < order.index(task.name)
+
+
+@pytest.mark.parametrize('max_memory,max_running', [
+    (None, 4),
+    (2.5, 2),
+    (1.5, 1),
+    (0.5, 1),
+])
+def test_run_tasks_parallel_max_memory(monkeypatch, example_tasks,
+                                       max_memory, max_running):
+    """Check that tasks are only started if they fit in memory."""
+    lock = threading.Lock()
+    running = []
+    max_seen = []
+    barrier = threading.Barrier(max_running, timeout=1)
+
+    def _run(self, input_files):
+        with lock:
+            running.append(self)
+            max_seen.append(len(running))
+        try:
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        with lock:
+            running.remove(self)
+        return [f'{self.name}_test.nc']
+
+    monkeypatch.setattr(BaseTask, '_run', _run)
+    monkeypatch.setattr(BaseTask, 'estimate_memory', lambda self: 1.)
+    monkeypatch.setattr(esmvalcore._task, 'Pool', ThreadPool)
+
+    _run_tasks_parallel(example_tasks, max_parallel_tasks=4,
+                        max_memory=max_memory)
+    assert len(max_seen) == 12
+    assert max(max_seen) == max_running
+
+
+def test_previous_resource_logs(tmp_path):
+    """Check that peak memory use from earlier runs is found."""
+    header = ('Date and time (UTC)\tReal time (s)\tCPU time (s)\tCPU (%)\t'
+              'Memory (GB)\tMemory (%)\tDisk read (GB)\tDisk write (GB)\n')
+    task_dir = os.path.join('run', 'diag', 'tas')
+    logs = []
+    for run, memory in (('20200101_120000', 2.5), ('20200102_120000', 0.5)):
+        log = tmp_path / f'recipe_test_{run}' / task_dir / 'resource_usage.txt'
+        log.parent.mkdir(parents=True)
+        log.write_text(header + f'2020-01-01 12:00:00\t1.0\t0.5\t50\t'
+                       f'{memory}\t1.0\t0.1\t0.1\n')
+        logs.append(str(log))
+    current = (tmp_path / 'recipe_test_20200103_120000' / task_dir /
+               'resource_usage.txt')
+
+    assert _find_previous_resource_logs(current) == logs
+    assert _read_peak_memory(logs[0]) == 2.5
+    assert _read_peak_memory(current) == 0.
+
+    task = BaseTask(name='diag/tas')
+    task.resource_log = current
+    assert task.estimate_memory() == 2.5
+
+
+def test_previous_resource_logs_other_recipes(tmp_path):
+    """Check that only logs of recent runs of the same recipe are found."""
+    task_dir = os.path.join('run', 'diag', 'tas')
+    logs = []
+    for run in ('recipe_test_cds_20200101_000000',
+                'recipe_test_20200101_000000', 'recipe_test_20200102_000000',
+                'recipe_test_20200103_000000'):
+        log = tmp_path / run / task_dir / 'resource_usage.txt'
+        log.parent.mkdir(parents=True)
+        log.write_text('')
+        logs.append(str(log))
+    current = (tmp_path / 'recipe_test_20200104_000000' / task_dir /
+               'resource_usage.txt')
+
+    assert _find_previous_resource_logs(current) == logs[1:]
+    assert _find_previous_resource_logs(current, max_runs=2) == logs[2:]
+
+
+def test_task_graph_pop(example_tasks):
+    """Check that a rejected task stays at the head of the queue."""
+    graph = _TaskGraph(example_tasks)
+    ready = sorted(graph._ready)
+    assert graph.pop(lambda task: False) is None
+    assert sorted(graph._ready) == ready
+
+    # Lower priority tasks are not started ahead of a rejected task
+    assert graph.pop(lambda task: task.priority == 1) is None
+    order = []
+    while graph:
+        order.append(graph.pop(lambda task: True)[0].priority)
+    assert order == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+    assert not graph._ready_since
+
+
+def test_run_tasks_parallel_max_memory_priority(monkeypatch):
+    """Check that smaller tasks do not start ahead of a waiting task."""
+    tasks = set()
+    for i, name in enumerate(['first', 'large', 'small1', 'small2']):
+        task = BaseTask(name=name)
+        task.priority = i
+        tasks.add(task)
+    started = []
+
+    def _run(self, input_files):
+        started.append(self.name)
+        return [f'{self.name}_test.nc']
+
+    monkeypatch.setattr(BaseTask, '_run', _run)
+    monkeypatch.setattr(BaseTask, 'estimate_memory',
+                        lambda self: 2. if self.name == 'large' else 1.)
+    monkeypatch.setattr(esmvalcore._task, 'Pool', ThreadPool)
+
+    _run_tasks_parallel(tasks, max_parallel_tasks=4, max_memory=2.)
+    assert started[:2] == ['first', 'large']
@@ -672,6 +672,32 @@ class TestCMORCheck(unittest.TestCase):
         self._update_coordinate_values(self.cube, coord, values)
         self._check_fails_in_metadata()
 
+    def test_data_not_valid_min(self):
+        """Warning if data values below valid_min."""
+        self.cube.data[0] = -1.
+        self._check_warnings_on_data()
+
+    def test_data_not_valid_max(self):
+        """Warning if data values above valid_max."""
+        self.cube.data[0] = 101.
+        self._check_warnings_on_data()
+
+    def test_data_not_valid_min_masked(self):
+        """Ignore masked data values below valid_min."""
+        self.cube.data = np.ma.masked_less(self.cube.data, 0.)
+        self.cube.data[0] = np.ma.masked
+        checker = CMORCheck(self.cube, self.var_info)
+        checker.check_metadata()
+        checker.check_data()
+        self.assertFalse(checker.has_warnings())
+
+    def test_data_not_valid_max_lazy(self):
+        """Check data range of lazy data without realizing it."""
+        self.cube.data[0] = 101.
+        self.cube.data = self.cube.lazy_data()
+        self._check_warnings_on_data()
+        self.assertTrue(self.cube.has_lazy_data())
+
     @staticmethod
     def _update_coordinate_values(cube, coord, values):
         [dimension] = cube.coord_dims(coord)
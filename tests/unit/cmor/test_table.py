@@ -1,5 +1,6 @@
 """Unit tests for the variable_info module."""
 
+import pickle
 import unittest
 
 from esmvalcore.cmor.table import CoordinateInfo, VariableInfo
@@ -24,6 +25,15 @@ class TestVariableInfo(unittest.TestCase):
         info.read_json({}, '')
         self.assertEqual('', info.standard_name)
 
+    def test_pickle(self):
+        """Test pickling an info object without instance dictionary."""
+        info = VariableInfo('table_type', 'var')
+        info.read_json({'units': 'K'}, '')
+        self.assertFalse(hasattr(info, '__dict__'))
+        info = pickle.loads(pickle.dumps(info))
+        self.assertEqual(info.short_name, 'var')
+        self.assertEqual(info.units, 'K')
+
     def test_read_standard_name(self):
         """Test standard_name."""
         info = VariableInfo('table_type', 'var')
@@ -139,3 +149,12 @@ class TestCoordinateInfo(unittest.TestCase):
         info = CoordinateInfo('var')
         info.read_json({'requested': value})
         self.assertEqual(info.requested, value)
+
+    def test_pickle(self):
+        """Test pickling an info object without instance dictionary."""
+        info = CoordinateInfo('var')
+        info.read_json({'units': 'm'})
+        self.assertFalse(hasattr(info, '__dict__'))
+        info = pickle.loads(pickle.dumps(info))
+        self.assertEqual(info.name, 'var')
+        self.assertEqual(info.units, 'm')
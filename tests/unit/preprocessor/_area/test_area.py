@@ -1,7 +1,9 @@
 """Unit tests for the :func:`esmvalcore.preprocessor._area` module."""
 
 import unittest
+from unittest import mock
 
+import dask.array as da
 import fiona
 import iris
 import numpy as np
@@ -106,6 +108,31 @@ class Test(tests.Test):
         expected = np.array([1.])
         self.assert_array_equal(result.data, expected)
 
+    def test_area_statistics_fx_areas(self):
+        """Test for area average of a lazy 3D field with fx cell areas."""
+        time = iris.coords.DimCoord([0., 1., 2.],
+                                    standard_name='time',
+                                    units='days since 2000-01-01')
+        cube = iris.cube.Cube(
+            da.arange(75., chunks=25).reshape((3, 5, 5)),
+            dim_coords_and_dims=[(time, 0),
+                                 (self.grid.coord('latitude'), 1),
+                                 (self.grid.coord('longitude'), 2)])
+        areacella = iris.cube.Cube(np.zeros((5, 5)))
+        areacella.data[0, 0] = 1.
+        with mock.patch('esmvalcore.preprocessor._area.load_fx_cube',
+                        return_value=areacella):
+            result = area_statistics(cube, 'mean',
+                                     {'areacella': 'areacella.nc'})
+        self.assertTrue(result.has_lazy_data())
+        np.testing.assert_array_equal(result.data, [0., 25., 50.])
+
+        areacella = iris.cube.Cube(np.ones((4, 5)))
+        with mock.patch('esmvalcore.preprocessor._area.load_fx_cube',
+                        return_value=areacella):
+            with self.assertRaises(ValueError):
+                area_statistics(cube, 'mean', {'areacella': 'areacella.nc'})
+
     def test_extract_region(self):
         """Test for extracting a region from a 2D field."""
         result = extract_region(self.grid, 1.5, 2.5, 1.5, 2.5)
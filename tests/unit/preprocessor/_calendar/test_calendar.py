@@ -0,0 +1,176 @@
+"""Unit tests for :mod:`esmvalcore.preprocessor._calendar`."""
+import cftime
+import iris.coord_categorisation
+import numpy as np
+import pytest
+from cf_units import Unit
+from iris.coords import DimCoord
+from iris.cube import Cube
+
+from esmvalcore.preprocessor._calendar import (
+    TIME_FIELDS_CACHE,
+    add_time_coord,
+    date2days,
+    days2date,
+    decode_time,
+    encode_time,
+    select_dates,
+)
+
+CALENDARS = [
+    'standard',
+    'proleptic_gregorian',
+    'julian',
+    'noleap',
+    'all_leap',
+    '360_day',
+]
+
+
+def _create_cube(points, units, calendar):
+    cube = Cube(np.zeros(len(points)), var_name='tas', units='K')
+    time = DimCoord(points,
+                    standard_name='time',
+                    units=Unit(units, calendar=calendar))
+    cube.add_dim_coord(time, 0)
+    return cube
+
+
+@pytest.mark.parametrize('calendar', CALENDARS)
+@pytest.mark.parametrize('units,points', [
+    ('days since 1850-01-01', np.arange(0., 800., 2.75)),
+    ('days since 1999-12-30 18:00', np.arange(-400., 400., 3.)),
+    ('hours since 1980-06-15 06:00', np.arange(0., 24. * 400., 23.)),
+    ('seconds since 2000-01-01', np.arange(0., 86400. * 40., 3600. * 7)),
+])
+def test_add_time_coord(units, points, calendar):
+    expected = _create_cube(points, units, calendar)
+    iris.coord_categorisation.add_year(expected, 'time')
+    iris.coord_categorisation.add_month_number(expected, 'time')
+    iris.coord_categorisation.add_day_of_month(expected, 'time')
+    iris.coord_categorisation.add_day_of_year(expected, 'time')
+    iris.coord_categorisation.add_hour(expected, 'time')
+    iris.coord_categorisation.add_season(expected, 'time', name='clim_season')
+    iris.coord_categorisation.add_season_year(expected, 'time')
+    iris.coord_categorisation.add_season_number(expected, 'time')
+
+    cube = _create_cube(points, units, calendar)
+    for coord in expected.aux_coords:
+        add_time_coord(cube, coord.name())
+    assert cube == expected
+
+
+def test_add_time_coord_exists():
+    cube = _create_cube(np.arange(3.), 'days since 2000-01-01', 'standard')
+    add_time_coord(cube, 'year')
+    with pytest.raises(ValueError):
+        add_time_coord(cube, 'year')
+
+
+def test_add_time_coord_unknown():
+    cube = _create_cube(np.arange(3.), 'days since 2000-01-01', 'standard')
+    with pytest.raises(ValueError):
+        add_time_coord(cube, 'week')
+
+
+def test_decode_time_cached():
+    TIME_FIELDS_CACHE.clear()
+    time = DimCoord(np.arange(10.),
+                    standard_name='time',
+                    units='days since 2000-02-25')
+    fields = decode_time(time)
+    assert decode_time(time.copy()) is fields
+    assert len(TIME_FIELDS_CACHE) == 1
+    np.testing.assert_array_equal(fields['month'], [2] * 5 + [3] * 5)
+    np.testing.assert_array_equal(fields['day'], [25, 26, 27, 28, 29] +
+                                  [1, 2, 3, 4, 5])
+    assert not fields['day'].flags.writeable
+
+    other = time.copy(time.points + 1)
+    assert decode_time(other) is not fields
+    assert len(TIME_FIELDS_CACHE) == 2
+
+
+@pytest.mark.parametrize('calendar', CALENDARS)
+def test_date2days(calendar):
+    units = Unit('days since 1000-01-01', calendar=calendar)
+    days = np.arange(-2000, 400000, 7)
+    dates = units.num2date(days)
+    year = np.array([date.year for date in dates])
+    month = np.array([date.month for date in dates])
+    day = np.array([date.day for date in dates])
+
+    result = date2days(year, month, day, calendar)
+    np.testing.assert_array_equal(np.diff(result), 7)
+    np.testing.assert_array_equal(days2date(result, calendar),
+                                  (year, month, day))
+
+
+def test_date2days_calendar_reform():
+    days = date2days([1582, 1582], [10, 10], [4, 15], 'standard')
+    assert days[1] - days[0] == 1
+    assert days2date(days[1] - 1, 'standard') == (1582, 10, 4)
+
+
+def test_date2days_unknown_calendar():
+    with pytest.raises(ValueError):
+        date2days(2000, 1, 1, 'none')
+    with pytest.raises(ValueError):
+        days2date(0, 'none')
+
+
+@pytest.mark.parametrize('calendar', CALENDARS)
+@pytest.mark.parametrize('units', [
+    'days since 1850-01-01 12:00',
+    'hours since 2000-01-01',
+    'seconds since 1970-01-01',
+])
+def test_encode_time(units, calendar):
+    units = Unit(units, calendar=calendar)
+    year = np.repeat(np.arange(1990, 2010), 4)
+    month = np.tile([1, 2, 11, 12], 20)
+    day = np.tile([30, 28, 30, 1], 20)
+    hour = np.tile([0, 6, 18, 23], 20)
+    dates = [
+        cftime.datetime(*date, calendar=calendar)
+        for date in zip(year, month, day, hour)
+    ]
+    points = encode_time(units, year, month, day, hour)
+    np.testing.assert_allclose(points, units.date2num(dates), atol=1e-6)
+
+    time = DimCoord(points, standard_name='time', units=units)
+    fields = decode_time(time)
+    np.testing.assert_array_equal(fields['year'], year)
+    np.testing.assert_array_equal(fields['month'], month)
+    np.testing.assert_array_equal(fields['day'], day)
+    np.testing.assert_array_equal(fields['hour'], hour)
+
+
+def test_encode_time_months():
+    units = Unit('months since 2000-01-01', calendar='360_day')
+    points = encode_time(units, [2000, 2001], [3, 1], 1)
+    np.testing.assert_allclose(points, [2., 12.])
+
+
+def test_select_dates():
+    time = DimCoord(np.arange(0.5, 365.),
+                    standard_name='time',
+                    units=Unit('days since 2001-01-01', calendar='noleap'))
+    assert select_dates(time, (2001, 2, 1), (2001, 3, 1)) == slice(31, 59)
+    assert select_dates(time, (1999, 1, 1), (2000, 1, 1)) == slice(0, 0)
+
+
+def test_select_dates_not_in_calendar():
+    time = DimCoord(np.arange(0.5, 365.),
+                    standard_name='time',
+                    units=Unit('days since 2001-01-01', calendar='noleap'))
+    assert select_dates(time, (2001, 2, 29), (2001, 2, 30)) == slice(59, 59)
+    assert select_dates(time, (2001, 2, 28), (2001, 3, 1)) == slice(58, 59)
+
+
+def test_select_dates_decreasing():
+    time = DimCoord(np.arange(364.5, 0., -1.),
+                    standard_name='time',
+                    units=Unit('days since 2001-01-01', calendar='noleap'))
+    indices = select_dates(time, (2001, 2, 1), (2001, 3, 1))
+    np.testing.assert_array_equal(indices, np.arange(306, 334))
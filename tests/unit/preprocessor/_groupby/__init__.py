@@ -0,0 +1 @@
+"""Test suite for _groupby module."""
@@ -0,0 +1,121 @@
+"""Unit tests for :mod:`esmvalcore.preprocessor._groupby`."""
+import dask
+import dask.array as da
+import iris.analysis
+import iris.exceptions
+import numpy as np
+import pytest
+from cf_units import Unit
+from iris.coords import AuxCoord, DimCoord
+from iris.cube import Cube
+
+from esmvalcore.preprocessor._groupby import aggregate_by
+
+OPERATORS = ['mean', 'median', 'std_dev', 'sum', 'variance', 'min', 'max']
+
+
+def _create_cube(lazy=True, masked=False):
+    times = np.arange(0.5, 40.)
+    data = np.arange(3 * 40, dtype=np.float32).reshape(3, 40) % 7
+    if masked:
+        data = np.ma.masked_array(data, mask=data == 2.)
+        data[1, :5] = np.ma.masked
+    if lazy:
+        data = da.from_array(data, chunks=(3, 7))
+    cube = Cube(data, var_name='tas', units='K')
+    cube.add_dim_coord(
+        DimCoord(np.arange(3.), standard_name='latitude', units='degrees'),
+        0)
+    cube.add_dim_coord(
+        DimCoord(times,
+                 bounds=np.stack([times - 0.5, times + 0.5], axis=-1),
+                 standard_name='time',
+                 units=Unit('days since 2000-01-01', calendar='360_day')),
+        1)
+    cube.add_aux_coord(AuxCoord(times // 5, long_name='pentad'), 1)
+    cube.add_aux_coord(AuxCoord(times.astype(int) % 3, long_name='cycle'), 1)
+    return cube
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+@pytest.mark.parametrize('masked', [True, False])
+@pytest.mark.parametrize('coords', ['pentad', 'cycle', ['cycle', 'pentad']])
+def test_aggregate_by(coords, masked, lazy):
+    cube = _create_cube(lazy=lazy, masked=masked)
+    result = aggregate_by(cube, coords, OPERATORS)
+    assert list(result) == OPERATORS
+    for operator in OPERATORS:
+        # iris realizes the data for some operators, so use a copy
+        expected = cube.copy().aggregated_by(
+            coords, getattr(iris.analysis, operator.upper()))
+        assert result[operator].has_lazy_data() == lazy
+        assert result[operator].dtype == expected.dtype
+        np.testing.assert_allclose(
+            np.ma.filled(np.ma.masked_invalid(result[operator].data), -1.),
+            np.ma.filled(np.ma.masked_invalid(expected.data), -1.),
+            rtol=1e-6,
+        )
+        expected.data = result[operator].data
+        assert result[operator].metadata == expected.metadata
+        assert result[operator].coords() == expected.coords()
+
+
+def test_aggregate_by_single_pass():
+    """The data is read once for all operators."""
+    cube = _create_cube()
+    loads = []
+
+    def load(block):
+        if block.size:
+            loads.append(block.shape)
+        return block
+
+    cube.data = cube.lazy_data().map_blocks(load, dtype=cube.dtype)
+    result = aggregate_by(cube, 'pentad', ['min', 'max', 'mean'])
+    dask.compute(*(c.lazy_data() for c in result.values()))
+    assert len(loads) == len(cube.lazy_data().chunks[1])
+
+
+def test_aggregate_by_chunks():
+    """The chunks contain whole groups."""
+    cube = _create_cube()
+    result = aggregate_by(cube, 'pentad', ['mean'])['mean']
+    assert sum(result.lazy_data().chunks[1]) == 8
+    assert all(chunk > 0 for chunk in result.lazy_data().chunks[1])
+
+
+def test_aggregate_by_int():
+    cube = _create_cube(lazy=False)
+    cube.data = cube.data.astype(np.int32)
+    result = aggregate_by(cube, 'pentad', ['mean', 'sum', 'max'])
+    assert result['mean'].dtype == np.float64
+    assert result['sum'].dtype == np.int64
+    assert result['max'].dtype == np.int32
+
+
+def test_aggregate_by_invalid_operator():
+    cube = _create_cube()
+    with pytest.raises(ValueError):
+        aggregate_by(cube, 'pentad', ['mode'])
+
+
+def test_aggregate_by_different_dims():
+    cube = _create_cube()
+    with pytest.raises(iris.exceptions.CoordinateCollapseError):
+        aggregate_by(cube, ['pentad', 'latitude'], ['mean'])
+
+
+@pytest.mark.parametrize('lazy', [True, False])
+def test_aggregate_by_count(lazy):
+    cube = _create_cube(lazy=lazy, masked=True)
+    result = aggregate_by(cube, 'pentad', ['count', 'mean'])
+    count = result['count']
+    assert count.has_lazy_data() == lazy
+    assert count.dtype == np.int64
+    assert count.units == '1'
+    assert count.cell_methods[-1].method == 'count'
+    valid = ~np.ma.getmaskarray(cube.data)
+    expected = valid.reshape(3, 8, 5).sum(axis=-1)
+    np.testing.assert_array_equal(count.data, expected)
+    assert not np.ma.is_masked(count.data)
+    assert result['mean'].dtype == (np.float32 if lazy else np.float64)
@@ -2,11 +2,14 @@
 from unittest import mock
 
 import cf_units
+import dask.array as da
 import iris
 import numpy as np
+from iris.coords import DimCoord
 
 import tests
 from esmvalcore.preprocessor._mapping import (get_empty_data, map_slices,
+                                              map_slices_lazy,
                                               ref_to_dims_index)
 
 
@@ -262,3 +265,53 @@ class Test(tests.Test):
             dim_coords_and_dims=dim_coords_and_dims,
             aux_coords_and_dims=[],
         )
+
+
+class TestMapSlicesLazy(tests.Test):
+    """Unit tests for map_slices_lazy."""
+
+    def setUp(self):
+        """Prepare source and destination cubes."""
+        time = DimCoord(np.arange(6.), standard_name='time',
+                        units='days since 1950-01-01')
+        lats = DimCoord(np.arange(3.), standard_name='latitude',
+                        units='degrees')
+        lons = DimCoord(np.arange(4.), standard_name='longitude',
+                        units='degrees')
+        data = da.arange(6 * 3 * 4, dtype=np.float32,
+                         chunks=2).reshape((6, 3, 4))
+        self.src_cube = iris.cube.Cube(
+            data,
+            var_name='tas',
+            units='K',
+            dim_coords_and_dims=[(time, 0), (lats, 1), (lons, 2)],
+        )
+        self.src_repr = self.src_cube[0]
+        self.dst_repr = iris.cube.Cube(
+            np.zeros((2, 2), dtype=np.float32),
+            dim_coords_and_dims=[(lats[:2], 0), (lons[:2], 1)],
+        )
+
+    def test_map_slices_lazy(self):
+        """Test that map_slices_lazy calls func on blocks of slices."""
+        ndims = []
+
+        def func(data):
+            ndims.append(data.ndim)
+            return np.ma.masked_less(data[..., :2, :2], 10.)
+
+        dst = map_slices_lazy(self.src_cube, func, self.src_repr,
+                              self.dst_repr)
+        self.assertTrue(dst.has_lazy_data())
+        self.assertEqual(dst.shape, (6, 2, 2))
+        self.assertEqual(dst.var_name, 'tas')
+        self.assertEqual(dst.coord_dims('time'), (0, ))
+        self.assertEqual(dst.coord_dims('latitude'), (1, ))
+        self.assertEqual(dst.coord_dims('longitude'), (2, ))
+        self.assertEqual(dst.lazy_data().chunks[1:], ((2, ), (2, )))
+        self.assertEqual(ndims, [])
+
+        expected = self.src_cube.data[..., :2, :2]
+        self.assert_array_equal(dst.data.data, expected)
+        self.assert_array_equal(dst.data.mask, expected < 10.)
+        self.assertTrue(all(ndim == 3 for ndim in ndims))
@@ -2,6 +2,7 @@
 
 import unittest
 
+import dask.array as da
 import numpy as np
 
 import iris
@@ -63,6 +64,21 @@ class Test(tests.Test):
                                  mask=dummy_fx_mask)
         self.assert_array_equal(fixed_mask, app_mask)
 
+    def test_apply_fx_mask_lazy(self):
+        """Test _apply_fx_mask func with lazy data."""
+        fx_mask = da.from_array(np.array([[True, False], [False, False]]))
+        data = np.ma.masked_array(np.arange(8.).reshape((2, 2, 2)),
+                                  mask=False)
+        data.mask[1, 1, 1] = True
+        var_data = da.ma.masked_array(da.from_array(data.data, chunks=1),
+                                      mask=data.mask)
+        result = _apply_fx_mask(fx_mask, var_data)
+        self.assertIsInstance(result, da.Array)
+        self.assertEqual(result.chunks, var_data.chunks)
+        expected = np.ma.masked_array(data.data, mask=data.mask)
+        expected.mask[:, 0, 0] = True
+        self.assert_array_equal(result.compute(), expected)
+
     def test_check_dims(self):
         """Test _check_dims func."""
         malformed_cube = self.arr[0]
@@ -126,6 +142,28 @@ class Test(tests.Test):
         expected = np.ma.array(self.data2, mask=[[False, True], [True, False]])
         self.assert_array_equal(result.data, expected)
 
+    def test_mask_threshold_lazy(self):
+        """Test that the threshold masks keep the data lazy."""
+        self.arr.data = da.from_array(self.data2)
+        result = mask_above_threshold(self.arr.copy(), 1.5)
+        self.assertTrue(result.has_lazy_data())
+        expected = np.ma.array(self.data2, mask=[[False, False], [True, True]])
+        self.assert_array_equal(result.data, expected)
+        result = mask_outside_range(self.arr.copy(), 0.5, 2.5)
+        self.assertTrue(result.has_lazy_data())
+        expected = np.ma.array(self.data2, mask=[[True, False], [False, True]])
+        self.assert_array_equal(result.data, expected)
+
+    def test_mask_glaciated_lazy(self):
+        """Test that the Natural Earth mask keeps the data lazy."""
+        self.arr.data = da.from_array(self.data2)
+        result = mask_glaciated(self.arr, mask_out='glaciated')
+        self.assertTrue(result.has_lazy_data())
+        expected = np.ma.masked_array(self.data2,
+                                      mask=np.array([[True, True],
+                                                     [False, False]]))
+        self.assert_array_equal(result.data, expected)
+
     def test_mask_outside_range(self):
         """Test to mask outside a range."""
         result = mask_outside_range(self.arr, 0.5, 2.5)
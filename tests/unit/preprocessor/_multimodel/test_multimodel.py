@@ -3,6 +3,7 @@
 import unittest
 
 import cftime
+import dask.array as da
 import iris
 import numpy as np
 from cf_units import Unit
@@ -15,7 +16,6 @@ from esmvalcore.preprocessor._multimodel import (_assemble_full_data,
                                                  _datetime_to_int_days,
                                                  _get_overlap,
                                                  _get_time_offset,
-                                                 _plev_fix,
                                                  _put_in_cube,
                                                  _slice_cube)
 
@@ -106,17 +106,36 @@ class Test(tests.Test):
 
     def test_compute_statistic(self):
         """Test statistic."""
-        data = [self.cube1.data[0], self.cube2.data[0]]
+        data = np.ma.stack([self.cube1.data[:1], self.cube2.data[:1]])
         stat_mean = _compute_statistic(data, "mean")
         stat_median = _compute_statistic(data, "median")
-        expected_mean = np.ma.ones((3, 2, 2))
-        expected_median = np.ma.ones((3, 2, 2))
-        self.assert_array_equal(stat_mean, expected_mean)
-        self.assert_array_equal(stat_median, expected_median)
+        self.assertIsInstance(stat_mean, da.Array)
+        expected_mean = np.ma.ones((1, 3, 2, 2))
+        expected_median = np.ma.ones((1, 3, 2, 2))
+        self.assert_array_equal(stat_mean.compute(), expected_mean)
+        self.assert_array_equal(stat_median.compute(), expected_median)
+
+    def test_compute_statistic_masked_level(self):
+        """Test statistic with less than two valid models on a level."""
+        data = np.ma.stack([self.cube1.data[:1], self.cube2.data[:1]])
+        data.mask = np.zeros(data.shape, bool)
+        data.mask[1, 0, 1] = True
+        stat = _compute_statistic(data, "mean").compute()
+        expected = np.ma.ones((1, 3, 2, 2))
+        expected.mask = np.zeros((1, 3, 2, 2), bool)
+        expected.mask[0, 1] = True
+        self.assert_array_equal(stat, expected)
+
+    def test_compute_statistic_unknown(self):
+        """Test unknown statistic."""
+        data = np.ma.stack([self.cube1.data, self.cube1.data])
+        with self.assertRaises(NotImplementedError):
+            _compute_statistic(data, "mode")
 
     def test_compute_full_statistic_mon_cube(self):
         data = [self.cube1, self.cube2]
         stats = multi_model_statistics(data, 'full', ['mean'])
+        self.assertTrue(stats['mean'].has_lazy_data())
         expected_full_mean = np.ma.ones((2, 3, 2, 2))
         expected_full_mean.mask = np.zeros((2, 3, 2, 2))
         expected_full_mean.mask[1] = True
@@ -144,25 +163,27 @@ class Test(tests.Test):
 
     def test_compute_std(self):
         """Test statistic."""
-        data = [self.cube1.data[0], self.cube2.data[0] * 2]
-        stat = _compute_statistic(data, "std")
-        expected = np.ma.ones((3, 2, 2)) * 0.5
-        expected[0, 0, 0] = 0
+        data = np.ma.stack([self.cube1.data[:1], self.cube2.data[:1] * 2])
+        stat = _compute_statistic(data, "std").compute()
+        expected = np.ma.ones((1, 3, 2, 2)) * 0.5
+        expected[0, 0, 0, 0] = 0
         self.assert_array_equal(stat, expected)
 
     def test_compute_max(self):
         """Test statistic."""
-        data = [self.cube1.data[0] * 0.5, self.cube2.data[0] * 2]
-        stat = _compute_statistic(data, "max")
-        expected = np.ma.ones((3, 2, 2)) * 2
-        expected[0, 0, 0] = 0.5
+        data = np.ma.stack(
+            [self.cube1.data[:1] * 0.5, self.cube2.data[:1] * 2])
+        stat = _compute_statistic(data, "max").compute()
+        expected = np.ma.ones((1, 3, 2, 2)) * 2
+        expected[0, 0, 0, 0] = 0.5
         self.assert_array_equal(stat, expected)
 
     def test_compute_min(self):
         """Test statistic."""
-        data = [self.cube1.data[0] * 0.5, self.cube2.data[0] * 2]
-        stat = _compute_statistic(data, "min")
-        expected = np.ma.ones((3, 2, 2)) * 0.5
+        data = np.ma.stack(
+            [self.cube1.data[:1] * 0.5, self.cube2.data[:1] * 2])
+        stat = _compute_statistic(data, "min").compute()
+        expected = np.ma.ones((1, 3, 2, 2)) * 0.5
         self.assert_array_equal(stat, expected)
 
     def test_put_in_cube(self):
@@ -204,12 +225,6 @@ class Test(tests.Test):
         no_ovlp = _get_overlap([self.cube1, self.cube2])
         np.testing.assert_equal(None, no_ovlp)
 
-    def test_plev_fix(self):
-        """Test plev fix."""
-        fixed_data = _plev_fix(self.cube2.data, 1)
-        expected_data = np.ma.ones((3, 2, 2))
-        self.assert_array_equal(expected_data, fixed_data)
-
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,7 +3,7 @@
 import unittest
 from unittest import mock
 
-import iris
+import dask.array as da
 import numpy as np
 from numpy import ma
 
@@ -67,122 +67,113 @@ class Test(tests.Test):
             with self.assertRaisesRegex(ValueError, emsg):
                 extract_levels(self.cube, levels, 'linear')
 
-    def test_interpolation(self):
-        new_data = np.array(True)
-        levels = np.array([0.5, 1.5])
-        scheme = 'linear'
-        with mock.patch(
-                'stratify.interpolate', return_value=new_data) as mocker:
-            result = extract_levels(self.cube, levels, scheme)
-            self.assertEqual(result, self.created_cube)
-            args, kwargs = mocker.call_args
-            # Check the stratify.interpolate args ...
-            self.assertEqual(len(args), 3)
-            self.assert_array_equal(args[0], levels)
-            pts = self.cube.coord(axis='z', dim_coords=True).points
-            src_levels_broadcast = np.broadcast_to(
-                pts.reshape(self.z, 1, 1), self.cube.shape)
-            self.assert_array_equal(args[1], src_levels_broadcast)
-            self.assert_array_equal(args[2], self.cube.data)
-            # Check the stratify.interpolate kwargs ...
-            self.assertEqual(
-                kwargs, dict(
-                    axis=0, interpolation=scheme, extrapolation='nan'))
+    def _check_interpolate_call(self, mocker, cube, levels, scheme,
+                                extrapolation='nan'):
+        """Check the arguments of the call to stratify.interpolate."""
+        args, kwargs = mocker.call_args
+        # Check the stratify.interpolate args ...
+        self.assertEqual(len(args), 3)
+        self.assert_array_equal(args[0], levels)
+        pts = cube.coord(axis='z', dim_coords=True).points
+        src_levels_broadcast = np.broadcast_to(
+            pts.reshape(self.z, 1, 1), cube.shape)
+        self.assert_array_equal(args[1], src_levels_broadcast)
+        self.assertFalse(ma.isMaskedArray(args[2]))
+        self.assertEqual(args[2].dtype, np.float64)
+        expected = ma.filled(cube.data.astype(np.float64), np.nan)
+        np.testing.assert_array_equal(args[2], expected)
+        # Check the stratify.interpolate kwargs ...
+        self.assertEqual(
+            kwargs,
+            dict(axis=0, interpolation=scheme, extrapolation=extrapolation))
+
+    def _check_create_cube_call(self, cube, levels):
+        """Check the arguments of the call to _create_cube."""
         args, kwargs = self.mock_create_cube.call_args
         # Check the _create_cube args ...
         self.assertEqual(len(args), 4)
-        self.assertEqual(args[0], self.cube)
-        self.assert_array_equal(args[1], new_data)
+        self.assertEqual(args[0], cube)
+        self.assertTrue(isinstance(args[1], da.Array))
         self.assert_array_equal(
             args[2], self.cube.coord(axis='z', dim_coords=True))
         self.assert_array_equal(args[3], levels)
         # Check the _create_cube kwargs ...
         self.assertEqual(kwargs, dict())
+        return args[1]
+
+    def test_interpolation(self):
+        levels = np.array([0.5, 1.5])
+        new_data = np.ones((2, 2, 1))
+        scheme = 'linear'
+        with mock.patch(
+                'stratify.interpolate', return_value=new_data) as mocker:
+            result = extract_levels(self.cube, levels, scheme)
+            self.assertEqual(result, self.created_cube)
+            lazy_data = self._check_create_cube_call(self.cube, levels)
+            mocker.assert_not_called()
+            data = lazy_data.compute()
+            self._check_interpolate_call(mocker, self.cube, levels, scheme)
+        self.assertFalse(ma.isMaskedArray(data))
+        self.assert_array_equal(data, new_data)
 
     def test_interpolation__extrapolated_nan_filling(self):
-        new_data = np.array([0, np.nan])
         levels = [0.5, 1.5]
+        new_data = np.array([0, np.nan, np.nan, 1]).reshape(2, 2, 1)
         scheme = 'nearest'
         with mock.patch(
                 'stratify.interpolate', return_value=new_data) as mocker:
             result = extract_levels(self.cube, levels, scheme)
             self.assertEqual(result, self.created_cube)
-            args, kwargs = mocker.call_args
-            # Check the stratify.interpolate args ...
-            self.assertEqual(len(args), 3)
-            self.assert_array_equal(args[0], levels)
-            pts = self.cube.coord(axis='z', dim_coords=True).points
-            src_levels_broadcast = np.broadcast_to(
-                pts.reshape(self.z, 1, 1), self.cube.shape)
-            self.assert_array_equal(args[1], src_levels_broadcast)
-            self.assert_array_equal(args[2], self.cube.data)
-            # Check the stratify.interpolate kwargs ...
-            self.assertEqual(
-                kwargs, dict(
-                    axis=0, interpolation=scheme, extrapolation='nan'))
-        args, kwargs = self.mock_create_cube.call_args
-        # Check the _create_cube args ...
-        self.assertEqual(len(args), 4)
-        self.assert_array_equal(args[0], self.cube)
-        new_data[np.isnan(new_data)] = _MDI
-        new_data_mask = np.zeros(new_data.shape, bool)
-        new_data_mask[new_data == _MDI] = True
-        new_data = np.ma.array(new_data, mask=new_data_mask)
-        self.assert_array_equal(args[1], new_data)
-        self.assert_array_equal(
-            args[2], self.cube.coord(axis='z', dim_coords=True))
-        self.assert_array_equal(args[3], levels)
-        # Check the _create_cube kwargs ...
-        self.assertEqual(kwargs, dict())
+            lazy_data = self._check_create_cube_call(self.cube, levels)
+            data = lazy_data.compute()
+            self._check_interpolate_call(mocker, self.cube, levels, scheme)
+        expected = ma.masked_invalid(new_data)
+        self.assert_array_equal(data, expected)
+        self.assertEqual(data.fill_value, _MDI)
 
     def test_interpolation__masked(self):
         levels = np.array([0.5, 1.5])
         new_data = np.empty([len(levels)] + list(self.shape[1:]), dtype=float)
         new_data[:, 0, :] = np.nan
-        new_data_mask = np.isnan(new_data)
+        new_data[:, 1, :] = 1.
         scheme = 'linear'
         mask = [[[False], [True]], [[True], [False]], [[False], [False]]]
-        masked = ma.empty(self.shape)
-        masked.mask = mask
+        masked = ma.masked_array(np.ones(self.shape), mask=mask)
         cube = _make_cube(masked, dtype=self.dtype)
         with mock.patch(
                 'stratify.interpolate', return_value=new_data) as mocker:
             result = extract_levels(cube, levels, scheme)
             self.assertEqual(result, self.created_cube)
-            args, kwargs = mocker.call_args
-            # Check the stratify.interpolate args ...
-            self.assertEqual(len(args), 3)
-            self.assert_array_equal(args[0], levels)
-            pts = cube.coord(axis='z', dim_coords=True).points
-            src_levels_broadcast = np.broadcast_to(
-                pts.reshape(self.z, 1, 1), cube.shape)
-            self.assert_array_equal(args[1], src_levels_broadcast)
-            self.assert_array_equal(args[2], cube.data)
-            # Check the stratify.interpolate kwargs ...
-            self.assertEqual(
-                kwargs, dict(
-                    axis=0, interpolation=scheme, extrapolation='nan'))
-        args, kwargs = self.mock_create_cube.call_args
-        # in-place for new extract_levels with nan's
-        new_data[np.isnan(new_data)] = _MDI
-        # Check the _create_cube args ...
-        self.assertEqual(len(args), 4)
-        self.assertEqual(args[0].metadata, cube.metadata)
-        coord_comparison = iris.analysis.coord_comparison(args[0], cube)
-        self.assertFalse(coord_comparison['not_equal']
-                         or coord_comparison['non_equal_data_dimension'])
-        self.assert_array_equal(args[0].data, cube.data)
-        new_data_mask = np.zeros(new_data.shape, bool)
-        new_data_mask[new_data == _MDI] = True
-        new_data = np.ma.array(new_data, mask=new_data_mask)
-        self.assert_array_equal(args[1], new_data)
-        self.assertTrue(ma.isMaskedArray(args[1]))
-        self.assert_array_equal(args[1].mask, new_data_mask)
-        self.assert_array_equal(
-            args[2], self.cube.coord(axis='z', dim_coords=True))
-        self.assert_array_equal(args[3], levels)
-        # Check the _create_cube kwargs ...
-        self.assertEqual(kwargs, dict())
+            lazy_data = self._check_create_cube_call(cube, levels)
+            data = lazy_data.compute()
+            self._check_interpolate_call(mocker, cube, levels, scheme)
+        # The input data should not be modified.
+        self.assert_array_equal(cube.data, masked)
+        self.assertTrue(ma.isMaskedArray(data))
+        self.assert_array_equal(data.mask, np.isnan(new_data))
+        self.assert_array_equal(data, ma.masked_invalid(new_data))
+
+    def test_interpolation__lazy(self):
+        levels = np.array([0.5, 1.5])
+        data = np.arange(3 * 4 * 2, dtype=np.float32).reshape(3, 4, 2)
+        cube = _make_cube(data, dtype=self.dtype)
+        cube.data = da.from_array(data, chunks=(1, 2, 1))
+
+        def interpolate(levels, src_levels, data, **kwargs):
+            return data[:len(levels)]
+
+        with mock.patch('stratify.interpolate',
+                        side_effect=interpolate) as mocker:
+            extract_levels(cube, levels, 'linear')
+            lazy_data = self._check_create_cube_call(cube, levels)
+            mocker.assert_not_called()
+            self.assertEqual(lazy_data.dtype, np.float32)
+            self.assertEqual(lazy_data.chunks[0], (2, ))
+            result = lazy_data.compute()
+        self.assertTrue(cube.has_lazy_data())
+        self.assert_array_equal(result, data[:2])
+        for args, _ in mocker.call_args_list:
+            self.assertEqual(args[2].shape[0], 3)
 
 
 if __name__ == '__main__':
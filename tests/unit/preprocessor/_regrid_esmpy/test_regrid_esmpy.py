@@ -1,4 +1,6 @@
 """Unit tests for the esmvalcore.preprocessor._regrid_esmpy module."""
+import os
+import tempfile
 from unittest import mock
 
 import cf_units
@@ -7,7 +9,8 @@ import numpy as np
 from iris.exceptions import CoordinateNotFoundError
 
 import tests
-from esmvalcore.preprocessor._regrid_esmpy import (build_regridder,
+from esmvalcore.preprocessor._regrid_esmpy import (WEIGHTS_CACHE,
+                                                   build_regridder,
                                                    build_regridder_2d,
                                                    coords_iris_to_esmpy,
                                                    cube_to_empty_field,
@@ -27,6 +30,17 @@ def identity(*args, **kwargs):
     return args
 
 
+def mock_esmf_regridder(size):
+    """Return a mock ESMF regridder with identity weights."""
+    index = np.arange(1, size + 1)
+    weights = {
+        'row_dst': index,
+        'col_src': index,
+        'weights': np.ones(size),
+    }
+    return mock.Mock(get_weights_dict=mock.Mock(return_value=weights))
+
+
 def mock_cube_to_empty_field(cube):
     """Return associated field for mock cube."""
     return cube.field
@@ -97,6 +111,7 @@ class TestHelpers(tests.Test):
     def setUp(self):
         """Set up fixtures."""
         # pylint: disable=too-many-locals
+        WEIGHTS_CACHE.clear()
         lat_1d_pre_bounds = np.linspace(-90, 90, 5)
         lat_1d_bounds = np.stack(
             [lat_1d_pre_bounds[:-1], lat_1d_pre_bounds[1:]], axis=1)
@@ -452,19 +467,22 @@ class TestHelpers(tests.Test):
     @mock.patch('ESMF.Regrid')
     def test_build_regridder_2d_unmasked_data(self, mock_regrid):
         """Test building of 2d regridder for unmasked data."""
+        mock_regrid.return_value = mock_esmf_regridder(16)
         self.cube.data = self.cube.data.data
-        self.cube.field = mock.Mock()
-        mock.sentinel.dst_rep.field = mock.Mock()
-        build_regridder_2d(self.cube, mock.sentinel.dst_rep,
+        self.cube.field = mock.MagicMock()
+        dst_rep = mock.MagicMock(shape=(4, 4))
+        dst_rep.field = mock.MagicMock()
+        build_regridder_2d(self.cube, dst_rep,
                            mock.sentinel.regrid_method, .99)
         expected_kwargs = {
             'src_mask_values': np.array([1]),
             'dst_mask_values': np.array([1]),
             'regrid_method': mock.sentinel.regrid_method,
             'srcfield': self.cube.field,
-            'dstfield': mock.sentinel.dst_rep.field,
+            'dstfield': dst_rep.field,
             'unmapped_action': mock.sentinel.ua_ignore,
             'ignore_degenerate': True,
+            'factors': True,
         }
         mock_regrid.assert_called_once_with(**expected_kwargs)
 
@@ -473,11 +491,10 @@ class TestHelpers(tests.Test):
     @mock.patch('ESMF.Regrid')
     def test_build_regridder_2d_masked_data(self, mock_regrid):
         """Test building of 2d regridder for masked data."""
-        mock_regrid.return_value = mock.Mock(return_value=mock.Mock(
-            data=self.data.T))
+        mock_regrid.return_value = mock_esmf_regridder(16)
         regrid_method = mock.sentinel.rm_bilinear
-        src_rep = mock.MagicMock(data=self.data)
-        dst_rep = mock.MagicMock()
+        src_rep = mock.MagicMock(data=self.data, shape=(4, 4))
+        dst_rep = mock.MagicMock(shape=(4, 4))
         src_rep.field = mock.MagicMock(data=self.data.copy())
         dst_rep.field = mock.MagicMock()
         build_regridder_2d(src_rep, dst_rep, regrid_method, .99)
@@ -488,14 +505,16 @@ class TestHelpers(tests.Test):
                       dstfield=dst_rep.field,
                       unmapped_action=mock.sentinel.ua_ignore,
                       ignore_degenerate=True,
-                      regrid_method=regrid_method),
+                      regrid_method=regrid_method,
+                      factors=True),
             mock.call(src_mask_values=np.array([1]),
                       dst_mask_values=np.array([1]),
                       regrid_method=regrid_method,
                       srcfield=src_rep.field,
                       dstfield=dst_rep.field,
                       unmapped_action=mock.sentinel.ua_ignore,
-                      ignore_degenerate=True),
+                      ignore_degenerate=True,
+                      factors=True),
         ]
         kwargs = mock_regrid.call_args_list[0][-1]
         expected_kwargs = expected_calls[0][-1]
@@ -513,30 +532,80 @@ class TestHelpers(tests.Test):
     @mock.patch('ESMF.Regrid')
     def test_regridder_2d_unmasked_data(self, mock_regrid):
         """Test regridder for unmasked 2d data."""
-        field_regridder = mock.Mock(return_value=mock.Mock(data=self.data.T))
-        mock_regrid.return_value = field_regridder
+        mock_regrid.return_value = mock_esmf_regridder(16)
+        regrid_method = mock.sentinel.rm_bilinear
+        src_rep = mock.MagicMock(data=self.data.data, shape=(4, 4))
+        dst_rep = mock.MagicMock(shape=(4, 4))
+        regridder = build_regridder_2d(src_rep, dst_rep, regrid_method, .99)
+        result = regridder(src_rep.data)
+        self.assert_array_equal(result.data, self.data.data)
+        self.assertFalse(np.ma.is_masked(result))
+
+    @mock.patch('esmvalcore.preprocessor._regrid_esmpy.cube_to_empty_field',
+                mock_cube_to_empty_field)
+    @mock.patch('ESMF.Regrid')
+    def test_regridder_2d_multiple_slices(self, mock_regrid):
+        """Test regridder for data with several time steps."""
+        mock_regrid.return_value = mock_esmf_regridder(16)
         regrid_method = mock.sentinel.rm_bilinear
-        src_rep = mock.MagicMock(data=self.data, dtype=np.float32)
+        src_rep = mock.MagicMock(data=self.data.data, shape=(4, 4))
         dst_rep = mock.MagicMock(shape=(4, 4))
         regridder = build_regridder_2d(src_rep, dst_rep, regrid_method, .99)
-        field_regridder.reset_mock()
-        regridder(src_rep)
-        field_regridder.assert_called_once_with(src_rep.field, dst_rep.field)
+        data = np.stack([self.data.data, 2 * self.data.data,
+                         3 * self.data.data])
+        result = regridder(data)
+        self.assertEqual(result.shape, (3, 4, 4))
+        self.assert_array_equal(result.data, data)
+        mock_regrid.assert_called_once()
 
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.cube_to_empty_field',
                 mock_cube_to_empty_field)
     @mock.patch('ESMF.Regrid')
     def test_regridder_2d_masked_data(self, mock_regrid):
         """Test regridder for masked 2d data."""
-        field_regridder = mock.Mock(return_value=mock.Mock(data=self.data.T))
-        mock_regrid.return_value = field_regridder
+        mock_regrid.return_value = mock_esmf_regridder(16)
         regrid_method = mock.sentinel.rm_bilinear
-        src_rep = mock.MagicMock(data=self.data)
+        src_rep = mock.MagicMock(data=self.data, shape=(4, 4))
         dst_rep = mock.MagicMock(shape=(4, 4))
         regridder = build_regridder_2d(src_rep, dst_rep, regrid_method, .99)
-        field_regridder.reset_mock()
-        regridder(self.cube)
-        field_regridder.assert_called_once_with(src_rep.field, dst_rep.field)
+        result = regridder(self.data)
+        self.assert_array_equal(result.mask, self.data.mask)
+        self.assert_array_equal(result[~result.mask],
+                                self.data[~self.data.mask])
+
+    @mock.patch('esmvalcore.preprocessor._regrid_esmpy.cube_to_empty_field',
+                mock_cube_to_empty_field)
+    @mock.patch('ESMF.Regrid')
+    def test_build_regridder_2d_cached(self, mock_regrid):
+        """Test that regridding weights are computed only once."""
+        mock_regrid.return_value = mock_esmf_regridder(16)
+        src_rep = mock.MagicMock(data=self.data.data, shape=(4, 4))
+        dst_rep = mock.MagicMock(shape=(4, 4))
+        build_regridder_2d(src_rep, dst_rep, mock.sentinel.rm_bilinear, .99)
+        build_regridder_2d(src_rep, dst_rep, mock.sentinel.rm_bilinear, .99)
+        mock_regrid.assert_called_once()
+        build_regridder_2d(src_rep, dst_rep, mock.sentinel.rm_nearest_stod,
+                           .99)
+        self.assertEqual(mock_regrid.call_count, 2)
+
+    @mock.patch('esmvalcore.preprocessor._regrid_esmpy.cube_to_empty_field',
+                mock_cube_to_empty_field)
+    @mock.patch('ESMF.Regrid')
+    def test_build_regridder_2d_weights_dir(self, mock_regrid):
+        """Test that regridding weights are stored on disk."""
+        mock_regrid.return_value = mock_esmf_regridder(16)
+        src_rep = mock.MagicMock(data=self.data.data, shape=(4, 4))
+        dst_rep = mock.MagicMock(shape=(4, 4))
+        with tempfile.TemporaryDirectory() as weights_dir:
+            build_regridder_2d(src_rep, dst_rep, mock.sentinel.rm_bilinear,
+                               .99, weights_dir)
+            self.assertEqual(len(os.listdir(weights_dir)), 1)
+            WEIGHTS_CACHE.clear()
+            regridder = build_regridder_2d(src_rep, dst_rep,
+                                           mock.sentinel.rm_bilinear, .99,
+                                           weights_dir)
+        mock_regrid.assert_called_once()
+        self.assert_array_equal(regridder(src_rep.data).data, self.data.data)
 
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.build_regridder_3d')
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.build_regridder_2d')
@@ -547,7 +616,7 @@ class TestHelpers(tests.Test):
         dst_rep = mock.Mock(ndim=2)
         build_regridder(src_rep, dst_rep, 'nearest')
         mock_regridder_2d.assert_called_once_with(
-            src_rep, dst_rep, mock.sentinel.rm_nearest_stod, .99)
+            src_rep, dst_rep, mock.sentinel.rm_nearest_stod, .99, None)
         mock_regridder_3d.assert_not_called()
 
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.build_regridder_3d')
@@ -559,7 +628,7 @@ class TestHelpers(tests.Test):
         dst_rep = mock.Mock(ndim=3)
         build_regridder(src_rep, dst_rep, 'nearest')
         mock_regridder_3d.assert_called_once_with(
-            src_rep, dst_rep, mock.sentinel.rm_nearest_stod, .99)
+            src_rep, dst_rep, mock.sentinel.rm_nearest_stod, .99, None)
         mock_regridder_2d.assert_not_called()
 
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.get_representant')
@@ -646,7 +715,7 @@ class TestHelpers(tests.Test):
             aux_coords_and_dims=[],
         )
 
-    @mock.patch('esmvalcore.preprocessor._regrid_esmpy.map_slices')
+    @mock.patch('esmvalcore.preprocessor._regrid_esmpy.map_slices_lazy')
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.build_regridder')
     @mock.patch('esmvalcore.preprocessor._regrid_esmpy.get_grid_representants',
                 mock.Mock(side_effect=identity))
@@ -656,7 +725,8 @@ class TestHelpers(tests.Test):
         mock_map_slices.return_value = mock.sentinel.regridded
         regrid(self.cube_3d, self.cube)
         mock_build_regridder.assert_called_once_with(self.cube_3d, self.cube,
-                                                     'linear')
+                                                     'linear',
+                                                     weights_dir=None)
         mock_map_slices.assert_called_once_with(self.cube_3d,
                                                 mock.sentinel.regridder,
                                                 self.cube_3d, self.cube)
@@ -0,0 +1 @@
+"""Test suite for _shapes module."""
@@ -0,0 +1,66 @@
+"""Unit tests for :mod:`esmvalcore.preprocessor._shapes`."""
+import numpy as np
+import pytest
+import shapely.vectorized
+from shapely.geometry import MultiPolygon, Polygon
+
+from esmvalcore.preprocessor._shapes import (
+    ShapeMaskCache,
+    contains,
+    get_mask_key,
+)
+
+
+@pytest.fixture
+def grid():
+    lon, lat = np.meshgrid(np.arange(0.5, 10.), np.arange(-4.5, 5.))
+    return lon, lat
+
+
+def test_contains(grid):
+    lon, lat = grid
+    shape = MultiPolygon([
+        Polygon([(0., -5.), (3., -5.), (3., 0.), (0., 0.)]),
+        Polygon([(5., 0.), (8., 2.), (5., 4.)]),
+        Polygon([(20., 20.), (21., 20.), (21., 21.)]),
+    ])
+    expected = shapely.vectorized.contains(shape, lon, lat)
+    result = contains(shape, lon, lat)
+    assert result.shape == lon.shape
+    assert result.any()
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_get_mask_key(tmp_path, grid):
+    lon, lat = grid
+    shapefile = tmp_path / 'shapes.shp'
+    shapefile.write_text('shapes')
+    key = get_mask_key(str(shapefile), 0, 'contains', lon, lat)
+    assert key == get_mask_key(str(shapefile), 0, 'contains', lon, lat)
+    assert key != get_mask_key(str(shapefile), 1, 'contains', lon, lat)
+    assert key != get_mask_key(str(shapefile), 0, 'representative', lon,
+                               lat)
+    assert key != get_mask_key(str(shapefile), 0, 'contains', lon + 1., lat)
+    shapefile.write_text('other shapes')
+    assert key != get_mask_key(str(shapefile), 0, 'contains', lon, lat)
+
+
+def test_shape_mask_cache(tmp_path):
+    cache = ShapeMaskCache(max_bytes=150)
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[2:5, 3:6] = True
+    cache.add('a', mask, str(tmp_path))
+    assert cache.get('a') is mask
+    assert not mask.flags.writeable
+
+    # A second mask does not fit, so the least recently used is removed.
+    cache.add('b', np.ones((10, 10), dtype=bool))
+    assert cache.get('b') is not None
+    assert cache.nbytes == 100
+    # The first mask is still available on disk.
+    assert cache.get('a') is None
+    np.testing.assert_array_equal(cache.get('a', str(tmp_path)), mask)
+    assert cache.get('missing', str(tmp_path)) is None
+
+    cache.clear()
+    assert cache.nbytes == 0
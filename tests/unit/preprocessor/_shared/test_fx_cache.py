@@ -0,0 +1,89 @@
+"""Unit tests for :class:`esmvalcore.preprocessor._shared.FxCubeCache`."""
+import os
+
+import iris
+import numpy as np
+import pytest
+from iris.cube import Cube
+
+from esmvalcore.preprocessor._shared import FxCubeCache
+
+
+def _save_fx_cube(path, value, shape=(2, 3)):
+    """Save a constant fx cube to path."""
+    cube = Cube(np.full(shape, value, dtype=np.float32), var_name='sftlf')
+    iris.save(cube, str(path))
+    return str(path)
+
+
+def test_load_cube_is_cached(tmp_path, monkeypatch):
+    """Test that a file is only loaded once."""
+    filename = _save_fx_cube(tmp_path / 'sftlf.nc', 1.)
+    cache = FxCubeCache()
+    loaded = []
+    load_cube = iris.load_cube
+
+    def counting_load_cube(*args, **kwargs):
+        loaded.append(args[0])
+        return load_cube(*args, **kwargs)
+
+    monkeypatch.setattr(iris, 'load_cube', counting_load_cube)
+    cube1 = cache.load_cube(filename)
+    cube2 = cache.load_cube(filename)
+    assert loaded == [filename]
+    assert cube1.has_lazy_data()
+    assert cube2.has_lazy_data()
+    assert cube1 is not cube2
+    np.testing.assert_array_equal(cube1.data, np.ones((2, 3)))
+    with pytest.raises(ValueError):
+        cube1.data[0, 0] = 2.
+
+
+def test_load_cube_modified_file(tmp_path):
+    """Test that a modified file is loaded again."""
+    filename = _save_fx_cube(tmp_path / 'sftlf.nc', 1.)
+    cache = FxCubeCache()
+    np.testing.assert_array_equal(cache.load_cube(filename).data, 1.)
+    os.remove(filename)
+    _save_fx_cube(tmp_path / 'sftlf.nc', 2.)
+    os.utime(filename, ns=(0, 0))
+    np.testing.assert_array_equal(cache.load_cube(filename).data, 2.)
+
+
+def test_load_cube_memory_limit(tmp_path):
+    """Test that the least recently used cubes are evicted."""
+    filenames = [
+        _save_fx_cube(tmp_path / f'sftlf_{i}.nc', i, shape=(10, ))
+        for i in range(3)
+    ]
+    cache = FxCubeCache()
+    cache.load_cube(filenames[0])
+    nbytes = cache.nbytes
+    cache = FxCubeCache(max_bytes=2 * nbytes)
+    for filename in filenames:
+        cache.load_cube(filename)
+    assert cache.nbytes <= 2 * nbytes
+    assert [key[0] for key in cache._cubes] == filenames[1:]
+
+    cache.clear()
+    assert cache.nbytes == 0
+
+
+def test_load_cube_too_large(tmp_path, monkeypatch):
+    """Test that a file larger than the cache is not read."""
+    filename = _save_fx_cube(tmp_path / 'volcello.nc', 1., shape=(10, ))
+    load_cube = iris.load_cube
+
+    def _fail(block):
+        raise AssertionError("Data should not be read")
+
+    def lazy_load_cube(*args, **kwargs):
+        cube = load_cube(*args, **kwargs)
+        return cube.copy(cube.lazy_data().map_blocks(_fail, dtype=cube.dtype))
+
+    monkeypatch.setattr(iris, 'load_cube', lazy_load_cube)
+    cache = FxCubeCache(max_bytes=8)
+    cube = cache.load_cube(filename)
+    assert cube.has_lazy_data()
+    assert cube.shape == (10, )
+    assert not cache._cubes
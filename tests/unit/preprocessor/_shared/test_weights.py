@@ -0,0 +1,72 @@
+"""Unit tests for the weights in :mod:`esmvalcore.preprocessor._shared`."""
+import dask.array as da
+import iris
+import numpy as np
+import pytest
+from iris.coords import DimCoord
+from iris.cube import Cube
+
+from esmvalcore.preprocessor._shared import (
+    broadcast_weights,
+    get_area_weights,
+    get_broadcastable,
+    is_broadcastable,
+)
+
+
+def _create_cube(data):
+    """Create a (time, lat, lon) cube."""
+    time = DimCoord([0., 1.],
+                    standard_name='time',
+                    units='days since 2000-01-01')
+    lat = DimCoord([-45., 45.],
+                   bounds=[[-90., 0.], [0., 90.]],
+                   standard_name='latitude',
+                   units='degrees_north')
+    lon = DimCoord([90., 270.],
+                   bounds=[[0., 180.], [180., 360.]],
+                   standard_name='longitude',
+                   units='degrees_east')
+    return Cube(data, dim_coords_and_dims=[(time, 0), (lat, 1), (lon, 2)])
+
+
+def test_get_broadcastable():
+    array = np.arange(6).reshape(2, 3)
+    result = get_broadcastable(array, (1, 3), 4)
+    assert result.shape == (1, 2, 1, 3)
+    np.testing.assert_array_equal(result[0, :, 0, :], array)
+
+
+def test_is_broadcastable():
+    assert is_broadcastable(np.ones((1, 2, 3)), (4, 2, 3))
+    assert not is_broadcastable(np.ones((2, 3)), (4, 2, 3))
+    assert not is_broadcastable(np.ones((1, 3, 3)), (4, 2, 3))
+
+
+def test_get_area_weights():
+    cube = _create_cube(np.ones((2, 2, 2)))
+    weights = get_area_weights(cube)
+    assert weights.shape == (1, 2, 2)
+    expected = iris.analysis.cartography.area_weights(cube)
+    np.testing.assert_allclose(np.broadcast_to(weights, cube.shape), expected)
+
+
+def test_broadcast_weights_realized():
+    cube = _create_cube(np.ones((2, 2, 2)))
+    weights = np.arange(4.).reshape(1, 2, 2)
+    result = broadcast_weights(cube, weights)
+    assert isinstance(result, np.ndarray)
+    assert result.shape == cube.shape
+    assert result.strides[0] == 0
+    with pytest.raises(ValueError):
+        result[0, 0, 0] = 1.
+
+
+def test_broadcast_weights_lazy():
+    cube = _create_cube(da.ones((2, 2, 2), chunks=(1, 2, 1)))
+    weights = np.arange(4.).reshape(1, 2, 2)
+    result = broadcast_weights(cube, weights)
+    assert isinstance(result, da.Array)
+    assert result.chunks == cube.lazy_data().chunks
+    np.testing.assert_array_equal(result.compute(),
+                                  np.broadcast_to(weights, cube.shape))
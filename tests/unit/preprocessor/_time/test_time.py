@@ -3,7 +3,9 @@
 import copy
 import unittest
 
+import dask.array as da
 import iris
+import iris.analysis
 import iris.coord_categorisation
 import iris.coords
 import numpy as np
@@ -13,11 +15,14 @@ from iris.cube import Cube
 from numpy.testing import assert_array_almost_equal, assert_array_equal
 
 import tests
-from esmvalcore.preprocessor._time import (annual_statistics, anomalies,
+from esmvalcore.preprocessor._time import (_apply_period_reference,
+                                           _get_period_coord,
+                                           annual_statistics, anomalies,
                                            climate_statistics,
                                            daily_statistics,
                                            decadal_statistics, extract_month,
                                            extract_season, extract_time,
+                                           low_pass_weights,
                                            monthly_statistics, regrid_time,
                                            seasonal_statistics,
                                            timeseries_filter)
@@ -147,6 +152,20 @@ class TestTimeSlice(tests.Test):
         sliced = extract_time(cube, 1950, 1, 1, 1950, 12, 31)
         assert cube == sliced
 
+    def test_extract_time_single_point(self):
+        """Test extract_time removes time when a single point is selected."""
+        sliced = extract_time(self.cube, 1950, 2, 1, 1950, 3, 1)
+        assert sliced.shape == ()
+        assert not sliced.coord_dims('time')
+        assert_array_equal(np.array([45.]), sliced.coord('time').points)
+
+    def test_extract_time_lazy(self):
+        """Test extract_time keeps the data lazy."""
+        cube = self.cube.copy(self.cube.lazy_data())
+        sliced = extract_time(cube, 1950, 1, 1, 1950, 12, 31)
+        assert sliced.has_lazy_data()
+        assert_array_equal(self.cube.data[:12], sliced.data)
+
 
 class TestExtractSeason(tests.Test):
     """Tests for extract_season."""
@@ -195,6 +214,20 @@ class TestExtractSeason(tests.Test):
             np.array([9, 10, 11, 9, 10, 11]),
             sliced.coord('month_number').points)
 
+    def test_season_coords(self):
+        """Test the season coordinates are added."""
+        sliced = extract_season(self.cube, 'djf')
+        assert_array_equal(
+            np.array(['djf'] * 6), sliced.coord('clim_season').points)
+        assert_array_equal(
+            np.array([1950, 1950, 1951, 1951, 1951, 1952]),
+            sliced.coord('season_year').points)
+
+    def test_unknown_season(self):
+        """Test function fails for unknown seasons"""
+        with self.assertRaises(ValueError):
+            extract_season(self.cube, 'jfm')
+
 
 class TestClimatology(tests.Test):
     """Test class for :func:`esmvalcore.preprocessor._time.climatology`"""
@@ -687,6 +720,27 @@ class TestRegridTimeDaily(tests.Test):
         diff_cube = newcube_2 - newcube_1
         self.assert_array_equal(diff_cube.data, expected)
 
+    def test_regrid_time_day_360_day(self):
+        """Test regrid_time on dates that only exist in a 360_day calendar."""
+        cube = Cube(np.arange(4.), var_name='tas', units='K')
+        cube.add_dim_coord(
+            iris.coords.DimCoord(
+                np.arange(57.25, 61.),
+                standard_name='time',
+                units=Unit('days since 1950-01-01', calendar='360_day'),
+            ),
+            0,
+        )
+        cube = regrid_time(cube, frequency='day')
+        assert_array_equal(cube.coord('time').points, [57., 58., 59., 60.])
+        assert_array_equal(cube.coord('day_of_month').points,
+                           [28, 29, 30, 1])
+
+    def test_regrid_time_invalid_frequency(self):
+        """Test regrid_time with an unsupported frequency."""
+        with self.assertRaises(ValueError):
+            regrid_time(self.cube_1, frequency='2hr')
+
 
 class TestRegridTime6Hourly(tests.Test):
     """Tests for regrid_time with 6-hourly frequency."""
@@ -867,6 +921,77 @@ class TestTimeseriesFilter(tests.Test):
                               filter_type='bypass',
                               filter_stats='sum')
 
+    def test_timeseries_filter_lazy(self):
+        """Test that lazy data is filtered chunk by chunk."""
+        cube = self.cube.copy(self.cube.lazy_data().rechunk(5))
+        filtered_cube = timeseries_filter(cube, 7, 14,
+                                          filter_type='lowpass',
+                                          filter_stats='sum')
+        assert filtered_cube.has_lazy_data()
+        expected = timeseries_filter(self.cube, 7, 14,
+                                     filter_type='lowpass',
+                                     filter_stats='sum')
+        assert_array_almost_equal(filtered_cube.data, expected.data)
+        assert filtered_cube.coord('time') == expected.coord('time')
+
+    def test_timeseries_filter_rolling_window(self):
+        """Test that the result is the same as iris rolling_window."""
+        data = np.ma.masked_greater(np.arange(24.) % 5, 3.)
+        cube = self.cube.copy(da.from_array(data, chunks=4))
+        weights = low_pass_weights(7, 1. / 14)
+        for stats in ('sum', 'mean'):
+            filtered_cube = timeseries_filter(cube, 7, 14,
+                                              filter_type='lowpass',
+                                              filter_stats=stats)
+            operator = iris.analysis.SUM if stats == 'sum' else (
+                iris.analysis.MEAN)
+            expected = cube.rolling_window('time', operator, len(weights),
+                                           weights=weights)
+            assert_array_almost_equal(filtered_cube.data, expected.data)
+            assert filtered_cube.coords() == expected.coords()
+            assert filtered_cube.cell_methods == expected.cell_methods
+
+    def test_timeseries_filter_highpass(self):
+        """Test that lowpass and highpass add up to the original data."""
+        lowpass = timeseries_filter(self.cube, 7, 14,
+                                    filter_type='lowpass',
+                                    filter_stats='sum')
+        highpass = timeseries_filter(self.cube, 7, 14,
+                                     filter_type='highpass',
+                                     filter_stats='sum')
+        assert_array_almost_equal(lowpass.data + highpass.data,
+                                  self.cube.data[3:-3])
+
+    def test_timeseries_filter_bandpass(self):
+        """Test the bandpass filter."""
+        filtered_cube = timeseries_filter(self.cube, 7, [14, 4],
+                                          filter_type='bandpass',
+                                          filter_stats='sum')
+        short = timeseries_filter(self.cube, 7, 4, filter_stats='sum')
+        long = timeseries_filter(self.cube, 7, 14, filter_stats='sum')
+        assert_array_almost_equal(filtered_cube.data, short.data - long.data)
+
+    def test_timeseries_filter_invalid_span(self):
+        """Test a span that does not fit the filter type."""
+        with self.assertRaises(ValueError):
+            timeseries_filter(self.cube, 7, 14, filter_type='bandpass')
+        with self.assertRaises(ValueError):
+            timeseries_filter(self.cube, 7, [4, 14], filter_type='lowpass')
+
+    def test_timeseries_filter_stats_implemented(self):
+        """Test a not implemented statistic."""
+        with self.assertRaises(NotImplementedError):
+            timeseries_filter(self.cube, 7, 14, filter_stats='median')
+        with self.assertRaises(NotImplementedError):
+            timeseries_filter(self.cube, 7, 14,
+                              filter_type='highpass',
+                              filter_stats='mean')
+
+    def test_timeseries_filter_too_long(self):
+        """Test a filter that is longer than the time series."""
+        with self.assertRaises(ValueError):
+            timeseries_filter(self.cube, 31, 14)
+
 
 def make_time_series(number_years=2):
     """Make a cube with time only dimension."""
@@ -1023,6 +1148,40 @@ def test_standardized_anomalies(period, standardize=True):
             )
 
 
+@pytest.mark.parametrize('period', ['day', 'month', 'season'])
+def test_standardized_anomalies_period(period):
+    cube = make_map_data(number_years=2)
+    # Start in April, so the time series does not cover whole years.
+    cube = cube[..., 90:]
+    result = anomalies(cube, period, standardize=True)
+    assert result.has_lazy_data()
+
+    cube = make_map_data(number_years=2)[..., 90:]
+    coord = _get_period_coord(cube, period)
+    expected = cube.data.copy()
+    for value in np.unique(coord.points):
+        select = coord.points == value
+        anom = expected[..., select] - cube.data[..., select].mean(
+            axis=-1, keepdims=True)
+        expected[..., select] = anom / anom.std(axis=-1, keepdims=True,
+                                                ddof=1)
+    np.testing.assert_allclose(result.data, np.ma.masked_invalid(expected))
+
+
+def test_anomalies_graph_size():
+    """The number of tasks does not depend on the number of time points."""
+    sizes = []
+    for number_years in (2, 20):
+        cube = make_map_data(number_years=number_years)
+        cube.data = cube.lazy_data().rechunk(-1)
+        reference = climate_statistics(cube, period='month')
+        result = _apply_period_reference(cube, reference, 'month',
+                                         np.subtract)
+        sizes.append(len(result.lazy_data().dask.layers[
+            result.lazy_data().name]))
+    assert sizes[0] == sizes[1]
+
+
 @pytest.mark.parametrize('period, reference', PARAMETERS)
 def test_anomalies_preserve_metadata(period, reference, standardize=False):
     cube = make_map_data(number_years=2)
@@ -1,13 +1,16 @@
 """Unit test for :func:`esmvalcore.preprocessor._volume`."""
 
 import unittest
+from unittest import mock
 
+import dask.array as da
 import iris
 import numpy as np
 from cf_units import Unit
 
 import tests
-from esmvalcore.preprocessor._volume import (volume_statistics,
+from esmvalcore.preprocessor._volume import (SPATIAL_INDEX_CACHE,
+                                             volume_statistics,
                                              depth_integration,
                                              extract_trajectory,
                                              extract_transect, extract_volume)
@@ -71,6 +74,20 @@ class Test(tests.Test):
         self.grid_4d_2 = iris.cube.Cube(
             data3, dim_coords_and_dims=coords_spec5)
 
+        # Curvilinear grid with 2D latitude and longitude coordinates.
+        j_index, i_index = np.meshgrid(np.arange(4), np.arange(5),
+                                       indexing='ij')
+        lats = iris.coords.AuxCoord(-45. + 30. * j_index + 0.5 * i_index,
+                                    standard_name='latitude',
+                                    units='degrees_north')
+        lons = iris.coords.AuxCoord(60. * i_index + j_index,
+                                    standard_name='longitude',
+                                    units='degrees_east')
+        self.grid_irregular = iris.cube.Cube(
+            np.ma.arange(2 * 3 * 4 * 5.).reshape((2, 3, 4, 5)),
+            dim_coords_and_dims=[(time, 0), (zcoord, 1)],
+            aux_coords_and_dims=[(lats, (2, 3)), (lons, (2, 3))])
+
         # allow iris to figure out the axis='z' coordinate
         iris.util.guess_coord_axis(self.grid_3d.coord('zcoord'))
         iris.util.guess_coord_axis(self.grid_4d.coord('zcoord'))
@@ -120,6 +137,52 @@ class Test(tests.Test):
         expected = np.ma.array([1., 1], mask=[True, False])
         self.assert_array_equal(result.data, expected)
 
+    def test_volume_statistics_lazy(self):
+        """Test that the volume weighted average stays lazy."""
+        self.grid_4d.data = da.ma.masked_array(
+            da.arange(24, chunks=12).reshape((2, 3, 2, 2)), mask=False)
+        result = volume_statistics(self.grid_4d, 'mean')
+        self.assertTrue(result.has_lazy_data())
+        self.assertEqual(result.shape, (2, ))
+        # The layer thickness varies much more than the cell area.
+        weights = np.broadcast_to([2.5, 22.5, 225.], (2, 2, 3)).T
+        expected = np.average(np.arange(24).reshape((2, 3, 2, 2)),
+                              axis=(1, 2, 3),
+                              weights=np.broadcast_to(weights, (2, 3, 2, 2)))
+        np.testing.assert_allclose(result.data, expected, rtol=1e-4)
+
+    def test_volume_statistics_operators(self):
+        """Test the unweighted operators and the weighted sum."""
+        self.grid_4d.data = np.ma.arange(24.).reshape((2, 3, 2, 2))
+        result = volume_statistics(self.grid_4d, 'max')
+        np.testing.assert_array_equal(result.data, [11., 23.])
+        result = volume_statistics(self.grid_4d, 'min')
+        np.testing.assert_array_equal(result.data, [0., 12.])
+        self.grid_4d.data = np.ma.ones((2, 3, 2, 2))
+        volume = volume_statistics(self.grid_4d, 'sum').data
+        np.testing.assert_allclose(volume[0], volume[1])
+        self.assertTrue(volume[0] > 0.)
+        with self.assertRaises(ValueError):
+            volume_statistics(self.grid_4d, 'wrong')
+
+    def test_volume_statistics_fx_volume(self):
+        """Test that a grid volume without time is applied to all times."""
+        self.grid_4d.data = np.ma.arange(24.).reshape((2, 3, 2, 2))
+        volcello = iris.cube.Cube(np.zeros((3, 2, 2)))
+        volcello.data[0, 0, 0] = 1.
+        with mock.patch('esmvalcore.preprocessor._volume.load_fx_cube',
+                        return_value=volcello):
+            result = volume_statistics(self.grid_4d, 'mean',
+                                       {'volcello': 'volcello.nc'})
+        np.testing.assert_array_equal(result.data, [0., 12.])
+
+        volcello = iris.cube.Cube(np.ones((3, 3, 2)))
+        with mock.patch('esmvalcore.preprocessor._volume.load_fx_cube',
+                        return_value=volcello):
+            with self.assertRaises(ValueError):
+                volume_statistics(self.grid_4d, 'mean',
+                                  {'volcello': 'volcello.nc'})
+
     def test_depth_integration_1d(self):
         """Test to take the depth integration of a 3 layer cube."""
         result = depth_integration(self.grid_3d[:, 0, 0])
@@ -152,6 +215,61 @@ class Test(tests.Test):
         expected = np.ones((3, 2))
         self.assert_array_equal(result.data, expected)
 
+    def test_extract_trajectory_irregular(self):
+        """Test to extract a trajectory from a curvilinear grid."""
+        lats = self.grid_irregular.coord('latitude').points
+        lons = self.grid_irregular.coord('longitude').points
+        result = extract_trajectory(self.grid_irregular,
+                                    [lats[0, 1], lats[3, 2]],
+                                    [lons[0, 1], lons[3, 2]], 4)
+        self.assertEqual(result.shape, (2, 3, 4))
+        self.assertEqual(result.coord('latitude').shape, (4, ))
+        self.assertEqual(result.coord_dims('zcoord'), (1, ))
+        data = self.grid_irregular.data
+        np.testing.assert_array_equal(result.data[..., 0], data[:, :, 0, 1])
+        np.testing.assert_array_equal(result.data[..., -1], data[:, :, 3, 2])
+
+    def test_extract_trajectory_inverse_distance(self):
+        """Test the inverse distance weighted trajectory sampler."""
+        mask = np.zeros((2, 3, 4, 5), dtype=bool)
+        mask[0, 0, 0, 1] = True
+        self.grid_irregular.data = da.ma.masked_array(
+            da.ones((2, 3, 4, 5), chunks=(1, 1, 4, 5)), mask=mask)
+        result = extract_trajectory(self.grid_irregular, [-30., 0., 20.],
+                                    [100., 120., 200.],
+                                    scheme='inverse_distance')
+        self.assertTrue(result.has_lazy_data())
+        self.assertEqual(result.shape, (2, 3, 3))
+        np.testing.assert_allclose(result.data, 1.)
+        with self.assertRaises(ValueError):
+            extract_trajectory(self.grid_irregular, [0., 1.], [0., 1.],
+                               scheme='linear')
+
+    def test_spatial_index_cached(self):
+        """Test that the spatial index of a grid is only built once."""
+        SPATIAL_INDEX_CACHE._trees.clear()
+        extract_trajectory(self.grid_irregular, [0., 10.], [0., 10.])
+        tree = next(iter(SPATIAL_INDEX_CACHE._trees.values()))
+        extract_trajectory(self.grid_irregular[:1], [5., 10.], [0., 20.])
+        self.assertEqual(len(SPATIAL_INDEX_CACHE._trees), 1)
+        self.assertIs(next(iter(SPATIAL_INDEX_CACHE._trees.values())), tree)
+
+    def test_extract_transect_irregular(self):
+        """Test to extract a transect from a curvilinear grid."""
+        result = extract_transect(self.grid_irregular, latitude=15.)
+        self.assertEqual(result.shape, (2, 3, 5))
+        np.testing.assert_array_equal(result.coord('latitude').points, 15.)
+        lons = self.grid_irregular.coord('longitude').points
+        np.testing.assert_allclose(result.coord('longitude').points,
+                                   np.linspace(lons.min(), lons.max(), 5))
+
+        result = extract_transect(self.grid_irregular,
+                                  longitude=120.,
+                                  latitude=[-40., 40.])
+        self.assertEqual(result.shape, (2, 3, 4))
+        data = self.grid_irregular.data
+        np.testing.assert_array_equal(result.data, data[:, :, :, 2])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -93,10 +93,11 @@ LAND_FRACTION = [
 
 
 @pytest.mark.parametrize('cube,fx_files,fx_cubes,out,err', LAND_FRACTION)
-@mock.patch.object(weighting, 'iris', autospec=True)
-def test_get_land_fraction(mock_iris, cube, fx_files, fx_cubes, out, err):
+@mock.patch.object(weighting, 'load_fx_cube', autospec=True)
+def test_get_land_fraction(mock_load_fx_cube, cube, fx_files, fx_cubes, out,
+                           err):
     """Test calculation of land fraction."""
-    mock_iris.load_cube.side_effect = fx_cubes
+    mock_load_fx_cube.side_effect = fx_cubes
     (land_fraction, errors) = weighting._get_land_fraction(cube, fx_files)
     if land_fraction is None:
         assert land_fraction == out
@@ -105,7 +106,7 @@ def test_get_land_fraction(mock_iris, cube, fx_files, fx_cubes, out, err):
     assert len(errors) == len(err)
     for (idx, error) in enumerate(errors):
         assert err[idx] in error
-    mock_iris.reset_mock()
+    mock_load_fx_cube.reset_mock()
 
 
 SHAPES_TO_BROADCAST = [
@@ -180,8 +181,8 @@ WEIGHTING_LANDSEA_FRACTION = [
 
 @pytest.mark.parametrize('cube,fx_files,area_type,out',
                          WEIGHTING_LANDSEA_FRACTION)
-@mock.patch.object(weighting, 'iris', autospec=True)
-def test_weighting_landsea_fraction(mock_iris,
+@mock.patch.object(weighting, 'load_fx_cube', autospec=True)
+def test_weighting_landsea_fraction(mock_load_fx_cube,
                                     cube,
                                     fx_files,
                                     area_type,
@@ -200,9 +201,9 @@ def test_weighting_landsea_fraction(mock_iris,
         fx_cubes.append(CUBE_SFTLF)
     if fx_files.get('sftof'):
         fx_cubes.append(CUBE_SFTOF)
-    mock_iris.load_cube.side_effect = fx_cubes
+    mock_load_fx_cube.side_effect = fx_cubes
     weighted_cube = weighting.weighting_landsea_fraction(
         cube, fx_files, area_type)
     assert weighted_cube == cube
     assert weighted_cube is cube
-    mock_iris.reset_mock()
+    mock_load_fx_cube.reset_mock()
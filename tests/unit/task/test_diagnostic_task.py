@@ -171,7 +171,8 @@ def test_collect_provenance(mocker, diagnostic_task):
         diagnostic_task.activity)
     tracked_file_instance.save_provenance.assert_called_once()
     write_citation.assert_called_once_with(tracked_file_instance.filename,
-                                           tracked_file_instance.provenance)
+                                           tracked_file_instance.provenance,
+                                           None)
     diagnostic_task.products.add.assert_called_once_with(tracked_file_instance)
 
 
@@ -253,3 +254,21 @@ def test_collect_provenance_ancestor_hint(mocker, caplog, diagnostic_task):
         ["Invalid ancestor file", "abc.nc", "test.nc"],
         ["Valid ancestor files", "xyz.nc"],
     ])
+
+
+def test_provenance_writer(mocker):
+    write_citation = mocker.patch.object(esmvalcore._task,
+                                         '_write_citation_files')
+    products = [mocker.Mock() for _ in range(5)]
+    products[2].save_provenance.side_effect = ValueError("write failed")
+
+    writer = esmvalcore._task._ProvenanceWriter(max_workers=2,
+                                                max_pending=2)
+    for product in products:
+        writer.submit(product)
+    with pytest.raises(ValueError, match="write failed"):
+        writer.close()
+
+    for product in products:
+        product.save_provenance.assert_called_once_with()
+    assert write_citation.call_count == 4